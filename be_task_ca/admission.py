@@ -0,0 +1,192 @@
+"""Admission control: bounded concurrency per route class with load shedding.
+
+Requests are grouped into route classes (cheap reads, writes, and bulk
+endpoints returning whole tables), each with its own concurrency limit.
+Beyond the limit a request waits at most `admission_queue_seconds` for a
+slot and is answered `503` with `Retry-After` otherwise. While checkouts
+from the database pool wait longer than `admission_pool_wait_seconds` on
+average, requests over the limit are shed right away instead of queueing:
+the database is the bottleneck and more queued work only adds latency.
+"""
+import asyncio
+from collections import deque
+from typing import Deque, Dict, List
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .database import engine, replicas, shards
+from .database.pool import TimedQueuePool
+from .metrics import registry
+from .settings import settings
+
+READ = "read"
+WRITE = "write"
+BULK = "bulk"
+
+# full table reads, limited separately so they cannot starve cheap reads
+BULK_PATHS = {"/users/", "/items/", "/users/export", "/items/export"}
+# read the table while the body streams, holding a pooled connection
+STREAMED_PATHS = {"/users/export", "/items/export"}
+# never limited, so health checks and scrapes work during overload
+EXEMPT_PATHS = {"/", "/metrics"}
+
+admitted = registry.counter(
+    "admission_admitted_total", "Requests admitted, by route class."
+)
+shed = registry.counter(
+    "admission_shed_total", "Requests answered 503, by route class and reason."
+)
+in_flight = registry.gauge("admission_in_flight", "Admitted requests in progress.")
+queued = registry.gauge("admission_queued", "Requests waiting for a slot.")
+pool_wait = registry.gauge(
+    "db_pool_wait_seconds", "Recent average wait for a database connection."
+)
+pool_checked_out = registry.gauge(
+    "db_pool_checked_out", "Connections currently checked out of the pool."
+)
+
+
+def route_class(method: str, path: str) -> str:
+    if method not in ("GET", "HEAD", "OPTIONS"):
+        return WRITE
+    return BULK if path in BULK_PATHS else READ
+
+
+class ConcurrencyLimit:
+    """An asyncio semaphore whose waiters give up after a timeout, FIFO."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return sum(not waiter.done() for waiter in self._waiters)
+
+    async def acquire(self, timeout: float) -> bool:
+        """Take a slot, waiting up to `timeout` seconds; False if none freed."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        if timeout <= 0:
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # release() hands its slot over without touching `active`
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters and waiter.cancelled():
+                self._waiters.remove(waiter)
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+def _pools() -> List[TimedQueuePool]:
+    engines: List[Engine] = [engine] + (replicas.engines if replicas else [])
+    # shards[0] is the primary
+    engines += shards.engines[1:] if shards else []
+    return [e.pool for e in engines if isinstance(e.pool, TimedQueuePool)]
+
+
+def database_wait() -> float:
+    """Longest recent average checkout wait over the primary, replicas and shards."""
+    return max((pool.recent_wait() for pool in _pools()), default=0.0)
+
+
+class AdmissionMiddleware:
+    """ASGI middleware admitting requests through their route class's limit.
+
+    The slot is held until the response starts, like the endpoint's work,
+    not while a streamed body is sent; for STREAMED_PATHS, whose bodies are
+    read from the database as they are sent, until the last body message.
+    """
+
+    def __init__(self, app: ASGIApp, limits: Dict[str, ConcurrencyLimit]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        path = scope["path"]
+        name = route_class(scope["method"], path)
+        limit = self.limits.get(name)
+        if path in EXEMPT_PATHS or limit is None:
+            return await self.app(scope, receive, send)
+
+        congested = database_wait() > settings.admission_pool_wait_seconds
+        timeout = 0.0 if congested else settings.admission_queue_seconds
+        if not await limit.acquire(timeout):
+            reason = "pool_wait" if congested else "queue_timeout"
+            shed.inc(route_class=name, reason=reason)
+            response = JSONResponse(
+                {"detail": "Server is overloaded, retry later"},
+                status_code=503,
+                headers={"Retry-After": str(settings.admission_retry_after_seconds)},
+            )
+            return await response(scope, receive, send)
+        admitted.inc(route_class=name)
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                limit.release()
+
+        streamed = path in STREAMED_PATHS
+
+        async def release_then_send(message: Message) -> None:
+            if message["type"] == "http.response.start" and not streamed:
+                release()
+            elif message["type"] == "http.response.body" and not message.get(
+                "more_body", False
+            ):
+                release()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, release_then_send)
+        finally:
+            release()
+
+
+def install_admission_control(app: FastAPI) -> None:
+    """Add the admission middleware to `app` unless disabled."""
+    if not settings.admission_enabled:
+        return
+
+    limits: Dict[str, ConcurrencyLimit] = {
+        name: ConcurrencyLimit(limit)
+        for name, limit in settings.admission_limits.items()
+    }
+
+    @registry.collector
+    def collect() -> None:
+        for name, limit in limits.items():
+            in_flight.set(limit.active, route_class=name)
+            queued.set(limit.queued, route_class=name)
+        for index, pool in enumerate(_pools()):
+            pool_wait.set(pool.recent_wait(), pool=str(index))
+            pool_checked_out.set(pool.checkedout(), pool=str(index))
+
+    app.add_middleware(AdmissionMiddleware, limits=limits)
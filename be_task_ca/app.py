@@ -1,22 +1,81 @@
-from fastapi import FastAPI, Request, Response
+from fastapi import FastAPI, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from .user.api import user_router
 from .item.api import item_router
+from .batch.api import batch_router
+from .admission import install_admission_control
 from .database import get_db, Session
+from .database.blocking import run_blocking, session_turns
+from .database.sharding import ShardMovingError
+from .database.unit_of_work import UnitOfWork
+from .idempotency import IdempotencyMiddleware
+from .metrics import registry
+from .profiling import install_profiling
+from .settings import settings
 
 app = FastAPI()
 app.include_router(user_router)
 app.include_router(item_router)
+app.include_router(batch_router)
 
 
-@app.middleware("http")
-async def db_session_middleware(request: Request, call_next):
-    response = Response("Internal server error", status_code=500)
-    try:
-        request.state.db = next(get_db())
-        response = await call_next(request)
-    finally:
-        request.state.db.close()
-    return response
+class DatabaseSessionMiddleware:
+    """One session and transaction per request, as `request.state.db`.
+
+    The transaction is committed before the response starts, or rolled back
+    for an error status. Async code of the request hands its blocking session
+    calls to `run_blocking`, which takes them one at a time. Plain ASGI rather
+    than `@app.middleware`, which re-streams every body and so hides its size
+    from GZipMiddleware.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        db = next(get_db())
+        scope.setdefault("state", {})["db"] = db
+        unit_of_work = UnitOfWork(db)
+
+        async def finish_then_send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                if message["status"] < 400:
+                    await run_blocking(unit_of_work.commit)
+                else:
+                    await run_blocking(unit_of_work.rollback)
+            await send(message)
+
+        try:
+            with session_turns():
+                await self.app(scope, receive, finish_then_send)
+        finally:
+            db.close()
+
+
+app.add_middleware(DatabaseSessionMiddleware)
+install_admission_control(app)
+install_profiling(app)
+# outside admission control and the database session, so replays skip them
+app.add_middleware(IdempotencyMiddleware)
+# compresses for clients sending Accept-Encoding: gzip, replays included
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=settings.gzip_minimum_size,
+    compresslevel=settings.gzip_level,
+)
+
+
+@app.exception_handler(ShardMovingError)
+async def shard_moving(request: Request, exc: ShardMovingError):
+    return JSONResponse(
+        {"detail": str(exc)},
+        status_code=503,
+        headers={"Retry-After": str(settings.admission_retry_after_seconds)},
+    )
 
 
 @app.get("/")
@@ -24,3 +83,8 @@ async def root():
     return {
         "message": "Thanks for shopping at Nile!"
     }  # the Nile is 250km longer than the Amazon
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return registry.render()
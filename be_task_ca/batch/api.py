@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from .. import database
+from ..common import get_db
+from ..user.api import get_cart_repository
+from .schema import BatchRequest, BatchResponse
+from .usecases import run_batch
+
+batch_router = APIRouter(tags=["batch"])
+
+
+@batch_router.post("/batch", response_model=BatchResponse)
+async def run_batch_endpoint(
+    batch: BatchRequest, db: Session = Depends(get_db)
+) -> BatchResponse:
+    """Run several operations in one round trip, the writes in one transaction.
+
+    Every operation gets the status and body its own endpoint would answer
+    with; writes rolled back because another write failed get 424.
+    """
+    results = await run_batch(
+        batch.operations, db, database.Session, get_cart_repository
+    )
+    return BatchResponse(results=results)
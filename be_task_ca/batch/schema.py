@@ -0,0 +1,78 @@
+from enum import Enum
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from pydantic import BaseModel, Field
+
+from ..item.model import SearchMode
+from ..settings import settings
+from ..user.schema import AddToCartRequest, CreateUserRequest
+
+
+class BatchOp(str, Enum):
+    """The operations a batch can contain, each backed by a use case."""
+    GET_USER = "get_user"
+    GET_USER_BY_EMAIL = "get_user_by_email"
+    CREATE_USER = "create_user"
+    UPDATE_USER = "update_user"
+    DELETE_USER = "delete_user"
+    GET_ITEM = "get_item"
+    LIST_ITEMS = "list_items"
+    SEARCH_ITEMS = "search_items"
+    CREATE_ITEM = "create_item"
+    GET_CART = "get_cart"
+    GET_CART_SUMMARY = "get_cart_summary"
+    ADD_TO_CART = "add_to_cart"
+
+
+class BatchOperation(BaseModel):
+    # echoed in the result, to tell operations apart on the client
+    id: Optional[str] = None
+    op: BatchOp
+    args: Dict[str, Any] = {}
+
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(
+        ..., min_items=1, max_items=settings.batch_max_operations
+    )
+
+
+class BatchResult(BaseModel):
+    id: Optional[str]
+    status: int
+    body: Any
+
+
+class BatchResponse(BaseModel):
+    results: List[BatchResult]
+
+
+class NoArgs(BaseModel):
+    pass
+
+
+class UserIdArgs(BaseModel):
+    user_id: UUID
+
+
+class EmailArgs(BaseModel):
+    email: str
+
+
+class ItemIdArgs(BaseModel):
+    item_id: UUID
+
+
+class SearchArgs(BaseModel):
+    q: str = Field(..., min_length=1, max_length=200)
+    mode: SearchMode = SearchMode.SUBSTRING
+    limit: int = Field(20, ge=1, le=100)
+
+
+class UpdateUserArgs(CreateUserRequest):
+    user_id: UUID
+
+
+class AddToCartArgs(AddToCartRequest):
+    user_id: UUID
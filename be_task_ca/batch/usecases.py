@@ -0,0 +1,348 @@
+"""Running many user, item and cart operations in one request.
+
+The writes run first, in the order given, in one unit of work on the
+request's session: it commits once after the last write, and the first
+write that fails rolls all of them back. Like the reads, they run in the
+threadpool, one after the other.
+The reads then run concurrently and see the committed writes. Item lookups
+and carts go through the request's session, so all `get_item` operations
+and the items of all carts are fetched with one batched query; the other
+reads each get their own session in the threadpool.
+
+Carts kept outside the database (`cart_store = "sqlite"`) or behind the
+write-behind buffer are not part of the transaction.
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Type,
+)
+
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from ..database.blocking import run_blocking, session_turns
+from ..database.routing import WROTE
+from ..database.sharding import ShardMovingError
+from ..database.unit_of_work import UnitOfWork
+from ..dataloader import DataLoader
+from ..item.loaders import get_item_loader
+from ..item.schema import CreateItemRequest
+from ..item.usecases import (
+    ITEM_ROW_FIELDS,
+    create_item,
+    get_all,
+    get_item,
+    search_items,
+)
+from ..settings import settings
+from ..user.domain.cart_repository import CartRepository
+from ..user.infrastructure.postgres_user_repository import PostgresUserRepository
+from ..user.schema import (
+    AddToCartRequest,
+    AddToCartResponse,
+    CartItemDetails,
+    CartResponse,
+    CartSummaryResponse,
+    CreateUserRequest,
+    CreateUserResponse,
+)
+from ..user.usecases import (
+    add_item_to_cart,
+    create_user,
+    delete_user,
+    get_cart_lines,
+    get_cart_summary,
+    get_user_by_email,
+    get_user_by_id,
+    update_user,
+)
+from .schema import (
+    AddToCartArgs,
+    BatchOp,
+    BatchOperation,
+    BatchResult,
+    EmailArgs,
+    ItemIdArgs,
+    NoArgs,
+    SearchArgs,
+    UpdateUserArgs,
+    UserIdArgs,
+)
+
+ROLLED_BACK = 424
+
+
+class BatchContext:
+    """What the operations of one batch run with."""
+
+    def __init__(
+        self,
+        session: Session,
+        session_factory: Callable[[], Session],
+        cart_repository_factory: Callable[[Session], CartRepository],
+    ):
+        self.session = session
+        self.session_factory = session_factory
+        self.cart_repository = cart_repository_factory(session)
+        self.user_repository = PostgresUserRepository(session)
+        self.wrote = False
+        self._readers = asyncio.Semaphore(settings.batch_read_concurrency)
+        self.reset_loaders()
+
+    def reset_loaders(self) -> None:
+        """Start over with empty loaders, forgetting what was loaded so far."""
+        self.item_loader = get_item_loader(self.session)
+        self.user_loader: DataLoader = DataLoader(
+            lambda ids: {u.id: u for u in self.user_repository.get_by_ids(ids)},
+            run=run_blocking,
+        )
+
+    async def in_thread(self, read: Callable[[Session], Any]) -> Any:
+        """Run `read` in the threadpool with a session of its own."""
+
+        def run():
+            with self.session_factory() as session:
+                if self.wrote:
+                    # read the batch's own writes from the primary
+                    session.info[WROTE] = True
+                return read(session)
+
+        async with self._readers:
+            return await run_in_threadpool(run)
+
+
+@dataclass(frozen=True)
+class Operation:
+    args: Type[BaseModel]
+    run: Callable[[BatchContext, Any], Awaitable[Any]]
+    write: bool = False
+
+
+def _user(user) -> CreateUserResponse:
+    return CreateUserResponse(
+        id=user.id,
+        email=user.email,
+        first_name=user.first_name,
+        last_name=user.last_name,
+        shipping_address=user.shipping_address,
+    )
+
+
+async def _get_user(ctx: BatchContext, args: UserIdArgs):
+    return _user(
+        await ctx.in_thread(
+            lambda s: get_user_by_id(args.user_id, PostgresUserRepository(s))
+        )
+    )
+
+
+async def _get_user_by_email(ctx: BatchContext, args: EmailArgs):
+    return _user(
+        await ctx.in_thread(
+            lambda s: get_user_by_email(args.email, PostgresUserRepository(s))
+        )
+    )
+
+
+async def _create_user(ctx: BatchContext, args: CreateUserRequest):
+    return _user(await run_blocking(create_user, args, ctx.user_repository))
+
+
+async def _update_user(ctx: BatchContext, args: UpdateUserArgs):
+    return _user(
+        await run_blocking(update_user, args.user_id, args, ctx.user_repository)
+    )
+
+
+async def _delete_user(ctx: BatchContext, args: UserIdArgs):
+    await run_blocking(delete_user, args.user_id, ctx.user_repository)
+
+
+async def _get_item(ctx: BatchContext, args: ItemIdArgs):
+    return await get_item(args.item_id, ctx.item_loader)
+
+
+async def _list_items(ctx: BatchContext, args: NoArgs):
+    return await ctx.in_thread(get_all)
+
+
+async def _search_items(ctx: BatchContext, args: SearchArgs):
+    rows = await ctx.in_thread(
+        lambda s: search_items(args.q, args.mode, args.limit, s)
+    )
+    return {"items": [dict(zip(ITEM_ROW_FIELDS, row)) for row in rows]}
+
+
+async def _create_item(ctx: BatchContext, args: CreateItemRequest):
+    return await run_blocking(create_item, args, ctx.session)
+
+
+async def _get_cart(ctx: BatchContext, args: UserIdArgs):
+    lines = await get_cart_lines(args.user_id, ctx.cart_repository, ctx.item_loader)
+    return CartResponse(
+        items=[
+            CartItemDetails(
+                item_id=line.item_id,
+                quantity=line.quantity,
+                name=line.name,
+                price=line.price,
+            )
+            for line in lines
+        ]
+    )
+
+
+async def _get_cart_summary(ctx: BatchContext, args: UserIdArgs):
+    summary = await get_cart_summary(
+        args.user_id, ctx.cart_repository, ctx.item_loader
+    )
+    return CartSummaryResponse(
+        line_count=summary.line_count,
+        unit_count=summary.unit_count,
+        subtotal=summary.subtotal,
+    )
+
+
+async def _add_to_cart(ctx: BatchContext, args: AddToCartArgs):
+    cart = await add_item_to_cart(
+        args.user_id,
+        args.item_id,
+        args.quantity,
+        ctx.cart_repository,
+        ctx.user_loader,
+        ctx.item_loader,
+    )
+    return AddToCartResponse(
+        items=[
+            AddToCartRequest(item_id=line.item_id, quantity=line.quantity)
+            for line in cart.items
+        ]
+    )
+
+
+OPERATIONS: Dict[BatchOp, Operation] = {
+    BatchOp.GET_USER: Operation(UserIdArgs, _get_user),
+    BatchOp.GET_USER_BY_EMAIL: Operation(EmailArgs, _get_user_by_email),
+    BatchOp.CREATE_USER: Operation(CreateUserRequest, _create_user, write=True),
+    BatchOp.UPDATE_USER: Operation(UpdateUserArgs, _update_user, write=True),
+    BatchOp.DELETE_USER: Operation(UserIdArgs, _delete_user, write=True),
+    BatchOp.GET_ITEM: Operation(ItemIdArgs, _get_item),
+    BatchOp.LIST_ITEMS: Operation(NoArgs, _list_items),
+    BatchOp.SEARCH_ITEMS: Operation(SearchArgs, _search_items),
+    BatchOp.CREATE_ITEM: Operation(CreateItemRequest, _create_item, write=True),
+    BatchOp.GET_CART: Operation(UserIdArgs, _get_cart),
+    BatchOp.GET_CART_SUMMARY: Operation(UserIdArgs, _get_cart_summary),
+    BatchOp.ADD_TO_CART: Operation(AddToCartArgs, _add_to_cart, write=True),
+}
+
+
+def error_result(error: Exception) -> Tuple[int, Any]:
+    """Status and body the single endpoint would answer the error with."""
+    if isinstance(error, HTTPException):
+        return error.status_code, {"detail": error.detail}
+    if isinstance(error, ValidationError):
+        return 422, {"detail": error.errors()}
+    if isinstance(error, ShardMovingError):
+        return 503, {"detail": str(error)}
+    message = str(error)
+    if "not found" in message:
+        return 404, {"detail": message}
+    if "already exists" in message or "stock" in message:
+        return 409, {"detail": message}
+    return 400, {"detail": message}
+
+
+FAILURES = (HTTPException, ValidationError, ShardMovingError, ValueError)
+
+
+@dataclass
+class _Pending:
+    index: int
+    operation: Operation
+    args: Any = None
+    result: Optional[Tuple[int, Any]] = None
+
+
+async def run_batch(
+    operations: List[BatchOperation],
+    session: Session,
+    session_factory: Callable[[], Session],
+    cart_repository_factory: Callable[[Session], CartRepository],
+) -> List[BatchResult]:
+    """Run the writes in one transaction, then the reads concurrently."""
+    ctx = BatchContext(session, session_factory, cart_repository_factory)
+    pending = [
+        _Pending(index, OPERATIONS[operation.op])
+        for index, operation in enumerate(operations)
+    ]
+    for entry, operation in zip(pending, operations):
+        try:
+            entry.args = entry.operation.args.parse_obj(operation.args)
+        except ValidationError as error:
+            entry.result = error_result(error)
+
+    writes = [entry for entry in pending if entry.operation.write]
+    if writes:
+        await _run_writes(ctx, writes)
+        ctx.reset_loaders()
+
+    reads = [
+        entry
+        for entry in pending
+        if not entry.operation.write and entry.result is None
+    ]
+    # the reads share the batch's session, their queries take turns on it
+    with session_turns():
+        await asyncio.gather(*(_run(ctx, entry) for entry in reads))
+
+    return [
+        BatchResult(id=operation.id, status=entry.result[0], body=entry.result[1])
+        for entry, operation in zip(pending, operations)
+    ]
+
+
+async def _run_writes(ctx: BatchContext, writes: List[_Pending]) -> None:
+    unit_of_work = UnitOfWork(ctx.session)
+    failed = any(entry.result is not None for entry in writes)
+    if not failed:
+        try:
+            for entry in writes:
+                await _run(ctx, entry)
+                if entry.result[0] >= 400:
+                    failed = True
+                    break
+        except BaseException:
+            await run_blocking(unit_of_work.rollback)
+            raise
+
+    if failed:
+        await run_blocking(unit_of_work.rollback)
+        for entry in writes:
+            if entry.result is None or entry.result[0] < 400:
+                entry.result = (
+                    ROLLED_BACK,
+                    {"detail": "Rolled back, another write of the batch failed"},
+                )
+        return
+
+    await run_blocking(unit_of_work.commit)
+    ctx.wrote = True
+
+
+async def _run(ctx: BatchContext, entry: _Pending) -> None:
+    try:
+        body = await entry.operation.run(ctx, entry.args)
+    except FAILURES as error:
+        entry.result = error_result(error)
+    else:
+        entry.result = (200, body)
@@ -0,0 +1,285 @@
+"""Change feed of catalog updates, pushed to clients as Server-Sent Events.
+
+Catalog writes record a change on their session, numbered by the catalog
+version they bumped; the change is published to the process's `ChangeHub`
+once the session commits and dropped if it rolls back. Versions are bumped
+under a row lock, so changes are numbered in commit order across workers.
+
+The hub keeps the last `change_feed_history` changes so a reconnecting
+client resumes after the last change it saw (SSE `Last-Event-ID`). Each
+client gets a queue of `change_feed_queue_size` changes; a client that
+falls that far behind, or resumes from before the kept history, is sent a
+`reset` event and disconnected, and should reload the catalog before
+subscribing again.
+
+With several workers, `change_feed_notify` sends the changes through
+PostgreSQL NOTIFY instead: the notification is part of the writing
+transaction, and every worker, the writing one included, publishes it to
+its hub from a LISTEN connection.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from select import select as wait_readable
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from .database.unit_of_work import after_commit
+from .metrics import registry
+from .serialization import dumps
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "catalog_changes"
+
+subscribers = registry.gauge(
+    "change_feed_subscribers", "Clients subscribed to the change feed."
+)
+resets = registry.counter(
+    "change_feed_resets_total", "Clients sent a reset, by reason."
+)
+
+
+@dataclass(frozen=True, slots=True)
+class Change:
+    """One catalog change, `seq` is the catalog version it produced."""
+    seq: int
+    kind: str
+    data: Dict[str, Any]
+
+    def encode(self) -> bytes:
+        """The change as one SSE event."""
+        return b"id: %d\nevent: %s\ndata: %s\n\n" % (
+            self.seq,
+            self.kind.encode(),
+            dumps(self.data),
+        )
+
+
+RESET_EVENT = b"event: reset\ndata: {}\n\n"
+HEARTBEAT = b": keepalive\n\n"
+
+
+class Subscription:
+    """A client's queue of changes, filled from any thread by the hub."""
+
+    def __init__(self, queue_size: int):
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.overflowed = False
+
+    def offer(self, change: Change) -> None:
+        """Queue a change; runs on the subscriber's event loop."""
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(change)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.reset()
+
+    def reset(self) -> None:
+        """Replace whatever the client has not read yet with a reset."""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class ChangeHub:
+    """Broadcasts changes to the subscribers of this process."""
+
+    def __init__(self, history: int = 1000, queue_size: int = 256):
+        self.queue_size = queue_size
+        self._history: Deque[Change] = deque(maxlen=history)
+        # every change after this one is in the history, None until known
+        self._complete_after: Optional[int] = None
+        self._subscribers: Set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def start(self, seq: int) -> None:
+        """Declare `seq` the latest change, e.g. the catalog version at startup."""
+        with self._lock:
+            if self._complete_after is None:
+                self._complete_after = seq
+
+    def publish(self, change: Change) -> None:
+        """Send a change to every subscriber, safe to call from any thread.
+
+        A change older than the last one sent resets the subscribers.
+        """
+        with self._lock:
+            if self._history and change.seq <= self._history[-1].seq:
+                if change.seq <= self._complete_after or any(
+                    kept.seq == change.seq for kept in self._history
+                ):
+                    # already seen, e.g. redelivered after a listener reconnect
+                    return
+                # committed before a change already sent, by another thread:
+                # the subscribers cannot get it in order any more
+                resets.inc(reason="out_of_order")
+                late, current = True, self._forget()
+            else:
+                if self._complete_after is None:
+                    self._complete_after = change.seq - 1
+                elif len(self._history) == self._history.maxlen:
+                    self._complete_after = self._history[0].seq
+                self._history.append(change)
+                late, current = False, list(self._subscribers)
+        for subscription in current:
+            if late:
+                subscription.loop.call_soon_threadsafe(subscription.reset)
+            else:
+                subscription.loop.call_soon_threadsafe(subscription.offer, change)
+
+    def subscribe(self, since: Optional[int] = None) -> Subscription:
+        """Subscribe, queueing the kept changes after `since` first.
+
+        Resuming from before the kept history, or missing more changes than
+        fit the queue, queues a reset instead.
+        """
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            if since is not None:
+                if self._complete_after is None or since < self._complete_after:
+                    resets.inc(reason="history")
+                    missed = [None]
+                else:
+                    missed = [c for c in self._history if c.seq > since]
+                    if len(missed) > self.queue_size:
+                        resets.inc(reason="slow_client")
+                        missed = [None]
+                for change in missed:
+                    subscription.queue.put_nowait(change)
+            self._subscribers.add(subscription)
+        subscribers.set(len(self._subscribers))
+        return subscription
+
+    def reset(self) -> None:
+        """Forget the history and reset every subscriber, after missing changes."""
+        with self._lock:
+            current = self._forget()
+        for subscription in current:
+            subscription.loop.call_soon_threadsafe(subscription.reset)
+
+    def _forget(self) -> List[Subscription]:
+        self._history.clear()
+        self._complete_after = None
+        return list(self._subscribers)
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+        subscribers.set(len(self._subscribers))
+
+
+hub = ChangeHub(settings.change_feed_history, settings.change_feed_queue_size)
+
+
+async def event_stream(
+    hub: ChangeHub, since: Optional[int], heartbeat: float
+) -> AsyncIterator[bytes]:
+    """SSE body: the missed and then the live changes, until a reset."""
+    subscription = hub.subscribe(since)
+    try:
+        while True:
+            try:
+                change = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                # keeps proxies from closing an idle connection
+                yield HEARTBEAT
+                continue
+            if change is None:
+                if subscription.overflowed:
+                    resets.inc(reason="slow_client")
+                yield RESET_EVENT
+                return
+            yield change.encode()
+    finally:
+        hub.unsubscribe(subscription)
+
+
+def record_change(session: Session, change: Change) -> None:
+    """Publish `change` once `session` commits."""
+    notify = settings.change_feed_notify
+    if notify and session.get_bind().dialect.name == "postgresql":
+        # delivered to every listening worker when the transaction commits
+        payload = {"seq": change.seq, "kind": change.kind, "data": change.data}
+        session.execute(select(func.pg_notify(CHANNEL, dumps(payload).decode())))
+    else:
+        after_commit(session, lambda: hub.publish(change))
+
+
+class ChangeListener:
+    """Publishes the NOTIFY changes of all workers to the hub, in a thread.
+
+    The LISTEN connection is re-opened after errors; changes sent while it
+    was down are missed, so the hub is reset when it is back.
+    """
+
+    def __init__(self, engine: Engine, hub: ChangeHub, poll_interval: float = 1.0):
+        self.engine = engine
+        self.hub = hub
+        self.poll_interval = poll_interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="change-listener", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        reconnect = False
+        while not self._stopped.is_set():
+            try:
+                self._listen(reconnect)
+            except Exception:
+                logger.warning("Change listener failed, reconnecting", exc_info=True)
+                reconnect = True
+                self._stopped.wait(self.poll_interval)
+
+    def _listen(self, reconnect: bool) -> None:
+        connection = self.engine.raw_connection()
+        try:
+            driver_connection = connection.driver_connection
+            driver_connection.autocommit = True
+            with driver_connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            if reconnect:
+                self.hub.reset()
+            while not self._stopped.is_set():
+                for payload in self._receive(driver_connection):
+                    message = json.loads(payload)
+                    self.hub.publish(
+                        Change(message["seq"], message["kind"], message["data"])
+                    )
+        finally:
+            connection.invalidate()
+
+    def _receive(self, driver_connection) -> List[str]:
+        if hasattr(driver_connection, "poll"):  # psycopg2
+            readable, _, _ = wait_readable(
+                [driver_connection], [], [], self.poll_interval
+            )
+            if readable:
+                driver_connection.poll()
+            notifies = driver_connection.notifies
+            payloads = [notify.payload for notify in notifies]
+            notifies.clear()
+            return payloads
+        # psycopg 3
+        return [
+            notify.payload
+            for notify in driver_connection.notifies(timeout=self.poll_interval)
+        ]
@@ -1,4 +1,16 @@
-from .database import engine, Base
+import argparse
+import sys
+import time
+from datetime import datetime
+
+from .database import engine, Base, Session, shards
+from .database.migrations import migrate
+from .database.rebalance import backfill_directory, group_moves, move_slots, plan_even
+from .export import EXPORTS, ExportFormat, export_table
+from .item.snapshot import write_snapshot
+from .profiling import PROFILE_HEADER, profile_signature
+from .settings import settings
+from .user.infrastructure.cart_reaper import CartReaper
 
 # just importing all the models is enough to have them created
 # flake8: noqa
@@ -7,3 +19,113 @@ from .database.models import UserModel, CartModel, CartItemModel
 
 def create_db_schema():
     Base.metadata.create_all(bind=engine)
+
+
+def migrate_db_schema():
+    for name in migrate(engine):
+        print(f"applied {name}")
+
+
+def rebalance_shards():
+    """Spread the user hash slots evenly over the configured shards."""
+    parser = argparse.ArgumentParser(prog="rebalance")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="print the moves without moving"
+    )
+    args = parser.parse_args()
+    if shards is None:
+        sys.exit("DATABASE_SHARD_URLS is not set")
+
+    if not args.dry_run:
+        print(f"added {backfill_directory(shards)} users to the email directory")
+    slot_shards = shards.slot_shards()
+    moves = plan_even(slot_shards, len(shards.engines))
+    for source, target, slots in group_moves(moves, slot_shards):
+        print(f"{len(slots)} slots from shard {source} to shard {target}", end="")
+        if args.dry_run:
+            print()
+            continue
+        moved = move_slots(shards, slots, source, target)
+        print(f": moved {moved} users")
+
+
+def print_profile_header():
+    """Print the X-Profile header that profiles `<METHOD> <path>` for 5 minutes."""
+    if not settings.profile_secret:
+        sys.exit("PROFILE_SECRET is not set")
+    method, path = sys.argv[1:3]
+    expires = int(time.time()) + 300
+    signature = profile_signature(settings.profile_secret, method, path, expires)
+    print(f"{PROFILE_HEADER}: {expires}:{signature}")
+
+
+def export_data():
+    """Write a table export to a file or stdout, see be_task_ca.export."""
+    parser = argparse.ArgumentParser(prog="export")
+    parser.add_argument("table", choices=sorted(EXPORTS))
+    parser.add_argument(
+        "--format",
+        type=ExportFormat,
+        choices=list(ExportFormat),
+        default=ExportFormat.NDJSON,
+    )
+    parser.add_argument("--updated-since", type=datetime.fromisoformat)
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--output", "-o", help="file to write, stdout by default")
+    args = parser.parse_args()
+
+    chunks = export_table(
+        Session,
+        args.table,
+        args.format,
+        args.updated_since,
+        gzip=args.gzip,
+        chunk_size=settings.export_chunk_size,
+    )
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+
+def write_catalog_snapshot():
+    """Write the catalog snapshot new workers start from, see item/snapshot.py."""
+    parser = argparse.ArgumentParser(prog="snapshot")
+    parser.add_argument(
+        "--output",
+        "-o",
+        default=settings.catalog_snapshot_path,
+        help="file to write, CATALOG_SNAPSHOT_PATH by default",
+    )
+    args = parser.parse_args()
+    if not args.output:
+        sys.exit("pass --output or set CATALOG_SNAPSHOT_PATH")
+
+    with Session() as session:
+        version, count = write_snapshot(session, args.output)
+    print(f"wrote {count} items at catalog version {version} to {args.output}")
+
+
+def reap_carts():
+    """Delete the carts idle for longer than CART_MAX_IDLE_SECONDS."""
+    parser = argparse.ArgumentParser(prog="reap-carts")
+    parser.add_argument(
+        "--max-idle-days",
+        type=float,
+        help="override CART_MAX_IDLE_SECONDS, in days",
+    )
+    args = parser.parse_args()
+    max_idle = settings.cart_max_idle_seconds
+    if args.max_idle_days is not None:
+        max_idle = args.max_idle_days * 24 * 60 * 60
+
+    reaper = CartReaper(
+        shards.engines if shards is not None else [engine],
+        max_idle,
+        settings.cart_reap_chunk_size,
+        settings.cart_reap_pause_seconds,
+    )
+    print(f"reaped {reaper.reap()} carts")
@@ -3,14 +3,14 @@ from typing import List, Optional
 from uuid import UUID, uuid4
 
 
-@dataclass
+@dataclass(slots=True)
 class CartItem:
     """Represents an item in the user's shopping cart."""
     item_id: UUID
     quantity: int
 
 
-@dataclass
+@dataclass(slots=True)
 class User:
     """Core User entity representing a user in the system."""
     id: UUID
@@ -0,0 +1,44 @@
+"""Blocking session work of async code, run in the threadpool.
+
+Async use cases hand their repository calls to `run_blocking`, so a slow
+query holds a threadpool thread instead of the event loop. A request's
+session is not thread-safe, yet several coroutines of the request may use
+it at once (loaders dispatched in the same tick, the reads of a batch):
+inside `session_turns()`, which the API opens per request and code running
+session work concurrently opens around it, their calls take turns.
+"""
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+from starlette.concurrency import run_in_threadpool
+
+T = TypeVar("T")
+
+_turns: ContextVar[Optional[asyncio.Lock]] = ContextVar("session_turns", default=None)
+
+
+@contextmanager
+def session_turns() -> Iterator[None]:
+    """Make the `run_blocking` calls of the block, and its tasks, take turns.
+
+    Inside an enclosing block, the calls keep taking turns with its calls.
+    """
+    if _turns.get() is not None:
+        yield
+        return
+    token = _turns.set(asyncio.Lock())
+    try:
+        yield
+    finally:
+        _turns.reset(token)
+
+
+async def run_blocking(call: Callable[..., T], *args: Any) -> T:
+    """Run `call` in the threadpool, after the calls started before it."""
+    turns = _turns.get()
+    if turns is None:
+        return await run_in_threadpool(call, *args)
+    async with turns:
+        return await run_in_threadpool(call, *args)
@@ -0,0 +1,116 @@
+"""Schema migrations for existing PostgreSQL databases.
+
+`Base.metadata.create_all` only creates missing tables, it never changes
+existing ones. Changes to tables that already hold data are listed here in
+order and each one is recorded in `schema_migrations` once applied. Every
+statement is written so that it is also harmless on a schema freshly created
+from the current models.
+"""
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from .models import ITEM_SEARCH_DDL, ITEM_TRIGRAM_DDL, SHARD_SLOTS_SEED
+
+MIGRATIONS: List[Tuple[str, List[str]]] = [
+    (
+        # String(36) keys -> native 16 byte uuid keys
+        "0001_native_uuid_keys",
+        [
+            "ALTER TABLE cart_items DROP CONSTRAINT IF EXISTS cart_items_cart_id_fkey",
+            "ALTER TABLE carts DROP CONSTRAINT IF EXISTS carts_user_id_fkey",
+            "ALTER TABLE users ALTER COLUMN id TYPE uuid USING id::uuid",
+            "ALTER TABLE carts"
+            " ALTER COLUMN id TYPE uuid USING id::uuid,"
+            " ALTER COLUMN user_id TYPE uuid USING user_id::uuid",
+            "ALTER TABLE cart_items"
+            " ALTER COLUMN id TYPE uuid USING id::uuid,"
+            " ALTER COLUMN cart_id TYPE uuid USING cart_id::uuid,"
+            " ALTER COLUMN item_id TYPE uuid USING item_id::uuid",
+            "ALTER TABLE items ALTER COLUMN id TYPE uuid USING id::uuid",
+            "ALTER TABLE carts ADD CONSTRAINT carts_user_id_fkey"
+            " FOREIGN KEY (user_id) REFERENCES users (id)",
+            "ALTER TABLE cart_items ADD CONSTRAINT cart_items_cart_id_fkey"
+            " FOREIGN KEY (cart_id) REFERENCES carts (id)",
+        ],
+    ),
+    ("0002_item_search_indexes", ITEM_SEARCH_DDL),
+    (
+        # denormalized cart summary, subtotals are priced on first read
+        "0003_cart_summary",
+        [
+            "ALTER TABLE carts"
+            " ADD COLUMN IF NOT EXISTS line_count INTEGER NOT NULL DEFAULT 0,"
+            " ADD COLUMN IF NOT EXISTS unit_count INTEGER NOT NULL DEFAULT 0,"
+            " ADD COLUMN IF NOT EXISTS subtotal FLOAT NOT NULL DEFAULT 0,"
+            " ADD COLUMN IF NOT EXISTS price_version INTEGER",
+            "UPDATE carts SET"
+            " line_count = totals.lines, unit_count = totals.units,"
+            " price_version = NULL"
+            " FROM (SELECT cart_id, count(*) AS lines, sum(quantity) AS units"
+            " FROM cart_items GROUP BY cart_id) AS totals"
+            " WHERE carts.id = totals.cart_id",
+        ],
+    ),
+    (
+        # change timestamps for incremental exports, existing rows count as new
+        "0004_updated_at",
+        [
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS"
+            " updated_at TIMESTAMPTZ NOT NULL DEFAULT now()",
+            "ALTER TABLE items ADD COLUMN IF NOT EXISTS"
+            " updated_at TIMESTAMPTZ NOT NULL DEFAULT now()",
+            "CREATE INDEX IF NOT EXISTS ix_users_updated_at ON users (updated_at)",
+            "CREATE INDEX IF NOT EXISTS ix_items_updated_at ON items (updated_at)",
+        ],
+    ),
+    (
+        # last cart activity for the reaper, existing carts count as active
+        "0005_cart_updated_at",
+        [
+            "ALTER TABLE carts ADD COLUMN IF NOT EXISTS"
+            " updated_at TIMESTAMPTZ NOT NULL DEFAULT now()",
+            "CREATE INDEX IF NOT EXISTS ix_carts_updated_at ON carts (updated_at)",
+        ],
+    ),
+    # skipped without pg_trgm; once it is installed, delete this migration's
+    # row from schema_migrations and migrate again
+    ("0006_item_trigram_indexes", ITEM_TRIGRAM_DDL),
+    # a row for every slot, for writers to lock, see `sharding.user_shard`
+    ("0007_shard_slot_rows", [SHARD_SLOTS_SEED]),
+]
+
+
+def migrate(engine: Engine) -> List[str]:
+    """Apply pending migrations in one transaction and return their names.
+
+    Other dialects (the SQLite test databases) are always created from the
+    current models, so there is nothing to migrate for them.
+    """
+    if engine.dialect.name != "postgresql":
+        return []
+
+    applied = []
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                " name TEXT PRIMARY KEY,"
+                " applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+            )
+        )
+        done = set(
+            connection.execute(text("SELECT name FROM schema_migrations")).scalars()
+        )
+        for name, statements in MIGRATIONS:
+            if name in done:
+                continue
+            for statement in statements:
+                connection.execute(text(statement))
+            connection.execute(
+                text("INSERT INTO schema_migrations (name) VALUES (:name)"),
+                {"name": name},
+            )
+            applied.append(name)
+    return applied
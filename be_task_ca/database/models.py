@@ -1,19 +1,53 @@
-from sqlalchemy import Column, ForeignKey, Integer, String, Text, Float
+from datetime import datetime, timezone
+
+from sqlalchemy import (
+    DDL,
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+    Uuid,
+    event,
+    func,
+)
 from sqlalchemy.orm import relationship
 
 from be_task_ca.database import Base
+from be_task_ca.database.sharding import SLOT_COUNT
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def updated_at_column() -> Column:
+    """Last change of a row, for incremental exports and the cart reaper."""
+    return Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=_utcnow,
+        onupdate=_utcnow,
+        server_default=func.now(),
+        index=True,
+    )
 
 
 class UserModel(Base):
     """SQLAlchemy model for users."""
     __tablename__ = "users"
 
-    id = Column(String(36), primary_key=True)  # UUID as string
+    id = Column(Uuid, primary_key=True)
     email = Column(String, unique=True, nullable=False)
     first_name = Column(String, nullable=False)
     last_name = Column(String, nullable=False)
     hashed_password = Column(String, nullable=False)
     shipping_address = Column(Text, nullable=True)
+    updated_at = updated_at_column()
 
     cart = relationship("CartModel", back_populates="user", uselist=False)
 
@@ -22,8 +56,16 @@ class CartModel(Base):
     """SQLAlchemy model for shopping carts."""
     __tablename__ = "carts"
 
-    id = Column(String(36), primary_key=True)  # UUID as string
-    user_id = Column(String(36), ForeignKey("users.id"), nullable=False)
+    id = Column(Uuid, primary_key=True)
+    user_id = Column(Uuid, ForeignKey("users.id"), nullable=False)
+    # summary maintained by every cart write, see PostgresCartRepository
+    line_count = Column(Integer, nullable=False, default=0, server_default="0")
+    unit_count = Column(Integer, nullable=False, default=0, server_default="0")
+    subtotal = Column(Float, nullable=False, default=0.0, server_default="0")
+    # catalog version the subtotal was priced at, NULL when never priced
+    price_version = Column(Integer, nullable=True)
+    # every cart write touches it, carts idle for long are reaped by it
+    updated_at = updated_at_column()
 
     user = relationship("UserModel", back_populates="cart")
     items = relationship("CartItemModel", back_populates="cart", cascade="all, delete-orphan")
@@ -33,9 +75,9 @@ class CartItemModel(Base):
     """SQLAlchemy model for items in a cart."""
     __tablename__ = "cart_items"
 
-    id = Column(String(36), primary_key=True)  # UUID as string
-    cart_id = Column(String(36), ForeignKey("carts.id"), nullable=False)
-    item_id = Column(String(36), nullable=False)  # UUID as string
+    id = Column(Uuid, primary_key=True)
+    cart_id = Column(Uuid, ForeignKey("carts.id"), nullable=False)
+    item_id = Column(Uuid, nullable=False)
     quantity = Column(Integer, nullable=False, default=1)
 
     cart = relationship("CartModel", back_populates="items")
@@ -45,8 +87,102 @@ class ItemModel(Base):
     """SQLAlchemy model for items."""
     __tablename__ = "items"
 
-    id = Column(String(36), primary_key=True)  # UUID as string
+    id = Column(Uuid, primary_key=True)
     name = Column(String, unique=True, nullable=False)
     description = Column(Text, nullable=False)
     price = Column(Float, nullable=False)
-    quantity = Column(Integer, nullable=False) 
\ No newline at end of file
+    quantity = Column(Integer, nullable=False)
+    updated_at = updated_at_column()
+
+
+class CatalogVersionModel(Base):
+    """Single-row counter bumped by every catalog write."""
+    __tablename__ = "catalog_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+
+
+event.listen(
+    CatalogVersionModel.__table__,
+    "after_create",
+    DDL("INSERT INTO catalog_version (id, version) VALUES (1, 0)"),
+)
+
+
+class IdempotencyKeyModel(Base):
+    """SQLAlchemy model for responses stored under an Idempotency-Key."""
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    # NULL while the first request with the key is still running
+    status_code = Column(Integer, nullable=True)
+    headers = Column(Text, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    expires_at = Column(Float, nullable=False, index=True)
+
+
+class ShardSlotModel(Base):
+    """Shard of a user hash slot, one row per slot.
+
+    Writers share-lock their slot's row for their transaction, so marking a
+    slot moving waits for the writes in progress, see `user_shard`.
+    """
+    __tablename__ = "shard_slots"
+
+    slot = Column(Integer, primary_key=True, autoincrement=False)
+    shard = Column(Integer, nullable=False)
+    # writes to the slot's users are refused while its rows are copied
+    moving = Column(Boolean, nullable=False, default=False)
+
+
+# every slot starts on shard 0; also adds the rows missing from older maps
+SHARD_SLOTS_SEED = (
+    "WITH RECURSIVE seed (slot) AS"
+    f" (SELECT 0 UNION ALL SELECT slot + 1 FROM seed WHERE slot < {SLOT_COUNT - 1})"
+    " INSERT INTO shard_slots (slot, shard, moving)"
+    " SELECT slot, 0, false FROM seed"
+    " WHERE slot NOT IN (SELECT slot FROM shard_slots)"
+)
+
+event.listen(ShardSlotModel.__table__, "after_create", DDL(SHARD_SLOTS_SEED))
+
+
+class UserDirectoryModel(Base):
+    """Email -> user id of sharded users, kept on the primary."""
+    __tablename__ = "user_directory"
+
+    email = Column(String, primary_key=True)
+    user_id = Column(Uuid, nullable=False)
+
+
+# Search indexes that only exist on PostgreSQL: a pattern index for prefix
+# matches, a full-text index and, where the pg_trgm extension (contrib) is
+# available, trigram indexes for substring matches; without them substring
+# searches still work, by scanning. The expressions must stay identical to
+# the ones used in `item/repository.py`.
+ITEM_SEARCH_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_items_name_prefix"
+    " ON items (lower(name) text_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_items_fulltext"
+    " ON items USING gin (to_tsvector('english', name || ' ' || description))",
+]
+ITEM_TRIGRAM_DDL = [
+    "DO $$ BEGIN"
+    " IF EXISTS (SELECT FROM pg_available_extensions WHERE name = 'pg_trgm') THEN"
+    " CREATE EXTENSION IF NOT EXISTS pg_trgm;"
+    " CREATE INDEX IF NOT EXISTS ix_items_name_trgm"
+    " ON items USING gin (lower(name) gin_trgm_ops);"
+    " CREATE INDEX IF NOT EXISTS ix_items_description_trgm"
+    " ON items USING gin (lower(description) gin_trgm_ops);"
+    " END IF;"
+    " END $$",
+]
+
+for statement in ITEM_SEARCH_DDL + ITEM_TRIGRAM_DDL:
+    event.listen(
+        ItemModel.__table__,
+        "after_create",
+        DDL(statement).execute_if(dialect="postgresql"),
+    )
@@ -0,0 +1,42 @@
+"""Connection pool instrumentation used by admission control."""
+import time
+
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.pool import Pool, QueuePool
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool keeping a moving average of how long checkouts wait.
+
+    The average only moves when connections are checked out, so it is
+    reported as zero once no checkout happened for `max_age` seconds.
+    """
+
+    smoothing = 0.2
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.average_wait = 0.0
+        self.last_checkout = 0.0
+
+    def recent_wait(self, max_age: float = 1.0) -> float:
+        """Average checkout wait in seconds, 0 when the pool has been idle."""
+        if time.monotonic() - self.last_checkout > max_age:
+            return 0.0
+        return self.average_wait
+
+    def _do_get(self):
+        started = time.monotonic()
+        try:
+            return super()._do_get()
+        finally:
+            self.last_checkout = time.monotonic()
+            waited = self.last_checkout - started
+            self.average_wait += (waited - self.average_wait) * self.smoothing
+
+
+def timed_pool_class(url: str) -> type[Pool]:
+    """TimedQueuePool where SQLAlchemy would use a QueuePool, else its default."""
+    parsed: URL = make_url(url)
+    default = parsed.get_dialect().get_pool_class(parsed)
+    return TimedQueuePool if issubclass(default, QueuePool) else default
@@ -0,0 +1,172 @@
+"""Moving user hash slots between shards, see `sharding.py`.
+
+Processes see the slot map up to one refresh interval late, so a slot moves
+in steps that stay correct for a process using either the old or the new
+map:
+
+1. the slot is marked moving: writers read the slot's row on the primary
+   and share-lock it for their transaction, so marking waits for the writes
+   in progress to commit, and later ones are refused (503 with Retry-After);
+   reads still go to the source;
+2. its users, carts and cart lines are copied to the target shard;
+3. the slot is pointed at the target and unmarked;
+4. one interval later, once nobody reads the source anymore, the source
+   rows are deleted.
+
+Moving again after an interruption is safe: rows left on the target by an
+unfinished copy are replaced.
+"""
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.engine import Connection
+
+from .models import (
+    CartItemModel,
+    CartModel,
+    ShardSlotModel,
+    UserDirectoryModel,
+    UserModel,
+)
+from .sharding import SLOT_COUNT, ShardSet, slot_of
+
+_users = UserModel.__table__
+_carts = CartModel.__table__
+_cart_items = CartItemModel.__table__
+BATCH_SIZE = 1000
+
+
+def plan_even(slot_shards: Sequence[int], shard_count: int) -> Dict[int, int]:
+    """Slot -> new shard moves that leave every shard an equal share of slots.
+
+    Only surplus slots move. Slots on shards beyond `shard_count` all move,
+    so this also empties shards that are being removed.
+    """
+    quotas = [
+        SLOT_COUNT // shard_count + (1 if shard < SLOT_COUNT % shard_count else 0)
+        for shard in range(shard_count)
+    ]
+    by_shard: Dict[int, List[int]] = {}
+    for slot, shard in enumerate(slot_shards):
+        by_shard.setdefault(shard, []).append(slot)
+
+    surplus = []
+    for shard, slots in sorted(by_shard.items()):
+        quota = quotas[shard] if shard < shard_count else 0
+        surplus += slots[quota:]
+    moves = {}
+    for shard in range(shard_count):
+        for _ in range(quotas[shard] - len(by_shard.get(shard, []))):
+            moves[surplus.pop()] = shard
+    return moves
+
+
+def group_moves(
+    moves: Dict[int, int], slot_shards: Sequence[int]
+) -> List[Tuple[int, int, Set[int]]]:
+    """(source, target, slots) for each pair of shards that slots move between."""
+    groups: Dict[Tuple[int, int], Set[int]] = {}
+    for slot, target in moves.items():
+        groups.setdefault((slot_shards[slot], target), set()).add(slot)
+    return [(source, target, slots) for (source, target), slots in groups.items()]
+
+
+def move_slots(
+    shards: ShardSet,
+    slots: Set[int],
+    source: int,
+    target: int,
+    wait: Optional[float] = None,
+) -> int:
+    """Move the users of `slots` from `source` to `target`, return how many."""
+    wait = shards.refresh_interval if wait is None else wait
+    _place(shards, slots, source, moving=True)
+    # a writer's databases commit one after the other, its shard may be last
+    time.sleep(wait)
+
+    with shards.engines[source].connect() as src:
+        user_ids = [
+            user_id
+            for (user_id,) in src.execute(select(_users.c.id))
+            if slot_of(user_id) in slots
+        ]
+        with shards.engines[target].begin() as dst:
+            for batch in _batches(user_ids):
+                _delete_users(dst, batch)
+                _copy_users(src, dst, batch)
+
+    _place(shards, slots, target, moving=False)
+    time.sleep(wait)
+
+    with shards.engines[source].begin() as src:
+        for batch in _batches(user_ids):
+            _delete_users(src, batch)
+    shards.refresh()
+    return len(user_ids)
+
+
+def backfill_directory(shards: ShardSet) -> int:
+    """Add the users missing from the email directory, return how many."""
+    added = 0
+    with shards.engines[0].begin() as primary:
+        for engine in shards.engines:
+            with engine.connect() as connection:
+                rows = connection.execute(
+                    select(_users.c.email, _users.c.id).execution_options(
+                        yield_per=BATCH_SIZE
+                    )
+                )
+                for batch in rows.partitions():
+                    known = set(
+                        primary.scalars(
+                            select(UserDirectoryModel.email).where(
+                                UserDirectoryModel.email.in_([r.email for r in batch])
+                            )
+                        )
+                    )
+                    missing = [
+                        {"email": email, "user_id": user_id}
+                        for email, user_id in batch
+                        if email not in known
+                    ]
+                    if missing:
+                        primary.execute(insert(UserDirectoryModel), missing)
+                        added += len(missing)
+    return added
+
+
+def _place(shards: ShardSet, slots: Set[int], shard: int, moving: bool) -> None:
+    # an update waits for the writers holding a share lock on the rows
+    with shards.engines[0].begin() as primary:
+        primary.execute(
+            update(ShardSlotModel)
+            .where(ShardSlotModel.slot.in_(slots))
+            .values(shard=shard, moving=moving)
+        )
+    shards.refresh()
+
+
+def _copy_users(src: Connection, dst: Connection, user_ids: List) -> None:
+    cart_ids = select(_carts.c.id).where(_carts.c.user_id.in_(user_ids))
+    for table, condition in (
+        (_users, _users.c.id.in_(user_ids)),
+        (_carts, _carts.c.user_id.in_(user_ids)),
+        (_cart_items, _cart_items.c.cart_id.in_(cart_ids)),
+    ):
+        rows = src.execute(select(table).where(condition)).mappings()
+        values = [dict(row) for row in rows]
+        if values:
+            dst.execute(insert(table), values)
+
+
+def _delete_users(connection: Connection, user_ids: List) -> None:
+    cart_ids = select(_carts.c.id).where(_carts.c.user_id.in_(user_ids))
+    connection.execute(delete(_cart_items).where(_cart_items.c.cart_id.in_(cart_ids)))
+    connection.execute(delete(_carts).where(_carts.c.user_id.in_(user_ids)))
+    connection.execute(delete(_users).where(_users.c.id.in_(user_ids)))
+
+
+def _batches(values: Sequence) -> Iterator[List]:
+    for start in range(0, len(values), BATCH_SIZE):
+        yield list(values[start:start + BATCH_SIZE])
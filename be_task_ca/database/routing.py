@@ -0,0 +1,166 @@
+"""Session routing between the primary database and read replicas.
+
+Repositories mark their read-only queries with `replica_reads(session)`.
+`RoutingSession` sends those to a replica and everything else (writes,
+reads that precede a write, flushes) to the primary. Once a session has
+written anything, all of its later reads stay on the primary so a request
+always sees its own writes.
+
+With a `ShardSet`, queries on the sharded tables go to the shard chosen by
+`sharding.user_shard` instead, see `sharding.py`.
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import ORMExecuteState, Session
+
+from .sharding import SHARD, SHARDED_TABLES, ShardSet
+
+logger = logging.getLogger(__name__)
+
+READ_ONLY = "read_only"
+WROTE = "wrote"
+REPLICA = "replica"
+
+
+def replica_lag(engine: Engine) -> float:
+    """Seconds a PostgreSQL standby is behind its primary, 0 when caught up."""
+    if engine.dialect.name != "postgresql":
+        return 0.0
+    with engine.connect() as connection:
+        return connection.execute(
+            text(
+                "SELECT CASE"
+                " WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+                " ELSE COALESCE(EXTRACT(EPOCH FROM"
+                " now() - pg_last_xact_replay_timestamp()), 0) END"
+            )
+        ).scalar_one()
+
+
+class ReplicaSet:
+    """Replica engines, filtered by how far they lag behind the primary.
+
+    Lag is re-probed at most every `check_interval` seconds. A replica that
+    lags more than `max_lag` seconds or cannot be probed is skipped until the
+    next probe; with no healthy replica left reads fall back to the primary.
+    """
+
+    def __init__(
+        self,
+        engines: List[Engine],
+        max_lag: float = 5.0,
+        check_interval: float = 1.0,
+        lag_probe: Callable[[Engine], float] = replica_lag,
+    ):
+        self.engines = list(engines)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lag_probe = lag_probe
+        self._healthy: List[Engine] = []
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def choose(self) -> Optional[Engine]:
+        """Pick a random healthy replica, or None to use the primary."""
+        healthy = self.healthy()
+        return random.choice(healthy) if healthy else None
+
+    def healthy(self) -> List[Engine]:
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            with self._lock:
+                if time.monotonic() - self._checked_at >= self.check_interval:
+                    self._healthy = [e for e in self.engines if self._within_lag(e)]
+                    self._checked_at = time.monotonic()
+        return self._healthy
+
+    def _within_lag(self, engine: Engine) -> bool:
+        try:
+            lag = self._lag_probe(engine)
+        except Exception:
+            logger.warning("Replica %s is unreachable", engine.url, exc_info=True)
+            return False
+        if lag > self.max_lag:
+            logger.warning("Replica %s lags %.1fs behind, skipping", engine.url, lag)
+            return False
+        return True
+
+
+class RoutingSession(Session):
+    """Session sending `replica_reads` queries to replicas, the rest to primary."""
+
+    def __init__(
+        self,
+        primary: Engine,
+        replicas: Optional[ReplicaSet] = None,
+        shards: Optional[ShardSet] = None,
+        **kwargs,
+    ):
+        kwargs["bind"] = primary
+        super().__init__(**kwargs)
+        self.primary = primary
+        self.replicas = replicas
+        self.shards = shards
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if (
+            self.shards is not None
+            and mapper is not None
+            and mapper.local_table.name in SHARDED_TABLES
+        ):
+            shard = self.info.get(SHARD)
+            if shard is None:
+                raise RuntimeError(
+                    f"{mapper.local_table.name} is sharded, query it in user_shard()"
+                )
+            return self.shards.engines[shard]
+        if (
+            self.replicas is not None
+            and self.info.get(READ_ONLY)
+            and not self.info.get(WROTE)
+            and not self._flushing
+        ):
+            # one replica per session so a request reads a consistent snapshot
+            if REPLICA not in self.info:
+                self.info[REPLICA] = self.replicas.choose()
+            if self.info[REPLICA] is not None:
+                return self.info[REPLICA]
+        return self.primary
+
+
+def has_written(session: Session) -> bool:
+    """Whether the session wrote, or holds changes to flush, since it began."""
+    return bool(
+        session.info.get(WROTE) or session.new or session.dirty or session.deleted
+    )
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _stick_to_primary_after_flush(session: Session, flush_context) -> None:
+    session.info[WROTE] = True
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _stick_to_primary_after_dml(orm_execute_state: ORMExecuteState) -> None:
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info[WROTE] = True
+
+
+@contextmanager
+def replica_reads(session: Session) -> Iterator[Session]:
+    """Mark the queries run inside the block as safe to serve from a replica.
+
+    Has no effect on sessions that are not a `RoutingSession`.
+    """
+    previous = session.info.get(READ_ONLY, False)
+    session.info[READ_ONLY] = True
+    try:
+        yield session
+    finally:
+        session.info[READ_ONLY] = previous
@@ -0,0 +1,190 @@
+"""Hash sharding of users and their carts over several databases.
+
+A user lives on one shard together with their cart and cart lines. Users
+are hashed into `SLOT_COUNT` slots and the `shard_slots` table on the
+primary maps slots to shards; slots it does not list stay on shard 0, the
+primary itself, so enabling sharding moves nothing until `poetry run
+rebalance` spreads the slots (see `rebalance.py`).
+
+Repositories wrap their queries on the sharded tables in
+`user_shard(session, user_id)`, which makes `RoutingSession` send them to
+that user's shard while everything else (items, the email directory, the
+slot map) stays on the primary. A session spanning several databases
+commits them one after the other, not atomically.
+"""
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import Executable, select
+from sqlalchemy.engine import Engine, Row
+from sqlalchemy.orm import Session
+
+SLOT_COUNT = 1024
+SHARDED_TABLES = {"users", "carts", "cart_items"}
+SHARD = "shard"
+
+
+class ShardMovingError(RuntimeError):
+    """The user's slot is being moved to another shard, retry shortly."""
+
+
+def slot_of(user_id: UUID) -> int:
+    """Slot of a user, stable across processes and independent of the UUID kind."""
+    digest = hashlib.blake2b(user_id.bytes, digest_size=8).digest()
+    return int.from_bytes(digest, "big") % SLOT_COUNT
+
+
+class ShardSet:
+    """Shard engines and the slot map, re-read at most every `refresh_interval`.
+
+    `engines[0]` is the primary, which also holds the slot map.
+    """
+
+    def __init__(self, engines: Sequence[Engine], refresh_interval: float = 1.0):
+        self.engines = list(engines)
+        self.refresh_interval = refresh_interval
+        self._slots: Dict[int, Tuple[int, bool]] = {}
+        self._loaded_at = float("-inf")
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(
+            max_workers=len(self.engines), thread_name_prefix="shard-gather"
+        )
+
+    def shard_of(self, user_id: UUID) -> int:
+        return self._placement(slot_of(user_id))[0]
+
+    def is_moving(self, user_id: UUID) -> bool:
+        return self._placement(slot_of(user_id))[1]
+
+    def slot_shards(self) -> List[int]:
+        """Current shard of every slot, indexed by slot."""
+        self._refresh_if_stale()
+        return [self._slots.get(slot, (0, False))[0] for slot in range(SLOT_COUNT)]
+
+    def _placement(self, slot: int) -> Tuple[int, bool]:
+        self._refresh_if_stale()
+        return self._slots.get(slot, (0, False))
+
+    def _refresh_if_stale(self) -> None:
+        if time.monotonic() - self._loaded_at >= self.refresh_interval:
+            with self._lock:
+                if time.monotonic() - self._loaded_at >= self.refresh_interval:
+                    self.refresh()
+
+    def refresh(self) -> None:
+        """Re-read the slot map from the primary now."""
+        from .models import ShardSlotModel
+
+        with self.engines[0].connect() as connection:
+            rows = connection.execute(
+                select(
+                    ShardSlotModel.slot, ShardSlotModel.shard, ShardSlotModel.moving
+                )
+            )
+            self._slots = {slot: (shard, moving) for slot, shard, moving in rows}
+        self._loaded_at = time.monotonic()
+
+    def gather(
+        self, statement: Executable, parameters: Optional[Dict[str, Any]] = None
+    ) -> List[Row]:
+        """Run a read of users on every shard in parallel and concatenate the rows.
+
+        A row is only kept from the shard its `id` maps to: while a slot
+        moves, its users are on both shards between the copy and the delete.
+        """
+        return [
+            row
+            for shard, rows in enumerate(
+                self._pool.map(
+                    lambda engine: _fetch_all(engine, statement, parameters),
+                    self.engines,
+                )
+            )
+            for row in rows
+            if self.shard_of(row.id) == shard
+        ]
+
+
+def _fetch_all(engine: Engine, statement: Executable, parameters) -> List[Row]:
+    with engine.connect() as connection:
+        return connection.execute(statement, parameters).all()
+
+
+def shards_of(session: Session) -> Optional[ShardSet]:
+    """The ShardSet of a sharded `RoutingSession`, None for any other session."""
+    return getattr(session, "shards", None)
+
+
+@contextmanager
+def on_shard(session: Session, shard: int) -> Iterator[Session]:
+    """Send the sharded tables' queries run inside the block to `shard`."""
+    previous = session.info.get(SHARD)
+    session.info[SHARD] = shard
+    try:
+        yield session
+    finally:
+        session.info[SHARD] = previous
+
+
+@contextmanager
+def user_shard(
+    session: Session, user_id: UUID, write: bool = False
+) -> Iterator[Session]:
+    """Run the block on the shard of `user_id`; no effect without sharding.
+
+    With `write`, the slot's placement is read from the primary rather than
+    the cached map, share-locking its row until the session's transaction
+    ends, so a slot is only marked moving once the writes to it in progress
+    have committed. Raise ShardMovingError while the slot is moving.
+    """
+    shards = shards_of(session)
+    if shards is None:
+        yield session
+        return
+    if write:
+        shard, moving = _lock_placement(session, user_id)
+        if moving:
+            raise ShardMovingError(f"User {user_id} is being moved, retry shortly")
+    else:
+        shard = shards.shard_of(user_id)
+    with on_shard(session, shard):
+        yield session
+
+
+def _lock_placement(session: Session, user_id: UUID) -> Tuple[int, bool]:
+    from .models import ShardSlotModel
+
+    row = session.execute(
+        select(ShardSlotModel.shard, ShardSlotModel.moving)
+        .where(ShardSlotModel.slot == slot_of(user_id))
+        .with_for_update(read=True)
+    ).one_or_none()
+    return (0, False) if row is None else tuple(row)
+
+
+def group_by_shard(
+    session: Session, user_ids: Sequence[UUID]
+) -> Dict[int, Set[UUID]]:
+    """User ids by the shard holding them, all on shard 0 without sharding."""
+    shards = shards_of(session)
+    groups: Dict[int, Set[UUID]] = {}
+    for user_id in user_ids:
+        shard = shards.shard_of(user_id) if shards is not None else 0
+        groups.setdefault(shard, set()).add(user_id)
+    return groups
+
+
+def each_shard(session: Session) -> Iterator[int]:
+    """Iterate over the shards, each iteration running on that shard."""
+    shards = shards_of(session)
+    if shards is None:
+        yield 0
+        return
+    for shard in range(len(shards.engines)):
+        with on_shard(session, shard):
+            yield shard
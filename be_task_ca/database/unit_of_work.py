@@ -0,0 +1,110 @@
+"""Transaction boundary of a request or use case.
+
+Repositories only add and flush; whoever opened the session commits it
+once through a `UnitOfWork`, so a use case touching several repositories
+is atomic and pays one commit. The API opens one per request (see
+`app.db_session_middleware`), background jobs and commands open their own.
+"""
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+BEFORE_COMMIT = "before_commit"
+AFTER_COMMIT = "after_commit"
+
+
+class UnitOfWork:
+    """Commits the session on a clean exit, rolls it back on an exception."""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def __enter__(self) -> "UnitOfWork":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+    def commit(self) -> None:
+        self.session.commit()
+
+    def rollback(self) -> None:
+        self.session.rollback()
+
+    def savepoint(self):
+        return savepoint(self.session)
+
+
+@contextmanager
+def savepoint(session: Session) -> Iterator[Session]:
+    """Undo only the block's writes if it raises, and re-raise."""
+    with session.begin_nested():
+        yield session
+
+
+def before_commit(session: Session, callback: Callable[[], None]) -> None:
+    """Call `callback` as the session's transaction commits, before it flushes.
+
+    For writes to contended rows: their locks are then held only while the
+    transaction commits. A savepoint rolled back drops the callbacks it added.
+    """
+    transaction = session.get_nested_transaction() or session.get_transaction()
+    session.info.setdefault(BEFORE_COMMIT, []).append((transaction, callback))
+
+
+def after_commit(session: Session, callback: Callable[[], None]) -> None:
+    """Call `callback` once the session's transaction commits, never on rollback."""
+    session.info.setdefault(AFTER_COMMIT, []).append(callback)
+
+
+@event.listens_for(Session, "before_commit")
+def _run_before_commit(session: Session) -> None:
+    if session.in_nested_transaction():
+        return
+    for _, callback in session.info.pop(BEFORE_COMMIT, []):
+        callback()
+
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(session: Session) -> None:
+    if session.in_nested_transaction():
+        # a savepoint was released, the transaction is still open
+        return
+    for callback in session.info.pop(AFTER_COMMIT, []):
+        callback()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_after_commit(session: Session, previous_transaction) -> None:
+    # savepoints and a failed flush's subtransaction end with a parent left
+    if previous_transaction.parent is None:
+        session.info.pop(AFTER_COMMIT, None)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_before_commit(session: Session, previous_transaction) -> None:
+    pending = session.info.get(BEFORE_COMMIT)
+    if pending:
+        session.info[BEFORE_COMMIT] = [
+            (transaction, callback)
+            for transaction, callback in pending
+            if not _within(transaction, previous_transaction)
+        ]
+
+
+def _within(transaction, ended) -> bool:
+    # a failed flush's subtransaction rolls back its savepoint or the root
+    while ended.parent is not None and not ended.nested:
+        ended = ended.parent
+    if ended.parent is None:
+        return True
+    while transaction is not None:
+        if transaction is ended:
+            return True
+        transaction = transaction.parent
+    return False
@@ -0,0 +1,110 @@
+import asyncio
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class DataLoader(Generic[K, V]):
+    """Batch and memoize key lookups made during the same event loop tick.
+
+    Every `load` issued before the loop gets back to the scheduler is
+    collected and resolved with a single call to `batch_load`, which receives
+    the distinct keys and returns a mapping of the keys it found. Results,
+    including misses (None), are memoized for the lifetime of the loader, so
+    create one loader per request. A blocking `batch_load` is handed to
+    `run`, e.g. `run_blocking`, instead of being called on the event loop.
+    """
+
+    def __init__(
+        self,
+        batch_load: Callable[[List[K]], Dict[K, V]],
+        run: Optional[Callable[..., Awaitable[Dict[K, V]]]] = None,
+    ):
+        self._batch_load = batch_load
+        self._run = run
+        self._cache: Dict[K, asyncio.Future] = {}
+        self._pending: List[Tuple[K, asyncio.Future]] = []
+        self._batches: Set[asyncio.Task] = set()
+
+    async def load(self, key: K) -> Optional[V]:
+        """Load one value, batched with the other loads of this tick."""
+        return await self._future(key)
+
+    async def load_many(self, keys: Iterable[K]) -> List[Optional[V]]:
+        """Load several values with one batch call, in the order of `keys`."""
+        # the keys join the pending batch now, not when gather's tasks start
+        futures = [self._future(key) for key in keys]
+        return list(await asyncio.gather(*futures))
+
+    def _future(self, key: K) -> asyncio.Future:
+        future = self._cache.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._cache[key] = future
+            self._pending.append((key, future))
+            if len(self._pending) == 1:
+                loop.call_soon(self._dispatch)
+        return future
+
+    def prime(self, key: K, value: V) -> None:
+        """Seed the cache, e.g. with an entity the request just wrote."""
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(value)
+        self._cache[key] = future
+
+    def clear(self, key: K) -> None:
+        """Forget a memoized value so the next load fetches it again."""
+        self._cache.pop(key, None)
+
+    def _dispatch(self) -> None:
+        pending, self._pending = self._pending, []
+        keys = [key for key, _ in pending]
+        if self._run is not None:
+            # keep a reference, the loop only holds tasks weakly
+            batch = asyncio.ensure_future(self._dispatch_in(pending, keys))
+            self._batches.add(batch)
+            batch.add_done_callback(self._batches.discard)
+            return
+        try:
+            found = self._batch_load(keys)
+        except Exception as error:
+            self._fail(pending, error)
+            return
+        self._settle(pending, found)
+
+    async def _dispatch_in(
+        self, pending: List[Tuple[K, asyncio.Future]], keys: List[K]
+    ) -> None:
+        try:
+            found = await self._run(self._batch_load, keys)
+        except Exception as error:
+            self._fail(pending, error)
+            return
+        self._settle(pending, found)
+
+    def _settle(self, pending: List[Tuple[K, asyncio.Future]], found: Dict[K, V]):
+        for key, future in pending:
+            if not future.done():
+                future.set_result(found.get(key))
+
+    def _fail(self, pending: List[Tuple[K, asyncio.Future]], error: Exception):
+        for key, future in pending:
+            # failures are not memoized, a later load may retry
+            if self._cache.get(key) is future:
+                del self._cache[key]
+            if not future.done():
+                future.set_exception(error)
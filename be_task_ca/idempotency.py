@@ -0,0 +1,351 @@
+"""Idempotency-Key support for the create endpoints.
+
+A client retrying `POST /users/` or `POST /items/` sends the same
+`Idempotency-Key` header with every attempt. The first attempt runs and its
+response is stored for `idempotency_ttl_seconds`; retries with the same key
+and body get that response replayed (marked `Idempotent-Replayed: true`)
+without running the endpoint again. A retry arriving while the first
+attempt still runs waits for it. Reusing a key with a different body is
+answered 422, a response of 500 or above is not stored so it can be retried.
+
+Stored responses live in a bounded in-process LRU in front of the
+`idempotency_keys` table, which all workers share. The table row is claimed
+before the endpoint runs, so duplicates sent to different workers also run
+only once. A claim whose request never stores a response, because its
+worker died, is taken over by the next retry after `idempotency_lease_seconds`.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple, Union
+
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import database
+from .database.models import IdempotencyKeyModel
+from .metrics import registry
+from .profiling import PROFILE_ID_HEADER
+from .settings import settings
+
+IDEMPOTENCY_HEADER = b"idempotency-key"
+REPLAYED_HEADER = (b"idempotent-replayed", b"true")
+IDEMPOTENT_PATHS = {"/users/", "/items/"}
+MAX_KEY_LENGTH = 255
+# interval between checks of a key claimed by another worker
+POLL_SECONDS = 0.05
+# expired rows are deleted at most this often
+PURGE_INTERVAL = 60.0
+# headers of one delivery rather than of the response: hop-by-hop ones,
+# the encoding outer middleware (GZip) chose for one client, the length
+# recomputed on replay and the id of a profiled request
+UNSTORED_HEADERS = frozenset(
+    {
+        b"connection",
+        b"keep-alive",
+        b"proxy-authenticate",
+        b"proxy-authorization",
+        b"te",
+        b"trailer",
+        b"transfer-encoding",
+        b"upgrade",
+        b"content-encoding",
+        b"content-length",
+        PROFILE_ID_HEADER.lower().encode("latin-1"),
+    }
+)
+
+replayed = registry.counter(
+    "idempotency_replayed_total", "Responses replayed for a repeated key, by path."
+)
+
+
+@dataclass(slots=True)
+class StoredResponse:
+    fingerprint: str
+    status_code: int
+    headers: Tuple[Tuple[bytes, bytes], ...]
+    body: bytes
+    expires_at: float
+
+
+class Pending:
+    """Marker for a key whose first request has not finished yet."""
+
+
+PENDING = Pending()
+Claim = Union[None, Pending, StoredResponse]
+
+
+class IdempotencyStore:
+    """Stored responses by key: an LRU of recent ones over a database table."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        ttl: float,
+        max_entries: int,
+        lease: float = 60.0,
+    ):
+        self._session_factory = session_factory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lease = lease
+        self._memory: "OrderedDict[str, StoredResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._purged_at = 0.0
+
+    def claim(self, key: str, fingerprint: str) -> Claim:
+        """Reserve `key` for a new request, None if this caller got it.
+
+        Otherwise returns the stored response, or PENDING while the request
+        that claimed the key is still running. A claim holds the key for
+        `lease` seconds, extended to `ttl` once its response is saved.
+        """
+        now = time.time()
+        stored = self._remembered(key, now)
+        if stored is not None:
+            return stored
+
+        with self._session_factory() as session:
+            if now - self._purged_at > PURGE_INTERVAL:
+                self._purged_at = now
+                session.execute(
+                    delete(IdempotencyKeyModel).where(
+                        IdempotencyKeyModel.expires_at < now
+                    )
+                )
+            row = session.get(IdempotencyKeyModel, key)
+            if row is not None and row.expires_at < now:
+                session.delete(row)
+                session.flush()
+                row = None
+            if row is None:
+                session.add(
+                    IdempotencyKeyModel(
+                        key=key, fingerprint=fingerprint, expires_at=now + self.lease
+                    )
+                )
+                try:
+                    session.commit()
+                    return None
+                except IntegrityError:
+                    # claimed by another worker in the meantime
+                    session.rollback()
+                    row = session.get(IdempotencyKeyModel, key)
+                    if row is None:
+                        return PENDING
+            if row.status_code is None:
+                return PENDING
+            stored = StoredResponse(
+                fingerprint=row.fingerprint,
+                status_code=row.status_code,
+                headers=tuple(
+                    (name.encode("latin-1"), value.encode("latin-1"))
+                    for name, value in json.loads(row.headers)
+                ),
+                body=row.body,
+                expires_at=row.expires_at,
+            )
+        self._remember(key, stored)
+        return stored
+
+    def save(self, key: str, response: StoredResponse) -> None:
+        """Store the response of the request that claimed `key`."""
+        headers = [
+            [name.decode("latin-1"), value.decode("latin-1")]
+            for name, value in response.headers
+        ]
+        with self._session_factory() as session:
+            row = session.get(IdempotencyKeyModel, key)
+            if row is None:
+                return
+            row.status_code = response.status_code
+            row.headers = json.dumps(headers)
+            row.body = response.body
+            row.expires_at = response.expires_at
+            session.commit()
+        self._remember(key, response)
+
+    def release(self, key: str) -> None:
+        """Give up a claim, so the next request with `key` runs again."""
+        with self._session_factory() as session:
+            session.execute(
+                delete(IdempotencyKeyModel).where(
+                    IdempotencyKeyModel.key == key,
+                    IdempotencyKeyModel.status_code.is_(None),
+                )
+            )
+            session.commit()
+
+    def _remembered(self, key: str, now: float) -> Optional[StoredResponse]:
+        with self._lock:
+            stored = self._memory.get(key)
+            if stored is None:
+                return None
+            if stored.expires_at < now:
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return stored
+
+    def _remember(self, key: str, stored: StoredResponse) -> None:
+        with self._lock:
+            self._memory[key] = stored
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware replaying stored responses of repeated create requests."""
+
+    def __init__(self, app: ASGIApp, store: Optional[IdempotencyStore] = None):
+        self.app = app
+        if store is None:
+            store = IdempotencyStore(
+                database.Session,
+                ttl=settings.idempotency_ttl_seconds,
+                max_entries=settings.idempotency_memory_entries,
+                lease=settings.idempotency_lease_seconds,
+            )
+        self.store = store
+        self._in_flight: dict = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or scope["path"] not in IDEMPOTENT_PATHS
+        ):
+            return await self.app(scope, receive, send)
+        client_key = dict(scope["headers"]).get(IDEMPOTENCY_HEADER)
+        if client_key is None:
+            return await self.app(scope, receive, send)
+        if not 0 < len(client_key) <= MAX_KEY_LENGTH:
+            detail = f"Idempotency-Key must have 1 to {MAX_KEY_LENGTH} characters"
+            response = JSONResponse({"detail": detail}, status_code=400)
+            return await response(scope, receive, send)
+
+        body = await _read_body(receive)
+        key = f"{scope['path']} {client_key.decode('latin-1')}"
+        fingerprint = hashlib.sha256(body).hexdigest()
+
+        # duplicates in this process wait here, others poll the claimed row
+        while key in self._in_flight:
+            await self._in_flight[key].wait()
+        deadline = time.monotonic() + settings.idempotency_wait_seconds
+        while True:
+            claim = await run_in_threadpool(self.store.claim, key, fingerprint)
+            if claim is not PENDING or key in self._in_flight:
+                break
+            if time.monotonic() > deadline:
+                response = JSONResponse(
+                    {"detail": "A request with this Idempotency-Key is in progress"},
+                    status_code=409,
+                )
+                return await response(scope, receive, send)
+            await asyncio.sleep(POLL_SECONDS)
+
+        if isinstance(claim, StoredResponse):
+            return await self._replay(claim, fingerprint, scope, receive, send)
+        if claim is PENDING:
+            # claimed meanwhile by a request of this process, wait for it
+            return await self(scope, _replay_body(body), send)
+
+        self._in_flight[key] = asyncio.Event()
+        try:
+            await self._run_and_store(key, fingerprint, body, scope, send)
+        finally:
+            self._in_flight.pop(key).set()
+
+    async def _run_and_store(self, key, fingerprint, body, scope, send) -> None:
+        start: dict = {}
+        chunks: List[bytes] = []
+
+        async def capture(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # a copy: outer middleware may change the list in place
+                start.update(message, headers=list(message.get("headers", [])))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, _replay_body(body), capture)
+        except BaseException:
+            await run_in_threadpool(self.store.release, key)
+            raise
+        if not start or start["status"] >= 500:
+            await run_in_threadpool(self.store.release, key)
+            return
+        stored = StoredResponse(
+            fingerprint=fingerprint,
+            status_code=start["status"],
+            headers=_stored_headers(start["headers"]),
+            body=b"".join(chunks),
+            expires_at=time.time() + self.store.ttl,
+        )
+        await run_in_threadpool(self.store.save, key, stored)
+
+    async def _replay(self, stored, fingerprint, scope, receive, send) -> None:
+        if stored.fingerprint != fingerprint:
+            response = JSONResponse(
+                {"detail": "Idempotency-Key was already used with another body"},
+                status_code=422,
+            )
+            return await response(scope, receive, send)
+        replayed.inc(path=scope["path"])
+        await send(
+            {
+                "type": "http.response.start",
+                "status": stored.status_code,
+                "headers": [
+                    *stored.headers,
+                    (b"content-length", str(len(stored.body)).encode("latin-1")),
+                    REPLAYED_HEADER,
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": stored.body})
+
+
+def _stored_headers(headers) -> Tuple[Tuple[bytes, bytes], ...]:
+    """An immutable copy of the headers worth replaying."""
+    return tuple(
+        (bytes(name), bytes(value))
+        for name, value in headers
+        if bytes(name).lower() not in UNSTORED_HEADERS
+    )
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+def _replay_body(body: bytes) -> Receive:
+    """A receive callable handing the already read body to the app."""
+    sent = False
+
+    async def receive() -> Message:
+        nonlocal sent
+        if sent:
+            # nothing more to read, block like a client that is still connected
+            await asyncio.Event().wait()
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return receive
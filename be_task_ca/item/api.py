@@ -1,11 +1,35 @@
-from fastapi import APIRouter, Depends
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from .usecases import create_item, get_all
+from .model import SearchMode
+from .repository import get_catalog_version
+from .snapshot import catalog_snapshot
+from .usecases import (
+    ITEM_ROW_FIELDS,
+    ITEM_ROW_TYPES,
+    autocomplete_items,
+    create_item,
+    get_all_rows,
+    search_items,
+)
 
+from .. import database
+from ..changes import ChangeListener, event_stream, hub as change_hub
 from ..common import get_db
+from ..export import ExportFormat, export_response
+from ..serialization import json_rows_response, rows_response
+from ..settings import settings
 
-from .schema import CreateItemRequest, CreateItemResponse
+from .schema import (
+    AllItemsRepsonse,
+    AutocompleteResponse,
+    CreateItemRequest,
+    CreateItemResponse,
+)
 
 
 item_router = APIRouter(
@@ -13,6 +37,30 @@ item_router = APIRouter(
     tags=["item"],
 )
 
+change_listener = (
+    ChangeListener(database.engine, change_hub)
+    if settings.change_feed_notify
+    else None
+)
+
+
+@item_router.on_event("startup")
+def start_catalog() -> None:
+    """Map the catalog snapshot, start the change feed at the current version."""
+    if settings.catalog_snapshot_path:
+        # before the first request, so the first wave is served from it
+        catalog_snapshot.load(settings.catalog_snapshot_path)
+    with database.Session() as session:
+        change_hub.start(get_catalog_version(session))
+    if change_listener is not None:
+        change_listener.start()
+
+
+@item_router.on_event("shutdown")
+def stop_catalog() -> None:
+    if change_listener is not None:
+        change_listener.stop()
+
 
 @item_router.post("/")
 async def post_item(
@@ -21,6 +69,66 @@ async def post_item(
     return create_item(item, db)
 
 
-@item_router.get("/")
-async def get_items(db: Session = Depends(get_db)):
-    return get_all(db)
+# sync endpoints run in the threadpool, off the event loop; concurrent list
+# calls can be coalesced there
+@item_router.get("/", response_model=AllItemsRepsonse)
+def get_items(db: Session = Depends(get_db), accept: str = Header("")):
+    rows = get_all_rows(db)
+    return rows_response(accept, ITEM_ROW_FIELDS, ITEM_ROW_TYPES, rows, "items")
+
+
+@item_router.get("/search", response_model=AllItemsRepsonse)
+def search(
+    q: str = Query(min_length=1, max_length=200),
+    mode: SearchMode = SearchMode.SUBSTRING,
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+):
+    rows = search_items(q, mode, limit, db)
+    return json_rows_response(ITEM_ROW_FIELDS, rows, envelope="items")
+
+
+@item_router.get("/autocomplete", response_model=AutocompleteResponse)
+def autocomplete(
+    prefix: str = Query(min_length=1, max_length=200),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+):
+    suggestions = autocomplete_items(prefix, limit, db)
+    return json_rows_response(("name", "id"), suggestions, envelope="suggestions")
+
+
+@item_router.get("/export")
+def export_items(
+    format: ExportFormat = ExportFormat.NDJSON,
+    updated_since: Optional[datetime] = None,
+    accept_encoding: str = Header(""),
+) -> Response:
+    """Stream all items, or those changed after `updated_since`."""
+    return export_response("items", format, updated_since, accept_encoding)
+
+
+@item_router.get("/changes")
+async def item_changes(
+    since: Optional[int] = None,
+    last_event_id: Optional[int] = Header(None),
+) -> StreamingResponse:
+    """Stream item changes as Server-Sent Events instead of polling the list.
+
+    Reconnecting clients resume after `Last-Event-ID` (or `since`); a `reset`
+    event means changes were missed and the list has to be fetched again.
+    """
+    return StreamingResponse(
+        event_stream(
+            change_hub,
+            last_event_id if last_event_id is not None else since,
+            settings.change_feed_heartbeat_seconds,
+        ),
+        media_type="text/event-stream",
+        # identity keeps GZipMiddleware from holding events back in its buffer
+        headers={
+            "Cache-Control": "no-cache",
+            "Content-Encoding": "identity",
+            "X-Accel-Buffering": "no",
+        },
+    )
@@ -0,0 +1,34 @@
+from uuid import UUID
+
+from fastapi import Depends
+from sqlalchemy.orm import Session
+
+from ..common import get_db
+from ..database.blocking import run_blocking
+from ..dataloader import DataLoader
+from .model import Item
+from .repository import find_items_by_ids, get_catalog_version
+from .snapshot import catalog_snapshot
+
+
+def get_item_loader(db: Session = Depends(get_db)) -> DataLoader[UUID, Item]:
+    """Request-scoped loader batching item lookups by ID into one query.
+
+    FastAPI caches dependencies per request, so every consumer in the same
+    request shares this loader and its memoized results. While a catalog
+    snapshot is current, the items are read from it, and only the ones it
+    does not hold from the database. The batches run in the threadpool.
+    """
+
+    def load(ids):
+        rows = catalog_snapshot.find(ids, lambda: get_catalog_version(db)) or {}
+        items = {
+            item_id: Item(item_id, name, description, price, quantity)
+            for item_id, (name, description, price, quantity, _) in rows.items()
+        }
+        missing = [item_id for item_id in ids if item_id not in items]
+        if missing:
+            items.update((item.id, item) for item in find_items_by_ids(missing, db))
+        return items
+
+    return DataLoader(load, run=run_blocking)
@@ -1,8 +1,16 @@
 from dataclasses import dataclass
+from enum import Enum
 from uuid import UUID, uuid4
 
 
-@dataclass
+class SearchMode(str, Enum):
+    """How an item search query is matched against names and descriptions."""
+    PREFIX = "prefix"
+    SUBSTRING = "substring"
+    FULLTEXT = "fulltext"
+
+
+@dataclass(slots=True)
 class Item:
     """Domain model for items."""
     id: UUID
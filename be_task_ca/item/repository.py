@@ -1,30 +1,81 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from uuid import UUID
+from sqlalchemy import (
+    Select,
+    bindparam,
+    case,
+    func,
+    literal_column,
+    or_,
+    select,
+    update,
+)
 from sqlalchemy.orm import Session
-from be_task_ca.database.models import ItemModel
-from .model import Item
+from be_task_ca.changes import Change, record_change
+from be_task_ca.database.models import CatalogVersionModel, ItemModel
+from be_task_ca.database.routing import replica_reads
+from be_task_ca.database.unit_of_work import before_commit
+from .model import Item, SearchMode
 
 
 def save_item(item: Item, db: Session) -> Item:
     """Save an item to the database."""
     item_model = ItemModel(
-        id=str(item.id),
+        id=item.id,
         name=item.name,
         description=item.description,
         price=item.price,
         quantity=item.quantity,
     )
     db.add(item_model)
-    db.commit()
+    # every catalog write locks the one catalog_version row until it commits,
+    # so bump it as the commit starts rather than for the rest of the request
+    before_commit(db, lambda: record_item_change(db, item))
+    db.flush()
     return item
 
 
+def record_item_change(db: Session, item: Item) -> None:
+    """Bump the catalog version and record the change numbered by it."""
+    record_change(db, item_change(bump_catalog_version(db), item))
+
+
+def item_change(version: int, item: Item) -> Change:
+    """Change feed event of an item, without its unbounded description."""
+    return Change(
+        version,
+        "item",
+        {
+            "id": item.id,
+            "name": item.name,
+            "price": item.price,
+            "quantity": item.quantity,
+        },
+    )
+
+
+def bump_catalog_version(db: Session) -> int:
+    """Mark cached data derived from the catalog, such as cart subtotals, stale."""
+    return db.execute(
+        update(CatalogVersionModel)
+        .where(CatalogVersionModel.id == 1)
+        .values(version=CatalogVersionModel.version + 1)
+        .returning(CatalogVersionModel.version)
+    ).scalar_one()
+
+
+def get_catalog_version(db: Session) -> int:
+    """Current catalog version, the sequence number of the latest change."""
+    return db.scalar(select(CatalogVersionModel.version))
+
+
 def get_all_items(db: Session) -> List[Item]:
     """Get all items from the database."""
-    item_models = db.query(ItemModel).all()
+    with replica_reads(db):
+        item_models = db.query(ItemModel).all()
     return [
         Item(
-            id=UUID(item_model.id),
+            id=item_model.id,
             name=item_model.name,
             description=item_model.description,
             price=item_model.price,
@@ -34,13 +85,113 @@ def get_all_items(db: Session) -> List[Item]:
     ]
 
 
+# Column order of the plain tuples returned by the `*_item_rows` functions.
+ITEM_ROW_FIELDS = ("name", "description", "price", "quantity", "id")
+ITEM_ROW_TYPES = (str, str, float, int, UUID)
+
+# Same expression as the ix_items_fulltext index, so PostgreSQL can use it.
+_ITEM_TSVECTOR = literal_column(
+    "to_tsvector('english', items.name || ' ' || items.description)"
+)
+
+
+def _item_row_query() -> Select:
+    return select(
+        ItemModel.name,
+        ItemModel.description,
+        ItemModel.price,
+        ItemModel.quantity,
+        ItemModel.id,
+    )
+
+
+def _matches(column, term: str, anywhere: bool = True):
+    """Case-insensitive LIKE on lower(column) with wildcards in `term` escaped."""
+    term = term.lower()
+    for char in ("\\", "%", "_"):
+        term = term.replace(char, "\\" + char)
+    pattern = f"%{term}%" if anywhere else f"{term}%"
+    return func.lower(column).like(pattern, escape="\\")
+
+
+def get_all_item_rows(db: Session) -> List[Tuple]:
+    """Get all items as plain tuples, skipping ORM and domain object hydration."""
+    with replica_reads(db):
+        return db.execute(_item_row_query()).all()
+
+
+def search_item_rows(
+    query: str, mode: SearchMode, limit: int, db: Session
+) -> List[Tuple]:
+    """Search items by name/description and return ranked plain rows.
+
+    Prefix and substring searches are served by the pattern and trigram
+    indexes on PostgreSQL. Full-text search uses the tsvector index there and
+    falls back to requiring every word as a substring on other databases.
+    """
+    if not query.strip():
+        return []
+
+    stmt = _item_row_query()
+    if mode == SearchMode.PREFIX:
+        stmt = stmt.where(_matches(ItemModel.name, query, anywhere=False))
+        stmt = stmt.order_by(func.length(ItemModel.name), ItemModel.name)
+    elif mode == SearchMode.SUBSTRING:
+        in_name = _matches(ItemModel.name, query)
+        stmt = stmt.where(or_(in_name, _matches(ItemModel.description, query)))
+        # name prefix before name substring before description-only matches
+        stmt = stmt.order_by(
+            case(
+                (_matches(ItemModel.name, query, anywhere=False), 0),
+                (in_name, 1),
+                else_=2,
+            ),
+            func.length(ItemModel.name),
+            ItemModel.name,
+        )
+    elif db.get_bind().dialect.name == "postgresql":
+        tsquery = func.plainto_tsquery(literal_column("'english'"), query)
+        stmt = stmt.where(_ITEM_TSVECTOR.op("@@")(tsquery))
+        stmt = stmt.order_by(
+            func.ts_rank(_ITEM_TSVECTOR, tsquery).desc(), ItemModel.name
+        )
+    else:
+        terms = query.split()
+        for term in terms:
+            in_name = _matches(ItemModel.name, term)
+            stmt = stmt.where(or_(in_name, _matches(ItemModel.description, term)))
+        # items matching more of the words in their name rank first
+        name_hits = [
+            case((_matches(ItemModel.name, term), 1), else_=0) for term in terms
+        ]
+        stmt = stmt.order_by(sum(name_hits[1:], name_hits[0]).desc(), ItemModel.name)
+
+    with replica_reads(db):
+        return db.execute(stmt.limit(limit)).all()
+
+
+def get_item_name_rows(db: Session) -> List[Tuple]:
+    """Get (name, id) of all items, the input of the autocomplete index."""
+    with replica_reads(db):
+        return db.execute(select(ItemModel.name, ItemModel.id)).all()
+
+
+# Point lookups are built once, so executing them skips query construction
+# and SQLAlchemy reuses the compiled form under their memoized cache key.
+_ITEM_BY_NAME = select(ItemModel).where(ItemModel.name == bindparam("name"))
+_ITEM_BY_ID = select(ItemModel).where(ItemModel.id == bindparam("id"))
+_ITEMS_BY_IDS = select(ItemModel).where(
+    ItemModel.id.in_(bindparam("ids", expanding=True))
+)
+
+
 def find_item_by_name(name: str, db: Session) -> Optional[Item]:
     """Find an item by name."""
-    item_model = db.query(ItemModel).filter(ItemModel.name == name).first()
+    item_model = db.scalars(_ITEM_BY_NAME, {"name": name}).one_or_none()
     if not item_model:
         return None
     return Item(
-        id=UUID(item_model.id),
+        id=item_model.id,
         name=item_model.name,
         description=item_model.description,
         price=item_model.price,
@@ -50,13 +201,29 @@ def find_item_by_name(name: str, db: Session) -> Optional[Item]:
 
 def find_item_by_id(id: UUID, db: Session) -> Optional[Item]:
     """Find an item by ID."""
-    item_model = db.query(ItemModel).filter(ItemModel.id == str(id)).first()
+    item_model = db.scalars(_ITEM_BY_ID, {"id": id}).one_or_none()
     if not item_model:
         return None
     return Item(
-        id=UUID(item_model.id),
+        id=item_model.id,
         name=item_model.name,
         description=item_model.description,
         price=item_model.price,
         quantity=item_model.quantity,
     )
+
+
+def find_items_by_ids(ids: List[UUID], db: Session) -> List[Item]:
+    """Find all items with the given IDs in a single query."""
+    with replica_reads(db):
+        item_models = db.scalars(_ITEMS_BY_IDS, {"ids": list(ids)}).all()
+    return [
+        Item(
+            id=item_model.id,
+            name=item_model.name,
+            description=item_model.description,
+            price=item_model.price,
+            quantity=item_model.quantity,
+        )
+        for item_model in item_models
+    ]
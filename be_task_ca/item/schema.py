@@ -16,3 +16,12 @@ class CreateItemResponse(CreateItemRequest):
 
 class AllItemsRepsonse(BaseModel):
     items: List[CreateItemResponse]
+
+
+class AutocompleteSuggestion(BaseModel):
+    name: str
+    id: UUID
+
+
+class AutocompleteResponse(BaseModel):
+    suggestions: List[AutocompleteSuggestion]
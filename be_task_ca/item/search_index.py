@@ -0,0 +1,67 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+
+class PrefixIndex:
+    """Immutable sorted index of item names for prefix (autocomplete) lookups."""
+
+    def __init__(self, entries: Iterable[Tuple[str, UUID]]):
+        ordered = sorted((name.lower(), name, item_id) for name, item_id in entries)
+        self._keys = [key for key, _, _ in ordered]
+        self._entries = [(name, item_id) for _, name, item_id in ordered]
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def search(self, prefix: str, limit: int) -> List[Tuple[str, UUID]]:
+        """Return up to `limit` (name, id) pairs whose name starts with `prefix`.
+
+        Matches come back in case-insensitive alphabetical order, so an exact
+        match always ranks first and shorter completions precede longer ones
+        sharing the same stem.
+        """
+        prefix = prefix.lower()
+        start = bisect_left(self._keys, prefix)
+        results = []
+        for position in range(start, min(start + limit, len(self._keys))):
+            if not self._keys[position].startswith(prefix):
+                break
+            results.append(self._entries[position])
+        return results
+
+
+class RefreshingPrefixIndex:
+    """Process-wide prefix index rebuilt from the database when it gets old.
+
+    The index is rebuilt by the first lookup after `max_age` seconds or after
+    `invalidate()`, which writes in this process call. Writes in other worker
+    processes become visible after at most `max_age` seconds.
+    """
+
+    def __init__(self, max_age: float = 30.0):
+        self.max_age = max_age
+        self._index: Optional[PrefixIndex] = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        self._index = None
+
+    def get(self, load: Callable[[], Iterable[Tuple[str, UUID]]]) -> PrefixIndex:
+        """Return the current index, rebuilding it with `load` when stale."""
+        index = self._index
+        if index is not None and time.monotonic() - self._built_at < self.max_age:
+            return index
+        with self._lock:
+            # another thread may have rebuilt it while we waited
+            age = time.monotonic() - self._built_at
+            if self._index is None or age >= self.max_age:
+                self._index = PrefixIndex(load())
+                self._built_at = time.monotonic()
+            return self._index
+
+
+item_name_index = RefreshingPrefixIndex()
@@ -0,0 +1,216 @@
+"""Catalog snapshot file serving item reads while a new worker warms up.
+
+`poetry run snapshot` writes every item to one compact file stamped with
+the catalog version it was taken at. Workers memory-map it on startup, so
+they share its pages through the page cache, and serve the item list from
+it, and look items up by id in it, instead of all querying the database
+at once after a deploy.
+
+The snapshot is used only while its version is the current catalog
+version, which is re-read at most every `check_interval` seconds; that
+interval bounds how long a changed catalog can still be served from it.
+Once the version moved on, the snapshot is dropped for good and reads go
+to the database. Catalog writes of this process drop it as soon as they
+commit. Files older than `max_age` seconds are not loaded.
+
+Layout, little-endian: a header (magic, format, catalog version, written
+at, item count), one (id, offset) entry per item sorted by id, then the
+items (price, quantity, then the name and description as length-prefixed
+UTF-8, a length of 0xFFFFFFFF meaning no description).
+"""
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+
+from ..settings import settings
+from .repository import get_all_item_rows, get_catalog_version
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CATALOG\x00"
+FORMAT = 1
+_HEADER = struct.Struct("<8sHqdI")
+_ENTRY = struct.Struct("<16sQ")
+_FIXED = struct.Struct("<dq")
+_LENGTH = struct.Struct("<I")
+_NONE = 0xFFFFFFFF
+
+
+def write_snapshot(session: Session, path: str) -> Tuple[int, int]:
+    """Write the catalog to `path`, return its version and item count."""
+    # version first: a write landing before the rows are read makes the
+    # snapshot look stale, never current with an item missing
+    version = get_catalog_version(session)
+    rows = sorted(get_all_item_rows(session), key=lambda row: row.id.bytes)
+
+    records = []
+    for name, description, price, quantity, _ in rows:
+        record = [_FIXED.pack(price, quantity), *_text(name), *_text(description)]
+        records.append(b"".join(record))
+
+    offset = _HEADER.size + _ENTRY.size * len(rows)
+    entries = []
+    for row, record in zip(rows, records):
+        entries.append(_ENTRY.pack(row.id.bytes, offset))
+        offset += len(record)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as file:
+        file.write(_HEADER.pack(MAGIC, FORMAT, version, time.time(), len(rows)))
+        file.writelines(entries)
+        file.writelines(records)
+    # readers see the old file or the complete new one
+    os.replace(file.name, path)
+    return version, len(rows)
+
+
+def _text(value: Optional[str]) -> Tuple[bytes, bytes]:
+    if value is None:
+        return _LENGTH.pack(_NONE), b""
+    encoded = value.encode()
+    return _LENGTH.pack(len(encoded)), encoded
+
+
+class SnapshotFile:
+    """A memory-mapped snapshot, its items decoded on demand."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < _HEADER.size:
+            raise ValueError(f"{path} is not a catalog snapshot")
+        magic, fmt, self.version, self.written_at, self.count = _HEADER.unpack_from(
+            self._map
+        )
+        if magic != MAGIC or fmt != FORMAT:
+            raise ValueError(f"{path} is not a catalog snapshot of format {FORMAT}")
+
+    def rows(self) -> List[Tuple]:
+        """All items as (name, description, price, quantity, id), by id."""
+        return [
+            self._row(*_ENTRY.unpack_from(self._map, _HEADER.size + n * _ENTRY.size))
+            for n in range(self.count)
+        ]
+
+    def get(self, item_id: UUID) -> Optional[Tuple]:
+        """One item's row, found by binary search in the sorted ids."""
+        key = item_id.bytes
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            entry_id, offset = _ENTRY.unpack_from(
+                self._map, _HEADER.size + middle * _ENTRY.size
+            )
+            if entry_id == key:
+                return self._row(entry_id, offset)
+            if entry_id < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def _row(self, item_id: bytes, offset: int) -> Tuple:
+        price, quantity = _FIXED.unpack_from(self._map, offset)
+        offset += _FIXED.size
+        name, offset = self._text(offset)
+        description, _ = self._text(offset)
+        return name, description, price, quantity, UUID(bytes=item_id)
+
+    def _text(self, offset: int) -> Tuple[Optional[str], int]:
+        (length,) = _LENGTH.unpack_from(self._map, offset)
+        offset += _LENGTH.size
+        if length == _NONE:
+            return None, offset
+        return self._map[offset:offset + length].decode(), offset + length
+
+    def close(self) -> None:
+        self._map.close()
+
+
+class CatalogSnapshot:
+    """The snapshot a worker serves item reads from until the catalog changes."""
+
+    def __init__(self, check_interval: float = 1.0, max_age: float = 3600.0):
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self._file: Optional[SnapshotFile] = None
+        self._rows: Optional[List[Tuple]] = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def load(self, path: str) -> bool:
+        """Map the snapshot at `path` unless it is missing, invalid or too old."""
+        try:
+            snapshot = SnapshotFile(path)
+        except (OSError, ValueError) as error:
+            logger.warning("Not using the catalog snapshot: %s", error)
+            return False
+        if time.time() - snapshot.written_at > self.max_age:
+            logger.warning("Not using the catalog snapshot %s, too old", path)
+            snapshot.close()
+            return False
+        with self._lock:
+            self._file, self._rows = snapshot, None
+            self._checked_at = float("-inf")
+        return True
+
+    def rows(self, current_version: Callable[[], int]) -> Optional[List[Tuple]]:
+        """The snapshot's item rows, or None once the catalog has changed."""
+        if self._file is None:
+            return None
+        with self._lock:
+            snapshot = self._current(current_version)
+            if snapshot is None:
+                return None
+            if self._rows is None:
+                self._rows = snapshot.rows()
+            return self._rows
+
+    def find(
+        self, item_ids: Iterable[UUID], current_version: Callable[[], int]
+    ) -> Optional[Dict[UUID, Tuple]]:
+        """Rows of the given items found in the snapshot, None once it is stale."""
+        if self._file is None:
+            return None
+        with self._lock:
+            snapshot = self._current(current_version)
+            if snapshot is None:
+                return None
+            rows = (snapshot.get(item_id) for item_id in item_ids)
+            return {row[4]: row for row in rows if row is not None}
+
+    def invalidate(self) -> None:
+        """Stop using the snapshot, after this process changed the catalog."""
+        with self._lock:
+            if self._file is not None:
+                self._drop()
+
+    def _current(self, current_version: Callable[[], int]) -> Optional[SnapshotFile]:
+        """The snapshot if still current; call with the lock held."""
+        if self._file is None:
+            return None
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            if current_version() != self._file.version:
+                self._drop()
+                return None
+            self._checked_at = time.monotonic()
+        return self._file
+
+    def _drop(self) -> None:
+        logger.info("Catalog changed since the snapshot, reading the database")
+        self._file.close()
+        self._file, self._rows = None, None
+
+
+catalog_snapshot = CatalogSnapshot(
+    settings.catalog_snapshot_check_seconds,
+    settings.catalog_snapshot_max_age_seconds,
+)
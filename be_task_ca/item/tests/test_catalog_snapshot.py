@@ -0,0 +1,152 @@
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from be_task_ca.database import Base
+from be_task_ca.item import loaders, usecases
+from be_task_ca.item.loaders import get_item_loader
+from be_task_ca.item.model import Item
+from be_task_ca.item.repository import (
+    get_all_item_rows,
+    get_catalog_version,
+    save_item,
+)
+from be_task_ca.item.schema import CreateItemRequest
+from be_task_ca.item.snapshot import CatalogSnapshot, SnapshotFile, write_snapshot
+
+
+@pytest.fixture
+def engine():
+    # the use cases query from the threadpool
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def test_db(engine):
+    """Create an in-memory database with a small catalog."""
+    session = sessionmaker(bind=engine)()
+    for n in range(20):
+        item = Item.create_new(f"Lamp {n}", "Bright, ünïcode", n + 0.25, n)
+        save_item(item, session)
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def snapshot(test_db, tmp_path, monkeypatch):
+    """The catalog snapshot, checked against the catalog on every read."""
+    path = str(tmp_path / "catalog.snap")
+    write_snapshot(test_db, path)
+    snapshot = CatalogSnapshot(check_interval=0)
+    assert snapshot.load(path)
+    monkeypatch.setattr(usecases, "catalog_snapshot", snapshot)
+    monkeypatch.setattr(loaders, "catalog_snapshot", snapshot)
+    return snapshot
+
+
+def count_item_queries(engine):
+    queries = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if "FROM items" in statement:
+            queries.append(statement)
+
+    return queries
+
+
+def test_snapshot_holds_the_catalog(test_db, tmp_path):
+    """Test a written snapshot reads back every item and finds each by id."""
+    path = str(tmp_path / "catalog.snap")
+    assert write_snapshot(test_db, path) == (20, 20)
+
+    snapshot = SnapshotFile(path)
+    rows = get_all_item_rows(test_db)
+    assert sorted(snapshot.rows()) == sorted(tuple(row) for row in rows)
+    for row in rows:
+        assert snapshot.get(row.id) == tuple(row)
+    assert snapshot.get(Item.create_new("x", "y", 1, 1).id) is None
+
+
+def test_list_is_served_from_the_snapshot_until_the_catalog_changes(
+    engine, test_db, snapshot
+):
+    """Test the list skips the items table until an item is added."""
+    queries = count_item_queries(engine)
+    assert len(usecases.get_all_rows(test_db)) == 20
+    assert queries == []
+
+    save_item(Item.create_new("Desk", "New", 5.0, 1), test_db)
+    test_db.commit()
+
+    assert len(usecases.get_all_rows(test_db)) == 21
+    assert len(queries) == 1
+    assert snapshot.rows(lambda: 0) is None
+
+
+def test_loader_reads_items_from_the_snapshot(engine, test_db, snapshot):
+    """Test item lookups by id are answered from the snapshot."""
+    ids = [row.id for row in get_all_item_rows(test_db)[:3]]
+    queries = count_item_queries(engine)
+
+    items = asyncio.run(get_item_loader(test_db).load_many(ids))
+
+    assert [item.id for item in items] == ids
+    assert queries == []
+
+
+def test_own_catalog_writes_are_seen_before_the_next_check(
+    engine, test_db, snapshot
+):
+    """Test a committed create_item drops the snapshot in the writing process."""
+    snapshot.check_interval = 3600
+    assert snapshot.rows(lambda: get_catalog_version(test_db)) is not None
+    created = usecases.create_item(
+        CreateItemRequest(name="Desk", description="New", price=5.0, quantity=1),
+        test_db,
+    )
+    assert snapshot.rows(lambda: 0) is not None  # not committed yet
+    test_db.commit()
+
+    assert created.id in [row[4] for row in usecases.get_all_rows(test_db)]
+    item = asyncio.run(get_item_loader(test_db).load(created.id))
+    assert item.name == "Desk"
+
+
+def test_items_missing_from_the_snapshot_are_read_from_the_database(
+    engine, test_db, snapshot
+):
+    """Test the loader falls back to the database for ids the snapshot lacks."""
+    snapshot.check_interval = 3600
+    assert snapshot.rows(lambda: get_catalog_version(test_db)) is not None
+    # written by another process: not seen until the next version check
+    desk = save_item(Item.create_new("Desk", "New", 5.0, 1), test_db)
+    known = get_all_item_rows(test_db)[0].id
+
+    items = asyncio.run(get_item_loader(test_db).load_many([known, desk.id]))
+
+    assert [item.id for item in items] == [known, desk.id]
+    assert snapshot.rows(lambda: 0) is not None
+
+
+def test_invalid_or_old_snapshots_are_not_loaded(test_db, tmp_path):
+    """Test a truncated file or one older than max_age is ignored."""
+    path = str(tmp_path / "catalog.snap")
+    write_snapshot(test_db, path)
+    assert not CatalogSnapshot(max_age=-1).load(path)
+
+    with open(path, "r+b") as file:
+        file.truncate(10)
+    assert not CatalogSnapshot().load(path)
+    assert not CatalogSnapshot().load(os.path.join(tmp_path, "missing.snap"))
@@ -0,0 +1,106 @@
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from be_task_ca.database import Base
+from be_task_ca.item.model import Item, SearchMode
+from be_task_ca.item.repository import ITEM_ROW_FIELDS, save_item, search_item_rows
+from be_task_ca.item.search_index import (
+    PrefixIndex,
+    RefreshingPrefixIndex,
+    item_name_index,
+)
+from be_task_ca.item.usecases import autocomplete_items
+
+
+@pytest.fixture
+def test_db():
+    """Create an in-memory database with a small catalog."""
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    for name, description in [
+        ("Desk Lamp", "A bright lamp for your desk"),
+        ("Lamp", "Plain lamp"),
+        ("Lava Lamp", "Groovy red lamp"),
+        ("Standing Desk", "Height adjustable desk"),
+        ("100% Cotton Shirt", "Soft shirt"),
+        ("Red Chair", "Comfortable chair with lamp holder"),
+    ]:
+        save_item(Item.create_new(name, description, 10.0, 1), session)
+    yield session
+    session.close()
+
+
+def names(rows):
+    return [dict(zip(ITEM_ROW_FIELDS, row))["name"] for row in rows]
+
+
+def test_prefix_search(test_db):
+    """Test prefix search is case-insensitive and ranks shorter names first."""
+    assert names(search_item_rows("la", SearchMode.PREFIX, 10, test_db)) == [
+        "Lamp",
+        "Lava Lamp",
+    ]
+
+
+def test_substring_search_ranking(test_db):
+    """Test name prefix beats name substring beats description matches."""
+    rows = search_item_rows("lamp", SearchMode.SUBSTRING, 10, test_db)
+    assert names(rows) == ["Lamp", "Desk Lamp", "Lava Lamp", "Red Chair"]
+
+
+def test_substring_search_escapes_wildcards(test_db):
+    """Test LIKE wildcards in the query are matched literally."""
+    assert names(search_item_rows("100%", SearchMode.SUBSTRING, 10, test_db)) == [
+        "100% Cotton Shirt"
+    ]
+    assert search_item_rows("_", SearchMode.SUBSTRING, 10, test_db) == []
+
+
+def test_fulltext_fallback_requires_every_word(test_db):
+    """Test the SQLite full-text fallback matches all words in any field."""
+    rows = search_item_rows("red lamp", SearchMode.FULLTEXT, 10, test_db)
+    assert names(rows) == ["Lava Lamp", "Red Chair"]
+
+
+def test_search_limit(test_db):
+    """Test the result count is capped by the limit."""
+    assert len(search_item_rows("lamp", SearchMode.SUBSTRING, 2, test_db)) == 2
+
+
+def test_prefix_index_search():
+    """Test the in-process index completes prefixes in alphabetical order."""
+    index = PrefixIndex(
+        (name, uuid4()) for name in ["Lava Lamp", "lamp", "Lamp Shade", "Desk"]
+    )
+    assert [name for name, _ in index.search("LAM", 10)] == ["lamp", "Lamp Shade"]
+    assert [name for name, _ in index.search("la", 2)] == ["lamp", "Lamp Shade"]
+    assert index.search("z", 10) == []
+
+
+def test_refreshing_index_rebuilds_after_invalidate():
+    """Test the index is only reloaded when stale or invalidated."""
+    loads = []
+
+    def load():
+        loads.append(1)
+        return [("Lamp", uuid4())]
+
+    index = RefreshingPrefixIndex(max_age=60)
+    index.get(load)
+    index.get(load)
+    assert len(loads) == 1
+    index.invalidate()
+    index.get(load)
+    assert len(loads) == 2
+
+
+def test_autocomplete_items(test_db):
+    """Test autocomplete reads names from the database-backed index."""
+    item_name_index.invalidate()
+    suggestions = autocomplete_items("desk", 5, test_db)
+    assert [name for name, _ in suggestions] == ["Desk Lamp"]
+    item_name_index.invalidate()
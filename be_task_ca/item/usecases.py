@@ -1,11 +1,32 @@
-from typing import List
+from typing import List, Tuple
+from uuid import UUID
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
 
-from .repository import find_item_by_name, get_all_items, save_item
-from .model import Item
+from .repository import (
+    ITEM_ROW_FIELDS,
+    ITEM_ROW_TYPES,
+    find_item_by_name,
+    get_all_item_rows,
+    get_all_items,
+    get_catalog_version,
+    get_item_name_rows,
+    save_item,
+    search_item_rows,
+)
+from ..database.routing import has_written
+from ..database.unit_of_work import after_commit
+from ..dataloader import DataLoader
+from ..singleflight import SingleFlight
+from .model import Item, SearchMode
+from .search_index import item_name_index
+from .snapshot import catalog_snapshot
 from .schema import AllItemsRepsonse, CreateItemRequest, CreateItemResponse
 
+# concurrent list requests share one query, unless the session has written
+items_flight = SingleFlight("get_all_items")
+item_rows_flight = SingleFlight("get_all_item_rows")
+
 
 def create_item(item: CreateItemRequest, db: Session) -> CreateItemResponse:
     search_result = find_item_by_name(item.name, db)
@@ -22,17 +43,58 @@ def create_item(item: CreateItemRequest, db: Session) -> CreateItemResponse:
     )
 
     save_item(new_item, db)
+    # this process sees its own write right away, other ones after a check
+    after_commit(db, catalog_snapshot.invalidate)
+    after_commit(db, item_name_index.invalidate)
     return model_to_schema(new_item)
 
 
+async def get_item(item_id: UUID, item_loader: DataLoader) -> CreateItemResponse:
+    """Get one item, batched with the other item loads of the request."""
+    item = await item_loader.load(item_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return model_to_schema(item)
+
+
 def get_all(db: Session) -> List[CreateItemResponse]:
-    item_list = get_all_items(db)
+    item_list = items_flight.do(
+        None, lambda: get_all_items(db), share=not has_written(db)
+    )
     return AllItemsRepsonse(items=list(map(model_to_schema, item_list)))
 
 
+def get_all_rows(db: Session) -> List[Tuple]:
+    """Get all items as plain rows for the list endpoint fast path."""
+    rows = catalog_snapshot.rows(lambda: get_catalog_version(db))
+    if rows is not None:
+        return rows
+    return item_rows_flight.do(
+        None, lambda: get_all_item_rows(db), share=not has_written(db)
+    )
+
+
+def search_items(query: str, mode: SearchMode, limit: int, db: Session) -> List[Tuple]:
+    """Search the catalog in the database and return ranked plain rows."""
+    return search_item_rows(query, mode, limit, db)
+
+
+def autocomplete_items(prefix: str, limit: int, db: Session) -> List[Tuple[str, UUID]]:
+    """Complete item names from the in-process prefix index."""
+    index = item_name_index.get(lambda: _item_names(db))
+    return index.search(prefix, limit)
+
+
+def _item_names(db: Session) -> List[Tuple[str, UUID]]:
+    rows = catalog_snapshot.rows(lambda: get_catalog_version(db))
+    if rows is not None:
+        return [(name, item_id) for name, _, _, _, item_id in rows]
+    return get_item_name_rows(db)
+
+
 def model_to_schema(item: Item) -> CreateItemResponse:
     return CreateItemResponse(
-        id=str(item.id),  # Convert UUID to string for API response
+        id=item.id,
         name=item.name,
         description=item.description,
         price=item.price,
@@ -0,0 +1,79 @@
+"""Process-local metrics, exposed in the Prometheus text format on /metrics.
+
+Each `poetry run serve` worker keeps its own values; the scraper sums them.
+"""
+import threading
+from typing import Callable, Dict, List, Tuple
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Metric:
+    """A counter or gauge with optional labels."""
+
+    def __init__(self, name: str, kind: str, help: str):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            label_text = ",".join(f'{label}="{text}"' for label, text in labels)
+            name = f"{self.name}{{{label_text}}}" if labels else self.name
+            lines.append(f"{name} {value:g}")
+        return lines
+
+
+class Registry:
+    """All metrics of the process, plus collectors refreshing gauges on scrape."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def counter(self, name: str, help: str) -> Metric:
+        return self._register(name, "counter", help)
+
+    def gauge(self, name: str, help: str) -> Metric:
+        return self._register(name, "gauge", help)
+
+    def collector(self, collect: Callable[[], None]) -> Callable[[], None]:
+        """Register a function run before every render, usable as a decorator."""
+        self._collectors.append(collect)
+        return collect
+
+    def render(self) -> str:
+        for collect in self._collectors:
+            collect()
+        lines = [line for metric in self._metrics.values() for line in metric.render()]
+        return "\n".join(lines) + "\n"
+
+    def _register(self, name: str, kind: str, help: str) -> Metric:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = Metric(name, kind, help)
+        return metric
+
+
+registry = Registry()
@@ -0,0 +1,206 @@
+"""Opt-in profiling of single requests.
+
+A request is profiled when it carries a valid signed `X-Profile` header or
+is picked by `profile_sample_rate`. While it runs, a sampler thread records
+the stacks of every thread executing code of this package and every SQL
+statement the request issues is timed. Both are written to `profile_dir`:
+
+* `<id>.folded` - folded stacks, one `frame;frame;... count` line per stack,
+  readable by flamegraph.pl, speedscope or inferno
+* `<id>.sql.json` - the statements in execution order with their durations
+
+and the response gets an `X-Profile-Id: <id>` header. The middleware and the
+SQL listeners are only installed when profiling is configured, so requests
+pay nothing for it otherwise.
+
+Stacks are sampled per thread, not per request: with concurrent requests in
+the same process their stacks can show up in the profile too. The SQL list
+only ever contains the profiled request's statements.
+"""
+import hashlib
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+from typing import List, Optional
+from uuid import uuid4
+
+from fastapi import FastAPI, Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .settings import settings
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+_ROOT_DIR = os.path.dirname(_PACKAGE_DIR)
+
+# SQL statements of the request being profiled in the current context
+_profiled_sql: ContextVar[Optional[List[dict]]] = ContextVar(
+    "profiled_sql", default=None
+)
+
+
+def profile_signature(secret: str, method: str, path: str, expires: int) -> str:
+    """HMAC of a profiling request, sent as `X-Profile: <expires>:<signature>`."""
+    message = f"{expires}:{method.upper()}:{path}".encode()
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def is_signed(request: Request, secret: Optional[str]) -> bool:
+    """Whether the request carries an unexpired, valid profiling signature."""
+    header = request.headers.get(PROFILE_HEADER)
+    if not header or not secret:
+        return False
+    expires, _, signature = header.partition(":")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    expected = profile_signature(
+        secret, request.method, request.url.path, int(expires)
+    )
+    return hmac.compare_digest(signature, expected)
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(_ROOT_DIR):
+        filename = os.path.relpath(filename, _ROOT_DIR)
+    else:
+        filename = os.path.basename(filename)
+    # ';' separates frames and ' ' the count in the folded format
+    return f"{code.co_qualname} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+class StackSampler:
+    """Samples the stacks of threads running this package's code."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack, ours = [], False
+                while frame is not None:
+                    ours = ours or frame.f_code.co_filename.startswith(_PACKAGE_DIR)
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                if ours:
+                    self.stacks[";".join(reversed(stack))] += 1
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, many):
+    if _profiled_sql.get() is not None:
+        conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, many):
+    queries = _profiled_sql.get()
+    if queries is None:
+        return
+    started = conn.info["profile_started"].pop()
+    # parameters are left out, they hold emails and password hashes
+    queries.append(
+        {
+            "statement": statement,
+            "executemany": many,
+            "duration_ms": round((time.perf_counter() - started) * 1e3, 3),
+        }
+    )
+
+
+def write_profile(directory: Path, profile_id: str, stacks: Counter, queries, meta):
+    """Write the folded stacks and the SQL list of one profiled request."""
+    directory.mkdir(parents=True, exist_ok=True)
+    folded = "".join(f"{stack} {count}\n" for stack, count in stacks.items())
+    (directory / f"{profile_id}.folded").write_text(folded)
+    (directory / f"{profile_id}.sql.json").write_text(
+        json.dumps(dict(meta, queries=queries), indent=2)
+    )
+
+
+def install_profiling(app: FastAPI) -> None:
+    """Add the profiling middleware to `app` if profiling is configured."""
+    if not settings.profile_secret and settings.profile_sample_rate <= 0:
+        return
+
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+    app.add_middleware(ProfilingMiddleware, directory=Path(settings.profile_dir))
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling signed or sampled requests until they respond."""
+
+    def __init__(self, app: ASGIApp, directory: Path):
+        self.app = app
+        self.directory = directory
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if not (
+            is_signed(Request(scope), settings.profile_secret)
+            or random.random() < settings.profile_sample_rate
+        ):
+            return await self.app(scope, receive, send)
+
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid4().hex[:8]}"
+        queries: List[dict] = []
+        token = _profiled_sql.set(queries)
+        sampler = StackSampler(settings.profile_interval)
+        started = time.perf_counter()
+
+        async def write_then_send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                stacks = sampler.stop()
+                self._write(profile_id, stacks, queries, scope, message, started)
+                MutableHeaders(scope=message)[PROFILE_ID_HEADER] = profile_id
+            await send(message)
+
+        sampler.start()
+        try:
+            await self.app(scope, receive, write_then_send)
+        finally:
+            sampler.stop()
+            _profiled_sql.reset(token)
+
+    def _write(self, profile_id, stacks, queries, scope, start, started) -> None:
+        write_profile(
+            self.directory,
+            profile_id,
+            stacks,
+            queries,
+            {
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": start["status"],
+                "duration_ms": round((time.perf_counter() - started) * 1e3, 3),
+                "sql_ms": round(sum(query["duration_ms"] for query in queries), 3),
+            },
+        )
@@ -0,0 +1,168 @@
+import json
+from datetime import datetime
+from typing import Any, Iterable, List, Sequence
+from uuid import UUID
+
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:  # orjson is an optional speed-up, stdlib json is the fallback
+    orjson = None
+
+# the binary formats are only offered when their library is installed
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+# other names clients use for the same formats
+_MEDIA_TYPE_ALIASES = {"application/x-msgpack": MSGPACK}
+
+
+def _default(value: Any) -> Any:
+    """Encode the few non-JSON types that come straight out of the database."""
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode an object to JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def encode_rows(
+    columns: Sequence[str], rows: Iterable[Sequence[Any]], envelope: str | None = None
+) -> bytes:
+    """Encode plain row tuples as a JSON array of objects keyed by `columns`.
+
+    If `envelope` is given the array is wrapped as `{envelope: [...]}`.
+    """
+    records = [dict(zip(columns, row)) for row in rows]
+    return dumps({envelope: records} if envelope else records)
+
+
+def json_rows_response(
+    columns: Sequence[str], rows: Iterable[Sequence[Any]], envelope: str | None = None
+) -> Response:
+    """Build a JSON response from trusted database rows, skipping pydantic."""
+    return Response(
+        content=encode_rows(columns, rows, envelope), media_type="application/json"
+    )
+
+
+def available_media_types() -> List[str]:
+    """Row formats this process can encode, JSON first."""
+    return [
+        media_type
+        for media_type, library in ((JSON, json), (MSGPACK, msgpack), (ARROW, pyarrow))
+        if library is not None
+    ]
+
+
+def negotiate(accept: str) -> str:
+    """Pick the row format an Accept header prefers, JSON if none matches.
+
+    The highest `q` wins, ties go to the type listed first. Wildcards and
+    unavailable types are ignored rather than answered with 406, so clients
+    that send `*/*` keep getting JSON.
+    """
+    available = available_media_types()
+    best, best_q = JSON, 0.0
+    for part in accept.split(","):
+        media_type, _, params = part.partition(";")
+        media_type = media_type.strip().lower()
+        media_type = _MEDIA_TYPE_ALIASES.get(media_type, media_type)
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media_type in available and q > best_q:
+            best, best_q = media_type, q
+    return best
+
+
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, UUID):
+        return value.bytes
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def encode_msgpack_rows(
+    columns: Sequence[str], rows: Iterable[Sequence[Any]], envelope: str | None = None
+) -> bytes:
+    """Encode rows like `encode_rows` as MessagePack, UUIDs as 16 raw bytes."""
+    records = [dict(zip(columns, row)) for row in rows]
+    return msgpack.packb(
+        {envelope: records} if envelope else records, default=_msgpack_default
+    )
+
+
+def _arrow_type(python_type: type) -> Any:
+    return {
+        UUID: pyarrow.binary(16),
+        str: pyarrow.string(),
+        float: pyarrow.float64(),
+        int: pyarrow.int64(),
+    }[python_type]
+
+
+def encode_arrow_rows(
+    columns: Sequence[str], types: Sequence[type], rows: Iterable[Sequence[Any]]
+) -> bytes:
+    """Encode rows as one Arrow IPC stream batch, one column per field.
+
+    `types` gives the Python type of each column, so an empty result still
+    has a schema. UUIDs become 16 byte fixed-size binary values.
+    """
+    values = list(zip(*rows)) or [()] * len(columns)
+    arrays = []
+    for column, python_type in zip(values, types):
+        if python_type is UUID:
+            column = [None if value is None else value.bytes for value in column]
+        arrays.append(pyarrow.array(column, type=_arrow_type(python_type)))
+    table = pyarrow.Table.from_arrays(arrays, names=list(columns))
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def rows_response(
+    accept: str,
+    columns: Sequence[str],
+    types: Sequence[type],
+    rows: Iterable[Sequence[Any]],
+    envelope: str | None = None,
+) -> Response:
+    """Build a response from database rows in the format the client accepts.
+
+    Arrow has no envelope, the stream is the table itself.
+    """
+    media_type = negotiate(accept)
+    if media_type == MSGPACK:
+        content = encode_msgpack_rows(columns, rows, envelope)
+    elif media_type == ARROW:
+        content = encode_arrow_rows(columns, types, rows)
+    else:
+        content = encode_rows(columns, rows, envelope)
+    return Response(
+        content=content, media_type=media_type, headers={"Vary": "Accept"}
+    )
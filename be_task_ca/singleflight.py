@@ -0,0 +1,102 @@
+import threading
+from collections import Counter
+from typing import Callable, Dict, Hashable, List, Optional, TypeVar
+
+from .metrics import registry
+
+T = TypeVar("T")
+
+# keys whose shared calls are tracked per group, the hottest are exported
+TRACKED_KEYS = 1000
+EXPORTED_KEYS = 10
+
+executed = registry.counter(
+    "singleflight_executed_total", "Calls that ran, by group."
+)
+shared = registry.counter(
+    "singleflight_shared_total", "Calls answered by another in-flight call."
+)
+hot_keys = registry.gauge(
+    "singleflight_hot_key_shared", "Shared calls of the hottest keys, by group."
+)
+
+
+_flights: List["SingleFlight"] = []
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution.
+
+    The first caller of a key runs the function, callers arriving while it
+    runs wait for it and get its result or its exception. Nothing is cached:
+    once the call returns, the next caller runs the function again. A call
+    with `share=False`, e.g. a read that must see the caller's uncommitted
+    writes, runs on its own and is never shared.
+    """
+
+    def __init__(self, group: str):
+        self.group = group
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._shared_by_key: Counter = Counter()
+        _flights.append(self)
+
+    def do(self, key: Hashable, fn: Callable[[], T], share: bool = True) -> T:
+        if not share:
+            return fn()
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self._count_shared(key)
+
+        if not leader:
+            shared.inc(group=self.group)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        executed.inc(group=self.group)
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _count_shared(self, key: Hashable) -> None:
+        self._shared_by_key[key] += 1
+        if len(self._shared_by_key) > TRACKED_KEYS:
+            self._shared_by_key = Counter(
+                dict(self._shared_by_key.most_common(TRACKED_KEYS // 10))
+            )
+
+    def hottest(self, count: int = EXPORTED_KEYS):
+        """The keys most often answered by a shared call, with their counts."""
+        with self._lock:
+            return self._shared_by_key.most_common(count)
+
+
+@registry.collector
+def _collect_hot_keys() -> None:
+    # keys drop out of the top list, so the gauge is rebuilt on every scrape
+    hot_keys.clear()
+    for flight in _flights:
+        for key, count in flight.hottest():
+            hot_keys.set(count, group=flight.group, key=str(key))
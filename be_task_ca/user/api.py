@@ -1,20 +1,50 @@
+from datetime import datetime
+from typing import Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
 from sqlalchemy.orm import Session
 
-from be_task_ca.database import get_db
+from be_task_ca.common import get_db
+from be_task_ca.database import Session as DatabaseSession, engine, shards
+from be_task_ca.database.blocking import run_blocking
+from be_task_ca.dataloader import DataLoader
+from be_task_ca.export import ExportFormat, export_response
+from be_task_ca.item.loaders import get_item_loader
+from be_task_ca.serialization import rows_response
+from be_task_ca.settings import settings
+from be_task_ca.user.domain.cart_repository import CartRepository
+from be_task_ca.user.domain.entity import User
+from be_task_ca.user.domain.repository import USER_ROW_FIELDS, USER_ROW_TYPES
+from be_task_ca.user.infrastructure.cart_reaper import CartReaper
+from be_task_ca.user.infrastructure.cart_repository import PostgresCartRepository
+from be_task_ca.user.infrastructure.kv_cart_repository import (
+    SqliteCartRepository,
+    SqliteCartStore,
+)
 from be_task_ca.user.infrastructure.postgres_user_repository import PostgresUserRepository
+from be_task_ca.user.infrastructure.write_behind_cart_repository import (
+    CartWriteBuffer,
+    WriteBehindCartRepository,
+)
 from be_task_ca.user.schema import (
+    AddToCartRequest,
+    AddToCartResponse,
+    CartItemDetails,
+    CartResponse,
+    CartSummaryResponse,
     CreateUserRequest,
     CreateUserResponse,
 )
 from be_task_ca.user.usecases import (
+    add_item_to_cart,
+    get_cart_lines,
+    get_cart_summary,
     create_user,
     get_user_by_email,
     get_user_by_id,
     update_user,
     delete_user,
-    list_users,
+    list_user_rows,
 )
 
 
@@ -29,6 +59,59 @@ def get_user_repository(db: Session = Depends(get_db)) -> PostgresUserRepository
     return PostgresUserRepository(db)
 
 
+cart_kv_store = (
+    SqliteCartStore(settings.cart_sqlite_path)
+    if settings.cart_store == "sqlite"
+    else None
+)
+cart_buffer = (
+    CartWriteBuffer(DatabaseSession, settings.cart_flush_interval_seconds)
+    if settings.cart_write_behind and cart_kv_store is None
+    else None
+)
+
+cart_reaper = CartReaper(
+    shards.engines if shards is not None else [engine],
+    settings.cart_max_idle_seconds,
+    settings.cart_reap_chunk_size,
+    settings.cart_reap_pause_seconds,
+    settings.cart_reap_interval_seconds,
+)
+
+
+@user_router.on_event("startup")
+def start_cart_reaper() -> None:
+    """Reap abandoned carts in the background if an interval is configured."""
+    cart_reaper.start()
+
+
+@user_router.on_event("shutdown")
+def flush_cart_buffer() -> None:
+    """Write buffered carts before the process exits."""
+    cart_reaper.close()
+    if cart_buffer is not None:
+        cart_buffer.close()
+
+
+def get_cart_repository(db: Session = Depends(get_db)) -> CartRepository:
+    """Get cart repository instance."""
+    if cart_kv_store is not None:
+        return SqliteCartRepository(cart_kv_store)
+    if cart_buffer is not None:
+        return WriteBehindCartRepository(cart_buffer, db)
+    return PostgresCartRepository(db)
+
+
+def get_user_loader(
+    user_repository: PostgresUserRepository = Depends(get_user_repository),
+) -> DataLoader[UUID, User]:
+    """Request-scoped loader batching user lookups by ID into one query."""
+    return DataLoader(
+        lambda ids: {user.id: user for user in user_repository.get_by_ids(ids)},
+        run=run_blocking,
+    )
+
+
 @user_router.post("/", response_model=CreateUserResponse)
 def create_user_endpoint(
     user: CreateUserRequest,
@@ -69,9 +152,20 @@ def get_user_by_email_endpoint(
         raise HTTPException(status_code=404, detail=str(e))
 
 
+# declared before /{user_id}, which would otherwise match "export"
+@user_router.get("/export")
+def export_users_endpoint(
+    format: ExportFormat = ExportFormat.NDJSON,
+    updated_since: Optional[datetime] = None,
+    accept_encoding: str = Header(""),
+) -> Response:
+    """Stream all users, or those changed after `updated_since`."""
+    return export_response("users", format, updated_since, accept_encoding)
+
+
 @user_router.get("/{user_id}", response_model=CreateUserResponse)
 def get_user_by_id_endpoint(
-    user_id: str,
+    user_id: UUID,
     user_repository: PostgresUserRepository = Depends(get_user_repository),
 ) -> CreateUserResponse:
     """Get user by ID."""
@@ -90,7 +184,7 @@ def get_user_by_id_endpoint(
 
 @user_router.put("/{user_id}", response_model=CreateUserResponse)
 def update_user_endpoint(
-    user_id: str,
+    user_id: UUID,
     user: CreateUserRequest,
     user_repository: PostgresUserRepository = Depends(get_user_repository),
 ) -> CreateUserResponse:
@@ -110,7 +204,7 @@ def update_user_endpoint(
 
 @user_router.delete("/{user_id}")
 def delete_user_endpoint(
-    user_id: str,
+    user_id: UUID,
     user_repository: PostgresUserRepository = Depends(get_user_repository),
 ) -> None:
     """Delete a user."""
@@ -123,16 +217,76 @@ def delete_user_endpoint(
 @user_router.get("/", response_model=list[CreateUserResponse])
 def list_users_endpoint(
     user_repository: PostgresUserRepository = Depends(get_user_repository),
-) -> list[CreateUserResponse]:
-    """List all users."""
-    user_list = list_users(user_repository)
-    return [
-        CreateUserResponse(
-            id=user.id,
-            email=user.email,
-            first_name=user.first_name,
-            last_name=user.last_name,
-            shipping_address=user.shipping_address,
+    accept: str = Header(""),
+) -> Response:
+    """List all users, as JSON, MessagePack or Arrow depending on `Accept`."""
+    rows = list_user_rows(user_repository)
+    return rows_response(accept, USER_ROW_FIELDS, USER_ROW_TYPES, rows)
+
+
+@user_router.post("/{user_id}/cart", response_model=AddToCartResponse)
+async def add_item_to_cart_endpoint(
+    user_id: UUID,
+    cart_item: AddToCartRequest,
+    cart_repository: CartRepository = Depends(get_cart_repository),
+    user_loader: DataLoader = Depends(get_user_loader),
+    item_loader: DataLoader = Depends(get_item_loader),
+) -> AddToCartResponse:
+    """Add an item to a user's cart."""
+    try:
+        cart = await add_item_to_cart(
+            user_id,
+            cart_item.item_id,
+            cart_item.quantity,
+            cart_repository,
+            user_loader,
+            item_loader,
         )
-        for user in user_list.users
-    ]
+    except ValueError as e:
+        if "not found" in str(e):
+            raise HTTPException(status_code=404, detail=str(e))
+        if "stock" in str(e):
+            raise HTTPException(status_code=409, detail=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
+    return AddToCartResponse(
+        items=[
+            AddToCartRequest(item_id=line.item_id, quantity=line.quantity)
+            for line in cart.items
+        ]
+    )
+
+
+@user_router.get("/{user_id}/cart", response_model=CartResponse)
+async def get_cart_endpoint(
+    user_id: UUID,
+    cart_repository: CartRepository = Depends(get_cart_repository),
+    item_loader: DataLoader = Depends(get_item_loader),
+) -> CartResponse:
+    """List the items in a user's cart with their names and prices."""
+    lines = await get_cart_lines(user_id, cart_repository, item_loader)
+    return CartResponse(
+        items=[
+            CartItemDetails(
+                item_id=line.item_id,
+                quantity=line.quantity,
+                name=line.name,
+                price=line.price,
+            )
+            for line in lines
+        ]
+    )
+
+
+@user_router.get("/{user_id}/cart/summary", response_model=CartSummaryResponse)
+async def get_cart_summary_endpoint(
+    user_id: UUID,
+    cart_repository: CartRepository = Depends(get_cart_repository),
+    item_loader: DataLoader = Depends(get_item_loader),
+) -> CartSummaryResponse:
+    """Get the counts and subtotal of a user's cart, without its lines."""
+    summary = await get_cart_summary(user_id, cart_repository, item_loader)
+    return CartSummaryResponse(
+        line_count=summary.line_count,
+        unit_count=summary.unit_count,
+        subtotal=summary.subtotal,
+    )
@@ -1,24 +1,33 @@
 from dataclasses import dataclass, field
-from typing import List
-from uuid import uuid4
+from typing import List, Optional
+from uuid import UUID, uuid4
 
 
-@dataclass
+@dataclass(slots=True)
 class CartItem:
-    """A value object representing an item in a cart."""
-    item_id: str
+    """A value object representing an item in a cart.
+
+    The id is required so hydrating lines from storage never generates one;
+    use `create_new` for lines that do not exist yet.
+    """
+    item_id: UUID
     quantity: int
-    id: str = field(default_factory=lambda: str(uuid4()))
+    id: UUID
+
+    @classmethod
+    def create_new(cls, item_id: UUID, quantity: int) -> "CartItem":
+        """Create a new cart line with a generated UUID."""
+        return cls(item_id=item_id, quantity=quantity, id=uuid4())
 
 
-@dataclass
+@dataclass(slots=True)
 class Cart:
     """A domain entity representing a user's shopping cart."""
-    user_id: str
-    id: str = field(default_factory=lambda: str(uuid4()))
+    user_id: UUID
+    id: UUID = field(default_factory=uuid4)
     items: List[CartItem] = field(default_factory=list)
 
-    def add_item(self, item_id: str, quantity: int) -> None:
+    def add_item(self, item_id: UUID, quantity: int) -> None:
         """Add an item to the cart."""
         # Check if item already exists
         for item in self.items:
@@ -27,13 +36,13 @@ class Cart:
                 return
         
         # Add new item
-        self.items.append(CartItem(item_id=item_id, quantity=quantity))
+        self.items.append(CartItem.create_new(item_id=item_id, quantity=quantity))
 
-    def remove_item(self, item_id: str) -> None:
+    def remove_item(self, item_id: UUID) -> None:
         """Remove an item from the cart."""
         self.items = [item for item in self.items if item.item_id != item_id]
 
-    def update_item_quantity(self, item_id: str, quantity: int) -> None:
+    def update_item_quantity(self, item_id: UUID, quantity: int) -> None:
         """Update the quantity of an item in the cart."""
         for item in self.items:
             if item.item_id == item_id:
@@ -43,4 +52,22 @@ class Cart:
 
     def clear(self) -> None:
         """Remove all items from the cart."""
-        self.items = [] 
\ No newline at end of file
+        self.items = [] 
+
+@dataclass(slots=True)
+class CartSummary:
+    """Totals of a cart, for widgets that do not need its lines.
+
+    The subtotal is None when the store does not keep one.
+    """
+    line_count: int
+    unit_count: int
+    subtotal: Optional[float] = None
+
+    @classmethod
+    def of(cls, cart: Cart) -> "CartSummary":
+        """Count the lines and units of a loaded cart."""
+        return cls(
+            line_count=len(cart.items),
+            unit_count=sum(line.quantity for line in cart.items),
+        )
@@ -2,7 +2,7 @@ from abc import ABC, abstractmethod
 from typing import Optional
 from uuid import UUID
 
-from .cart import Cart
+from .cart import Cart, CartSummary
 
 
 class CartRepository(ABC):
@@ -26,4 +26,9 @@ class CartRepository(ABC):
     @abstractmethod
     async def delete(self, cart_id: UUID) -> None:
         """Delete a cart by its ID."""
-        pass 
\ No newline at end of file
+        pass
+
+    def get_summary(self, user_id: UUID) -> Optional[CartSummary]:
+        """Get the totals of a user's cart; stores may override this cheaply."""
+        cart = self.get_by_user_id(user_id)
+        return CartSummary.of(cart) if cart is not None else None
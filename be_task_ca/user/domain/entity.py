@@ -3,7 +3,7 @@ from typing import Optional
 from uuid import UUID, uuid4
 
 
-@dataclass
+@dataclass(slots=True)
 class User:
     """User entity representing a customer in the system."""
     
@@ -1,10 +1,15 @@
 from abc import ABC, abstractmethod
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from uuid import UUID
 
 from .entity import User
 
 
+# Column order of the plain tuples returned by `UserRepository.list_all_rows`.
+USER_ROW_FIELDS = ("id", "first_name", "last_name", "email", "shipping_address")
+USER_ROW_TYPES = (UUID, str, str, str, str)
+
+
 class UserRepository(ABC):
     """Interface for user persistence operations."""
 
@@ -23,6 +28,11 @@ class UserRepository(ABC):
         """Get a user by their ID (for cart operations)."""
         pass
 
+    @abstractmethod
+    def get_by_ids(self, user_ids: List[UUID]) -> List[User]:
+        """Get all users with the given IDs (for batched lookups)."""
+        pass
+
     @abstractmethod
     def update(self, user: User) -> User:
         """Update an existing user."""
@@ -36,4 +46,13 @@ class UserRepository(ABC):
     @abstractmethod
     def list_all(self) -> List[User]:
         """List all users."""
-        pass 
\ No newline at end of file
+        pass
+
+    @abstractmethod
+    def list_all_rows(self) -> List[Tuple]:
+        """List all users as plain tuples ordered like USER_ROW_FIELDS."""
+        pass
+
+    def has_uncommitted_writes(self) -> bool:
+        """Whether reads must see writes of this repository not yet committed."""
+        return False
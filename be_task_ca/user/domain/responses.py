@@ -3,7 +3,7 @@ from typing import List, Optional
 from uuid import UUID
 
 
-@dataclass
+@dataclass(slots=True)
 class UserResponse:
     """Domain response model for user data."""
     id: UUID
@@ -13,7 +13,16 @@ class UserResponse:
     shipping_address: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
+class CartLineResponse:
+    """Domain response model for a cart line enriched with item details."""
+    item_id: UUID
+    quantity: int
+    name: str
+    price: float
+
+
+@dataclass(slots=True)
 class UserListResponse:
     """Domain response model for list of users."""
     users: List[UserResponse] 
\ No newline at end of file
@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Sequence
+
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.engine import Engine
+
+from be_task_ca.database.models import CartItemModel, CartModel
+from be_task_ca.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+reaped_carts = registry.counter(
+    "cart_reaped_carts_total", "Abandoned carts deleted by the reaper."
+)
+
+_carts = CartModel.__table__
+_cart_items = CartItemModel.__table__
+
+
+class CartReaper:
+    """Deletes carts without a write for `max_idle` seconds.
+
+    The carts are found by their `updated_at` and deleted in chunks of
+    `chunk_size`, one short transaction each, oldest first and paged by
+    (updated_at, id), with `pause` seconds between chunks so replicas keep
+    up. Carts locked by a concurrent write are skipped until the next run.
+    Every database holding carts is reaped: the primary and, when sharded,
+    each shard.
+
+    `start()` runs `reap()` every `interval` seconds in a background thread.
+    """
+
+    def __init__(
+        self,
+        engines: Sequence[Engine],
+        max_idle: float,
+        chunk_size: int = 500,
+        pause: float = 0.1,
+        interval: Optional[float] = None,
+    ):
+        self.engines = engines
+        self.max_idle = max_idle
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def reap(self, now: Optional[datetime] = None) -> int:
+        """Delete the carts idle since before `now` - max_idle, return how many."""
+        now = now or datetime.now(timezone.utc)
+        cutoff = now - timedelta(seconds=self.max_idle)
+        started = time.monotonic()
+        reaped = sum(self._reap(engine, cutoff) for engine in self.engines)
+        logger.info(
+            "Reaped %d carts idle since %s in %.1fs",
+            reaped,
+            cutoff.isoformat(),
+            time.monotonic() - started,
+        )
+        return reaped
+
+    def _reap(self, engine: Engine, cutoff: datetime) -> int:
+        reaped, after = 0, None
+        while not self._stop.is_set():
+            with engine.begin() as connection:
+                rows = connection.execute(self._chunk(cutoff, after)).all()
+                cart_ids = [cart_id for _, cart_id in rows]
+                if cart_ids:
+                    connection.execute(
+                        delete(_cart_items).where(_cart_items.c.cart_id.in_(cart_ids))
+                    )
+                    connection.execute(delete(_carts).where(_carts.c.id.in_(cart_ids)))
+            reaped += len(cart_ids)
+            reaped_carts.inc(len(cart_ids))
+            if len(rows) < self.chunk_size:
+                break
+            after = tuple(rows[-1])
+            self._stop.wait(self.pause)
+        return reaped
+
+    def _chunk(self, cutoff: datetime, after: Optional[tuple]):
+        """The next chunk's (updated_at, id), locked until the chunk commits."""
+        query = select(_carts.c.updated_at, _carts.c.id).where(
+            _carts.c.updated_at < cutoff
+        )
+        if after is not None:
+            query = query.where(tuple_(_carts.c.updated_at, _carts.c.id) > after)
+        return (
+            query.order_by(_carts.c.updated_at, _carts.c.id)
+            .limit(self.chunk_size)
+            .with_for_update(skip_locked=True)
+        )
+
+    def start(self) -> None:
+        """Reap every `interval` seconds in a background thread."""
+        if self.interval is None or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="cart-reaper", daemon=True
+        )
+        self._thread.start()
+
+    def close(self) -> None:
+        """Stop the background thread, ending a running reap after its chunk."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.reap()
+            except Exception:
+                logger.exception("Reaping abandoned carts failed, retrying")
+
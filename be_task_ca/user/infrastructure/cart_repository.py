@@ -1,12 +1,45 @@
-from typing import Optional
-
-from sqlalchemy import select
-from sqlalchemy.orm import Session
-
-from be_task_ca.database.models import CartModel, CartItemModel
-from be_task_ca.user.domain.cart import Cart, CartItem
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import Session, selectinload
+
+from be_task_ca.database.models import (
+    CartItemModel,
+    CartModel,
+    CatalogVersionModel,
+    ItemModel,
+)
+from be_task_ca.database.routing import replica_reads
+from be_task_ca.database.sharding import (
+    each_shard,
+    group_by_shard,
+    on_shard,
+    shards_of,
+    user_shard,
+)
+from be_task_ca.user.domain.cart import Cart, CartItem, CartSummary
 from be_task_ca.user.domain.cart_repository import CartRepository
 
+# built once, see the user repository
+_BY_USER_ID = select(CartModel).where(CartModel.user_id == bindparam("user_id"))
+_BY_ID = select(CartModel).where(CartModel.id == bindparam("cart_id"))
+_CATALOG_VERSION = select(CatalogVersionModel.version)
+_SUMMARY_COLUMNS = (
+    CartModel.id,
+    CartModel.line_count,
+    CartModel.unit_count,
+    CartModel.subtotal,
+    CartModel.price_version,
+)
+_SUMMARY = select(*_SUMMARY_COLUMNS, _CATALOG_VERSION.scalar_subquery()).where(
+    CartModel.user_id == bindparam("user_id")
+)
+# the catalog version lives on the primary, not on the cart's shard
+_SHARDED_SUMMARY = select(*_SUMMARY_COLUMNS).where(
+    CartModel.user_id == bindparam("user_id")
+)
+
 
 class PostgresCartRepository(CartRepository):
     """Synchronous implementation of the cart repository."""
@@ -14,39 +47,93 @@ class PostgresCartRepository(CartRepository):
     def __init__(self, session: Session):
         self.session = session
 
-    def get_by_user_id(self, user_id: str) -> Optional[Cart]:
+    def get_by_user_id(self, user_id: UUID) -> Optional[Cart]:
         """Get a user's cart by their user ID."""
-        stmt = select(CartModel).where(CartModel.user_id == user_id)
-        result = self.session.execute(stmt)
-        cart_model = result.scalar_one_or_none()
+        with user_shard(self.session, user_id), replica_reads(self.session):
+            cart_model = self.session.execute(
+                _BY_USER_ID, {"user_id": user_id}
+            ).scalar_one_or_none()
 
-        if not cart_model:
-            return None
+            if not cart_model:
+                return None
 
-        return self._to_domain(cart_model)
+            # lazy-loads the lines, so it has to run on the same replica
+            return self._to_domain(cart_model)
 
     def create(self, cart: Cart) -> Cart:
         """Create a new cart."""
-        cart_model = CartModel(
-            id=cart.id,
-            user_id=cart.user_id,
-        )
-        self.session.add(cart_model)
-        self.session.commit()
-        self.session.refresh(cart_model)
-        return self._to_domain(cart_model)
+        with user_shard(self.session, cart.user_id, write=True):
+            version = self._catalog_version()
+            cart_model = self._new_model(cart, version)
+            self.session.add(cart_model)
+            if cart.items:
+                self._apply(cart_model, cart, version)
+            self.session.flush()
+            return self._to_domain(cart_model)
 
     def update(self, cart: Cart) -> Cart:
         """Update an existing cart."""
-        stmt = select(CartModel).where(CartModel.id == cart.id)
-        result = self.session.execute(stmt)
-        cart_model = result.scalar_one_or_none()
+        with user_shard(self.session, cart.user_id, write=True):
+            result = self.session.execute(_BY_ID, {"cart_id": cart.id})
+            cart_model = result.scalar_one_or_none()
+
+            if not cart_model:
+                raise ValueError(f"Cart {cart.id} not found")
+
+            self._apply(cart_model, cart, self._catalog_version())
+            self.session.flush()
+            return self._to_domain(cart_model)
+
+    def save_all(self, carts: List[Cart]) -> None:
+        """Insert or update several carts with one query and one flush per shard."""
+        by_user = {cart.user_id: cart for cart in carts}
+        for shard, user_ids in group_by_shard(self.session, list(by_user)).items():
+            shard_carts = [by_user[user_id] for user_id in user_ids]
+            with on_shard(self.session, shard):
+                self._save_on_shard(shard_carts)
+
+    def _save_on_shard(self, carts: List[Cart]) -> None:
+        stmt = (
+            select(CartModel)
+            .where(CartModel.id.in_([cart.id for cart in carts]))
+            .options(selectinload(CartModel.items))
+        )
+        cart_models = {model.id: model for model in self.session.scalars(stmt)}
+        version = self._catalog_version()
+        for cart in carts:
+            cart_model = cart_models.get(cart.id)
+            if cart_model is None:
+                cart_model = self._new_model(cart, version)
+                self.session.add(cart_model)
+            self._apply(cart_model, cart, version)
+        self.session.flush()
+
+    def _new_model(self, cart: Cart, version: Optional[int]) -> CartModel:
+        """An empty cart row, its subtotal priced at the catalog `version`."""
+        return CartModel(
+            id=cart.id,
+            user_id=cart.user_id,
+            items=[],
+            line_count=0,
+            unit_count=0,
+            subtotal=0.0,
+            price_version=version,
+        )
 
-        if not cart_model:
-            raise ValueError(f"Cart {cart.id} not found")
+    def _apply(
+        self, cart_model: CartModel, cart: Cart, version: Optional[int]
+    ) -> None:
+        """Make the model's lines and summary match the cart's, priced at `version`.
 
+        The caller reads the catalog version once for the whole write.
+        """
         # Get existing items to preserve their IDs
         existing_items = {item.item_id: item for item in cart_model.items}
+        changes = {
+            item_id: -item.quantity for item_id, item in existing_items.items()
+        }
+        for item in cart.items:
+            changes[item.item_id] = changes.get(item.item_id, 0) + item.quantity
 
         # Update cart items
         new_items = []
@@ -65,19 +152,90 @@ class PostgresCartRepository(CartRepository):
                 ))
 
         cart_model.items = new_items
-        self.session.commit()
-        self.session.refresh(cart_model)
-        return self._to_domain(cart_model)
-
-    def delete(self, cart_id: str) -> None:
-        """Delete a cart by its ID."""
-        stmt = select(CartModel).where(CartModel.id == cart_id)
-        result = self.session.execute(stmt)
-        cart_model = result.scalar_one_or_none()
-
-        if cart_model:
-            self.session.delete(cart_model)
-            self.session.commit()
+        cart_model.line_count = len(cart.items)
+        cart_model.unit_count = sum(item.quantity for item in cart.items)
+        self._reprice(cart_model, cart, changes, version)
+
+    def _reprice(
+        self,
+        cart_model: CartModel,
+        cart: Cart,
+        changes: Dict[UUID, int],
+        version: Optional[int],
+    ) -> None:
+        """Move the subtotal by the changed quantities, or recompute it.
+
+        Only a subtotal priced at the current catalog version can be moved;
+        otherwise all lines are priced again.
+        """
+        if version is not None and cart_model.price_version == version:
+            changes = {item_id: n for item_id, n in changes.items() if n}
+            cart_model.subtotal += sum(
+                change * price
+                for item_id, change, price in self._priced(changes)
+            )
+        else:
+            cart_model.subtotal = self._subtotal(cart.items)
+        cart_model.price_version = version
+
+    def _subtotal(self, lines) -> float:
+        """The lines priced at the current catalog prices."""
+        quantities = {line.item_id: line.quantity for line in lines}
+        return sum(quantity * price for _, quantity, price in self._priced(quantities))
+
+    def _priced(self, quantities: Dict[UUID, int]):
+        """(item id, quantity, price) of the items still in the catalog."""
+        if not quantities:
+            return []
+        stmt = select(ItemModel.id, ItemModel.price).where(
+            ItemModel.id.in_(list(quantities))
+        )
+        return [
+            (item_id, quantities[item_id], price)
+            for item_id, price in self.session.execute(stmt)
+        ]
+
+    def _catalog_version(self) -> Optional[int]:
+        return self.session.scalar(_CATALOG_VERSION)
+
+    def delete(self, cart_id: UUID) -> None:
+        """Delete a cart by its ID, looking for it on every shard if sharded."""
+        for _ in each_shard(self.session):
+            result = self.session.execute(_BY_ID, {"cart_id": cart_id})
+            cart_model = result.scalar_one_or_none()
+
+            if cart_model:
+                self.session.delete(cart_model)
+                self.session.flush()
+                return
+
+    def get_summary(self, user_id: UUID) -> Optional[CartSummary]:
+        """Get the stored totals of a user's cart without loading its lines."""
+        with user_shard(self.session, user_id):
+            row = self._summary_row(user_id)
+            if row is None:
+                return None
+
+            cart_id, line_count, unit_count, subtotal, priced_at, version = row
+            if priced_at != version:
+                # prices changed since the last write, price the lines again;
+                # a read stores nothing, the next write stores the new subtotal
+                with replica_reads(self.session):
+                    cart_model = self.session.get(CartModel, cart_id)
+                    subtotal = self._subtotal(cart_model.items)
+        return CartSummary(line_count, unit_count, subtotal)
+
+    def _summary_row(self, user_id: UUID):
+        """The stored summary columns and the current catalog version."""
+        with replica_reads(self.session):
+            if shards_of(self.session) is None:
+                return self.session.execute(
+                    _SUMMARY, {"user_id": user_id}
+                ).one_or_none()
+            row = self.session.execute(
+                _SHARDED_SUMMARY, {"user_id": user_id}
+            ).one_or_none()
+            return None if row is None else (*row, self._catalog_version())
 
     def _to_domain(self, cart_model: CartModel) -> Cart:
         """Convert a CartModel to a domain Cart entity."""
@@ -1,4 +1,4 @@
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from uuid import UUID
 
 from ..domain.entity import User
@@ -27,6 +27,11 @@ class InMemoryUserRepository(UserRepository):
         """Get a user by their ID."""
         return self.users.get(str(user_id))
 
+    def get_by_ids(self, user_ids: List[UUID]) -> List[User]:
+        """Get all users with the given IDs."""
+        found = (self.users.get(str(user_id)) for user_id in user_ids)
+        return [user for user in found if user is not None]
+
     def update(self, user: User) -> User:
         """Update an existing user."""
         if str(user.id) not in self.users:
@@ -42,4 +47,17 @@ class InMemoryUserRepository(UserRepository):
 
     def list_all(self) -> List[User]:
         """List all users."""
-        return list(self.users.values()) 
\ No newline at end of file
+        return list(self.users.values())
+
+    def list_all_rows(self) -> List[Tuple]:
+        """List all users as plain tuples."""
+        return [
+            (
+                user.id,
+                user.first_name,
+                user.last_name,
+                user.email,
+                user.shipping_address,
+            )
+            for user in self.users.values()
+        ]
@@ -0,0 +1,104 @@
+import sqlite3
+import struct
+import threading
+from typing import Optional
+from uuid import UUID
+
+from be_task_ca.user.domain.cart import Cart, CartItem
+from be_task_ca.user.domain.cart_repository import CartRepository
+
+# cart id and number of lines, then per line: line id, item id, quantity
+_HEADER = struct.Struct("<16sI")
+_LINE = struct.Struct("<16s16sI")
+
+
+def encode_cart(cart: Cart) -> bytes:
+    """Serialize a cart without its user id, which is the key: 20 + 36 B/line."""
+    parts = [_HEADER.pack(cart.id.bytes, len(cart.items))]
+    parts += [
+        _LINE.pack(line.id.bytes, line.item_id.bytes, line.quantity)
+        for line in cart.items
+    ]
+    return b"".join(parts)
+
+
+def decode_cart(user_id: UUID, data: bytes) -> Cart:
+    cart_id, count = _HEADER.unpack_from(data)
+    return Cart(
+        user_id=user_id,
+        id=UUID(bytes=cart_id),
+        items=[
+            CartItem(id=UUID(bytes=line_id), item_id=UUID(bytes=item_id), quantity=qty)
+            for line_id, item_id, qty in _LINE.iter_unpack(data[_HEADER.size:])
+        ],
+    )
+
+
+class SqliteCartStore:
+    """An embedded SQLite file in WAL mode holding one blob per cart.
+
+    Readers never block the writer nor each other. Every operation is a
+    single autocommitted statement on a per-thread connection; with
+    `synchronous=NORMAL` a commit survives a crash of the process, though
+    the latest ones can be lost on power failure.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self.connection().execute(
+            "CREATE TABLE IF NOT EXISTS carts ("
+            " user_id BLOB PRIMARY KEY,"
+            " cart_id BLOB NOT NULL UNIQUE,"
+            " data BLOB NOT NULL"
+            ") WITHOUT ROWID"
+        )
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+
+class SqliteCartRepository(CartRepository):
+    """Cart repository reading and writing each cart with one key operation."""
+
+    def __init__(self, store: SqliteCartStore):
+        self.store = store
+
+    def get_by_user_id(self, user_id: UUID) -> Optional[Cart]:
+        """Get a user's cart by their user ID."""
+        row = (
+            self.store.connection()
+            .execute("SELECT data FROM carts WHERE user_id = ?", (user_id.bytes,))
+            .fetchone()
+        )
+        return decode_cart(user_id, row[0]) if row else None
+
+    def create(self, cart: Cart) -> Cart:
+        """Create a new cart."""
+        self.store.connection().execute(
+            "INSERT INTO carts (user_id, cart_id, data) VALUES (?, ?, ?)",
+            (cart.user_id.bytes, cart.id.bytes, encode_cart(cart)),
+        )
+        return cart
+
+    def update(self, cart: Cart) -> Cart:
+        """Update an existing cart."""
+        updated = self.store.connection().execute(
+            "UPDATE carts SET data = ? WHERE cart_id = ?",
+            (encode_cart(cart), cart.id.bytes),
+        )
+        if updated.rowcount == 0:
+            raise ValueError(f"Cart {cart.id} not found")
+        return cart
+
+    def delete(self, cart_id: UUID) -> None:
+        """Delete a cart by its ID."""
+        self.store.connection().execute(
+            "DELETE FROM carts WHERE cart_id = ?", (cart_id.bytes,)
+        )
@@ -1,12 +1,42 @@
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from uuid import UUID
 
-from sqlalchemy import select
+from sqlalchemy import bindparam, delete, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from ..domain.entity import User
 from ..domain.repository import UserRepository
-from be_task_ca.database.models import UserModel
+from be_task_ca.database.models import UserDirectoryModel, UserModel
+from be_task_ca.database.routing import has_written, replica_reads
+from be_task_ca.database.sharding import (
+    group_by_shard,
+    on_shard,
+    shards_of,
+    user_shard,
+)
+from be_task_ca.database.unit_of_work import savepoint
+
+# Hot lookups are built once: SQLAlchemy memoizes the cache key of a statement
+# object, so executing it again skips construction and compilation.
+_BY_EMAIL = select(UserModel).where(UserModel.email == bindparam("email"))
+_BY_ID = select(UserModel).where(UserModel.id == bindparam("user_id"))
+_BY_IDS = select(UserModel).where(
+    UserModel.id.in_(bindparam("user_ids", expanding=True))
+)
+_ROWS = select(
+    UserModel.id,
+    UserModel.first_name,
+    UserModel.last_name,
+    UserModel.email,
+    UserModel.shipping_address,
+)
+_DIRECTORY = select(UserDirectoryModel.user_id).where(
+    UserDirectoryModel.email == bindparam("email")
+)
+# Core statements for the scatter-gather reads over all shards
+_ALL_USERS = select(UserModel.__table__)
+_USERS_BY_EMAIL = _ALL_USERS.where(UserModel.email == bindparam("email"))
 
 
 class PostgresUserRepository(UserRepository):
@@ -15,24 +45,34 @@ class PostgresUserRepository(UserRepository):
     def __init__(self, session: Session):
         self.session = session
 
+    def has_uncommitted_writes(self) -> bool:
+        """Whether the session wrote in its open transaction."""
+        return has_written(self.session)
+
     def create(self, user: User) -> User:
         """Create a new user account."""
         user_model = UserModel(
-            id=str(user.id),
+            id=user.id,
             email=user.email,
             first_name=user.first_name,
             last_name=user.last_name,
             hashed_password=user.hashed_password,
             shipping_address=user.shipping_address,
         )
-        self.session.add(user_model)
-        self.session.commit()
+        with user_shard(self.session, user.id, write=True):
+            if shards_of(self.session) is not None:
+                # the primary key keeps emails unique across all shards
+                self.session.add(UserDirectoryModel(email=user.email, user_id=user.id))
+            self.session.add(user_model)
+            self.session.flush()
         return user
 
     def get_by_email(self, email: str) -> Optional[User]:
         """Get a user by their email."""
-        query = select(UserModel).where(UserModel.email == email)
-        result = self.session.execute(query)
+        if shards_of(self.session) is not None:
+            return self._get_sharded_by_email(email)
+        with replica_reads(self.session):
+            result = self.session.execute(_BY_EMAIL, {"email": email})
         user_model = result.scalar_one_or_none()
 
         if not user_model:
@@ -40,61 +80,131 @@ class PostgresUserRepository(UserRepository):
 
         return self._to_domain(user_model)
 
+    def _get_sharded_by_email(self, email: str) -> Optional[User]:
+        """Resolve the email in the directory, else ask every shard."""
+        user_id = self.session.scalar(_DIRECTORY, {"email": email})
+        if user_id is not None:
+            user = self.get_by_id(user_id)
+            if user is not None and user.email == email:
+                return user
+        # users from before sharding, or an entry left by a create whose shard
+        # commit failed after the directory's
+        rows = shards_of(self.session).gather(_USERS_BY_EMAIL, {"email": email})
+        if not rows and user_id is None:
+            return None
+        user = self._row_to_domain(rows[0]) if rows else None
+        try:
+            # repairing the directory is best effort, never fail the lookup
+            with savepoint(self.session):
+                if user is not None:
+                    self.session.merge(UserDirectoryModel(email=email, user_id=user.id))
+                else:
+                    self.session.execute(
+                        delete(UserDirectoryModel).where(
+                            UserDirectoryModel.email == email
+                        )
+                    )
+        except IntegrityError:
+            # another request added the entry first
+            pass
+        return user
+
     def get_by_id(self, user_id: UUID) -> Optional[User]:
         """Get a user by their ID."""
-        query = select(UserModel).where(UserModel.id == str(user_id))
-        result = self.session.execute(query)
-        user_model = result.scalar_one_or_none()
+        with user_shard(self.session, user_id), replica_reads(self.session):
+            result = self.session.execute(_BY_ID, {"user_id": user_id})
+            user_model = result.scalar_one_or_none()
 
         if not user_model:
             return None
 
         return self._to_domain(user_model)
 
+    def get_by_ids(self, user_ids: List[UUID]) -> List[User]:
+        """Get all users with the given IDs in a single query per shard."""
+        users = []
+        for shard, ids in group_by_shard(self.session, user_ids).items():
+            with on_shard(self.session, shard), replica_reads(self.session):
+                result = self.session.execute(_BY_IDS, {"user_ids": list(ids)})
+                users += [self._to_domain(model) for model in result.scalars()]
+        return users
+
     def update(self, user: User) -> User:
         """Update an existing user."""
-        query = select(UserModel).where(UserModel.id == str(user.id))
-        result = self.session.execute(query)
-        user_model = result.scalar_one_or_none()
-
-        if not user_model:
-            raise ValueError(f"User with id {user.id} not found")
-
-        user_model.email = user.email
-        user_model.first_name = user.first_name
-        user_model.last_name = user.last_name
-        user_model.hashed_password = user.hashed_password
-        user_model.shipping_address = user.shipping_address
-
-        self.session.commit()
+        with user_shard(self.session, user.id, write=True):
+            result = self.session.execute(_BY_ID, {"user_id": user.id})
+            user_model = result.scalar_one_or_none()
+
+            if not user_model:
+                raise ValueError(f"User with id {user.id} not found")
+
+            if shards_of(self.session) is not None and user_model.email != user.email:
+                self._remove_from_directory(user.id)
+                self.session.add(UserDirectoryModel(email=user.email, user_id=user.id))
+            user_model.email = user.email
+            user_model.first_name = user.first_name
+            user_model.last_name = user.last_name
+            user_model.hashed_password = user.hashed_password
+            user_model.shipping_address = user.shipping_address
+
+            self.session.flush()
         return user
 
     def delete(self, user_id: UUID) -> None:
         """Delete a user by their ID."""
-        query = select(UserModel).where(UserModel.id == str(user_id))
-        result = self.session.execute(query)
-        user_model = result.scalar_one_or_none()
+        with user_shard(self.session, user_id, write=True):
+            result = self.session.execute(_BY_ID, {"user_id": user_id})
+            user_model = result.scalar_one_or_none()
 
-        if not user_model:
-            raise ValueError(f"User with id {user_id} not found")
+            if not user_model:
+                raise ValueError(f"User with id {user_id} not found")
 
-        self.session.delete(user_model)
-        self.session.commit()
+            if shards_of(self.session) is not None:
+                self._remove_from_directory(user_id)
+            self.session.delete(user_model)
+            self.session.flush()
+
+    def _remove_from_directory(self, user_id: UUID) -> None:
+        self.session.execute(
+            delete(UserDirectoryModel).where(UserDirectoryModel.user_id == user_id)
+        )
 
     def list_all(self) -> List[User]:
-        """List all users."""
+        """List all users, gathered from every shard in parallel if sharded."""
+        shards = shards_of(self.session)
+        if shards is not None:
+            return [self._row_to_domain(row) for row in shards.gather(_ALL_USERS)]
         query = select(UserModel)
-        result = self.session.execute(query)
-        user_models = result.scalars().all()
+        with replica_reads(self.session):
+            user_models = self.session.execute(query).scalars().all()
         return [self._to_domain(user_model) for user_model in user_models]
 
+    def list_all_rows(self) -> List[Tuple]:
+        """List all users as plain tuples, skipping ORM and entity hydration."""
+        shards = shards_of(self.session)
+        if shards is not None:
+            return shards.gather(_ROWS)
+        with replica_reads(self.session):
+            return self.session.execute(_ROWS).all()
+
     def _to_domain(self, user_model: UserModel) -> User:
         """Convert SQLAlchemy model to domain entity."""
         return User(
-            id=UUID(user_model.id),
+            id=user_model.id,
             email=user_model.email,
             first_name=user_model.first_name,
             last_name=user_model.last_name,
             hashed_password=user_model.hashed_password,
             shipping_address=user_model.shipping_address,
-        ) 
\ No newline at end of file
+        ) 
+
+    def _row_to_domain(self, row) -> User:
+        """Convert a Core row of the users table to a domain entity."""
+        return User(
+            id=row.id,
+            email=row.email,
+            first_name=row.first_name,
+            last_name=row.last_name,
+            hashed_password=row.hashed_password,
+            shipping_address=row.shipping_address,
+        )
@@ -0,0 +1,201 @@
+import copy
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from be_task_ca.database.unit_of_work import UnitOfWork
+from be_task_ca.metrics import registry
+from be_task_ca.user.domain.cart import Cart
+from be_task_ca.user.domain.cart_repository import CartRepository
+from be_task_ca.user.infrastructure.cart_repository import PostgresCartRepository
+
+logger = logging.getLogger(__name__)
+
+buffered_writes = registry.counter(
+    "cart_buffered_writes_total", "Cart writes acknowledged from memory."
+)
+flushed_carts = registry.counter(
+    "cart_flushed_carts_total", "Carts written to the database by flushes."
+)
+flushes = registry.counter("cart_flushes_total", "Flush transactions, by outcome.")
+
+
+class CartWriteBuffer:
+    """Authoritative in-memory carts, written to the database behind the writes.
+
+    Carts are kept per user. Writes only replace the in-memory cart and mark
+    it dirty; a background thread writes every dirty cart in one transaction
+    each `flush_interval` seconds, so a burst of changes to a cart costs one
+    upsert. `flush()` writes synchronously, for checkout and shutdown. A
+    failed flush keeps the carts dirty for the next one.
+
+    The memory is per process: with several workers, requests of one user
+    must be routed to the same worker. Changes acknowledged less than
+    `flush_interval` ago are lost if the process dies without shutting down.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        flush_interval: float = 0.5,
+        max_carts: int = 100_000,
+    ):
+        self._session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_carts = max_carts
+        self._carts: "OrderedDict[UUID, Cart]" = OrderedDict()
+        self._dirty: Dict[UUID, Cart] = {}
+        self._lock = threading.Lock()
+        # serializes flushes, so an older cart state never overwrites a newer
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def get(self, user_id: UUID) -> Optional[Cart]:
+        """A copy of the user's cart if it is in memory."""
+        with self._lock:
+            cart = self._carts.get(user_id)
+            if cart is None:
+                return None
+            self._carts.move_to_end(user_id)
+            return copy.deepcopy(cart)
+
+    def load(self, cart: Cart) -> None:
+        """Keep a cart read from the database, unless a newer one is in memory."""
+        with self._lock:
+            if cart.user_id not in self._carts:
+                self._carts[cart.user_id] = copy.deepcopy(cart)
+                self._evict()
+
+    def put(self, cart: Cart) -> None:
+        """Replace the user's cart and schedule it for the next flush."""
+        self._ensure_started()
+        cart = copy.deepcopy(cart)
+        with self._lock:
+            self._carts[cart.user_id] = cart
+            self._carts.move_to_end(cart.user_id)
+            self._dirty[cart.user_id] = cart
+            self._evict()
+        buffered_writes.inc()
+
+    def discard(self, cart_id: UUID) -> None:
+        with self._lock:
+            for user_id, cart in list(self._carts.items()):
+                if cart.id == cart_id:
+                    del self._carts[user_id]
+                    self._dirty.pop(user_id, None)
+
+    def flush(self) -> int:
+        """Write all dirty carts now; return how many were written."""
+        with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, {}
+            if not dirty:
+                return 0
+            try:
+                self._save(list(dirty.values()))
+            except IntegrityError:
+                # e.g. a cart whose user was deleted, save the others alone
+                carts, written = list(dirty.values()), 0
+                for index, cart in enumerate(carts):
+                    try:
+                        self._save([cart])
+                        written += 1
+                    except IntegrityError:
+                        logger.exception("Dropping unsavable cart %s", cart.id)
+                    except Exception:
+                        self._keep_dirty({c.user_id: c for c in carts[index:]})
+                        raise
+                return written
+            except Exception:
+                self._keep_dirty(dirty)
+                flushes.inc(outcome="error")
+                raise
+            return len(dirty)
+
+    def _save(self, carts: List[Cart]) -> None:
+        with self._session_factory() as session, UnitOfWork(session):
+            PostgresCartRepository(session).save_all(carts)
+        flushes.inc(outcome="ok")
+        flushed_carts.inc(len(carts))
+
+    def _keep_dirty(self, carts: Dict[UUID, Cart]) -> None:
+        with self._lock:
+            # carts changed since are newer than the failed state
+            for user_id, cart in carts.items():
+                self._dirty.setdefault(user_id, cart)
+
+    def close(self) -> None:
+        """Stop the background thread and flush what is left."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._stop.clear()
+                    self._thread = threading.Thread(
+                        target=self._run, name="cart-write-behind", daemon=True
+                    )
+                    self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing buffered carts failed, retrying")
+
+    def _evict(self) -> None:
+        # only carts already written may be forgotten
+        for user_id in list(self._carts):
+            if len(self._carts) <= self.max_carts:
+                return
+            if user_id not in self._dirty:
+                del self._carts[user_id]
+
+
+class WriteBehindCartRepository(CartRepository):
+    """Cart repository acknowledging writes from a CartWriteBuffer."""
+
+    def __init__(self, buffer: CartWriteBuffer, session: Session):
+        self.buffer = buffer
+        self.database = PostgresCartRepository(session)
+
+    def get_by_user_id(self, user_id: UUID) -> Optional[Cart]:
+        """Get a user's cart from memory, loading it on first use."""
+        cart = self.buffer.get(user_id)
+        if cart is None:
+            cart = self.database.get_by_user_id(user_id)
+            if cart is not None:
+                self.buffer.load(cart)
+        return cart
+
+    def create(self, cart: Cart) -> Cart:
+        """Create a new cart, written with the next flush."""
+        self.buffer.put(cart)
+        return cart
+
+    def update(self, cart: Cart) -> Cart:
+        """Update cart contents, written with the next flush."""
+        self.buffer.put(cart)
+        return cart
+
+    def delete(self, cart_id: UUID) -> None:
+        """Flush pending carts, then delete the cart from the database."""
+        self.buffer.flush()
+        self.buffer.discard(cart_id)
+        self.database.delete(cart_id)
+
+    def flush(self) -> None:
+        """Write buffered carts synchronously, e.g. before checkout."""
+        self.buffer.flush()
@@ -26,3 +26,18 @@ class AddToCartRequest(BaseModel):
 
 class AddToCartResponse(BaseModel):
     items: List[AddToCartRequest]
+
+
+class CartItemDetails(AddToCartRequest):
+    name: str
+    price: float
+
+
+class CartResponse(BaseModel):
+    items: List[CartItemDetails]
+
+
+class CartSummaryResponse(BaseModel):
+    line_count: int
+    unit_count: int
+    subtotal: float
@@ -0,0 +1,41 @@
+from unittest import mock
+from uuid import uuid4
+
+import pytest
+
+from be_task_ca.user.domain import cart as cart_module
+from be_task_ca.user.domain.cart import Cart, CartItem
+
+
+def test_entities_are_slotted():
+    """Test cart entities do not carry a per-instance __dict__."""
+    line = CartItem(item_id=uuid4(), quantity=1, id=uuid4())
+    cart = Cart(user_id=uuid4(), items=[line])
+    assert not hasattr(cart, "__dict__")
+    assert not hasattr(cart.items[0], "__dict__")
+
+
+def test_hydrating_cart_item_does_not_generate_id():
+    """Test loading a stored line keeps its id and skips UUID generation."""
+    stored_id = uuid4()
+    with mock.patch.object(cart_module, "uuid4") as generate:
+        item = CartItem(item_id=uuid4(), quantity=2, id=stored_id)
+    generate.assert_not_called()
+    assert item.id == stored_id
+
+
+def test_cart_item_requires_id():
+    """Test a cart line cannot be built without an id by accident."""
+    with pytest.raises(TypeError):
+        CartItem(item_id=uuid4(), quantity=1)
+
+
+def test_add_item_creates_new_line():
+    """Test adding an unknown item creates a line with a fresh id."""
+    item_id = uuid4()
+    cart = Cart(user_id=uuid4())
+    cart.add_item(item_id, 1)
+    cart.add_item(item_id, 2)
+    assert len(cart.items) == 1
+    assert cart.items[0].quantity == 3
+    assert cart.items[0].id
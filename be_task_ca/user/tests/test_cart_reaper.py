@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import sessionmaker
+
+from be_task_ca.database import Base
+from be_task_ca.database.models import CartItemModel, CartModel, UserModel
+from be_task_ca.database.unit_of_work import UnitOfWork
+from be_task_ca.user.domain.cart import Cart
+from be_task_ca.user.infrastructure.cart_reaper import CartReaper
+from be_task_ca.user.infrastructure.cart_repository import PostgresCartRepository
+
+NOW = datetime.now(timezone.utc)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'carts.db'}")
+    Base.metadata.create_all(engine)
+    return engine
+
+
+def create_carts(engine, count, idle_days):
+    """Carts of `count` new users, each with one line, last written days ago."""
+    user_ids = [uuid4() for _ in range(count)]
+    with sessionmaker(bind=engine)() as session, UnitOfWork(session):
+        for user_id in user_ids:
+            session.add(
+                UserModel(
+                    id=user_id,
+                    email=f"{user_id}@example.com",
+                    first_name="Test",
+                    last_name="User",
+                    hashed_password="hashed",
+                )
+            )
+            cart = Cart(user_id=user_id)
+            cart.add_item(uuid4(), 1)
+            PostgresCartRepository(session).create(cart)
+        session.flush()
+        session.execute(
+            CartModel.__table__.update()
+            .where(CartModel.user_id.in_(user_ids))
+            .values(updated_at=NOW - timedelta(days=idle_days))
+        )
+    return user_ids
+
+
+def count(engine, model):
+    with engine.connect() as connection:
+        return connection.scalar(select(func.count()).select_from(model))
+
+
+def test_idle_carts_are_reaped_in_chunks(engine):
+    """Test only carts idle past the age are deleted, a chunk per transaction."""
+    create_carts(engine, 7, idle_days=40)
+    active = create_carts(engine, 2, idle_days=1)
+    transactions = []
+    event.listen(engine, "commit", lambda connection: transactions.append(1))
+
+    reaper = CartReaper([engine], max_idle=30 * 24 * 60 * 60, chunk_size=3, pause=0)
+
+    assert reaper.reap(NOW) == 7
+    assert len(transactions) == 3
+    assert count(engine, CartModel) == 2
+    assert count(engine, CartItemModel) == 2
+    with sessionmaker(bind=engine)() as session:
+        carts = PostgresCartRepository(session)
+        assert all(carts.get_by_user_id(user_id) for user_id in active)
+    assert reaper.reap(NOW) == 0
+
+
+def test_cart_writes_keep_carts_alive(engine):
+    """Test a write to an idle cart moves its last activity forward."""
+    (user_id,) = create_carts(engine, 1, idle_days=40)
+    with sessionmaker(bind=engine)() as session, UnitOfWork(session):
+        carts = PostgresCartRepository(session)
+        cart = carts.get_by_user_id(user_id)
+        cart.add_item(uuid4(), 2)
+        carts.update(cart)
+
+    reaper = CartReaper([engine], max_idle=30 * 24 * 60 * 60, pause=0)
+    assert reaper.reap() == 0
+    assert count(engine, CartModel) == 1
@@ -23,7 +23,7 @@ def test_db():
 @pytest.fixture
 def test_user(test_db):
     """Create a test user."""
-    user_id = str(uuid4())
+    user_id = uuid4()
     user = UserModel(
         id=user_id,
         email="test@example.com",
@@ -45,7 +45,7 @@ def cart_repository(test_db):
 @pytest.fixture
 def test_items(test_db):
     """Create test items."""
-    return [str(uuid4()) for _ in range(3)]
+    return [uuid4() for _ in range(3)]
 
 
 def test_create_cart(cart_repository, test_user):
@@ -69,7 +69,7 @@ def test_get_cart_by_user_id(cart_repository, test_user):
 
 def test_get_nonexistent_cart(cart_repository):
     """Test retrieving a cart that doesn't exist."""
-    cart = cart_repository.get_by_user_id(str(uuid4()))
+    cart = cart_repository.get_by_user_id(uuid4())
     assert cart is None
 
 
@@ -0,0 +1,191 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from be_task_ca.database import Base
+from be_task_ca.dataloader import DataLoader
+from be_task_ca.item.model import Item
+from be_task_ca.database.models import CartModel, ItemModel
+from be_task_ca.item.repository import (
+    bump_catalog_version,
+    find_items_by_ids,
+    save_item,
+)
+from be_task_ca.user.domain.cart import Cart
+from be_task_ca.user.domain.entity import User
+from be_task_ca.user.infrastructure.cart_repository import PostgresCartRepository
+from be_task_ca.user.infrastructure.kv_cart_repository import (
+    SqliteCartRepository,
+    SqliteCartStore,
+)
+from be_task_ca.user.infrastructure.postgres_user_repository import (
+    PostgresUserRepository,
+)
+from be_task_ca.user.usecases import (
+    add_item_to_cart,
+    get_cart_lines,
+    get_cart_summary,
+)
+
+
+@pytest.fixture
+def engine():
+    """Create a fresh in-memory database."""
+    # the use cases query from the threadpool
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def session(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def user(session):
+    """Create a stored test user."""
+    user = User.create_new("cart@example.com", "Cart", "User", "hashed")
+    return PostgresUserRepository(session).create(user)
+
+
+@pytest.fixture
+def items(session):
+    """Create a few stored catalog items."""
+    return [
+        save_item(Item.create_new(f"item {i}", "description", i + 0.5, 5), session)
+        for i in range(5)
+    ]
+
+
+def loaders(session):
+    user_repository = PostgresUserRepository(session)
+    user_loader = DataLoader(
+        lambda ids: {user.id: user for user in user_repository.get_by_ids(ids)}
+    )
+    item_loader = DataLoader(
+        lambda ids: {item.id: item for item in find_items_by_ids(ids, session)}
+    )
+    return user_loader, item_loader
+
+
+def add(session, user_id, item_id, quantity):
+    user_loader, item_loader = loaders(session)
+    return asyncio.run(
+        add_item_to_cart(
+            user_id,
+            item_id,
+            quantity,
+            PostgresCartRepository(session),
+            user_loader,
+            item_loader,
+        )
+    )
+
+
+def test_add_item_to_cart_creates_cart(session, user, items):
+    """Test the first add creates the cart and later adds merge lines."""
+    add(session, user.id, items[0].id, 2)
+    cart = add(session, user.id, items[0].id, 1)
+    assert [(line.item_id, line.quantity) for line in cart.items] == [(items[0].id, 3)]
+
+
+def test_add_item_to_cart_checks_stock(session, user, items):
+    """Test the cart cannot hold more units than the item has in stock."""
+    add(session, user.id, items[0].id, 4)
+    with pytest.raises(ValueError, match="stock"):
+        add(session, user.id, items[0].id, 2)
+
+
+def test_add_item_to_cart_unknown_user_or_item(session, user, items):
+    """Test missing users and items are reported."""
+    with pytest.raises(ValueError, match="User not found"):
+        add(session, items[0].id, items[0].id, 1)
+    with pytest.raises(ValueError, match="Item not found"):
+        add(session, user.id, user.id, 1)
+
+
+def test_get_cart_lines_uses_one_item_query(engine, session, user, items):
+    """Test enriching a cart costs one item query regardless of its size."""
+    for item in items:
+        add(session, user.id, item.id, 1)
+
+    statements = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+    _, item_loader = loaders(session)
+    lines = asyncio.run(
+        get_cart_lines(user.id, PostgresCartRepository(session), item_loader)
+    )
+
+    assert sorted(line.name for line in lines) == [item.name for item in items]
+    assert len([s for s in statements if "FROM items" in s]) == 1
+
+
+def summary(session, user_id, cart_repository=None):
+    _, item_loader = loaders(session)
+    cart_repository = cart_repository or PostgresCartRepository(session)
+    return asyncio.run(get_cart_summary(user_id, cart_repository, item_loader))
+
+
+def test_cart_summary_is_kept_with_every_change(engine, session, user, items):
+    """Test the stored summary follows adds without loading cart lines."""
+    add(session, user.id, items[1].id, 2)
+    add(session, user.id, items[2].id, 1)
+    add(session, user.id, items[1].id, 1)
+
+    statements = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+    result = summary(session, user.id)
+
+    assert (result.line_count, result.unit_count) == (2, 4)
+    assert result.subtotal == pytest.approx(3 * 1.5 + 2.5)
+    assert len(statements) == 1
+    assert "cart_items" not in statements[0]
+
+
+def test_cart_summary_is_repriced_after_catalog_changes(session, user, items):
+    """Test a subtotal priced before a catalog write is computed again."""
+    add(session, user.id, items[1].id, 2)
+    session.query(ItemModel).filter_by(id=items[1].id).update({"price": 10.0})
+    bump_catalog_version(session)
+    session.commit()
+
+    assert summary(session, user.id).subtotal == pytest.approx(20.0)
+    # reading the summary stores nothing, the next write prices the cart again
+    assert not session.dirty and not session.new
+    assert session.query(CartModel.subtotal).scalar() == pytest.approx(2 * 1.5)
+    add(session, user.id, items[1].id, 1)
+    assert summary(session, user.id).subtotal == pytest.approx(30.0)
+
+
+def test_cart_summary_of_stores_without_totals(session, user, items, tmp_path):
+    """Test stores without a stored subtotal get it from the cart lines."""
+    cart_repository = SqliteCartRepository(SqliteCartStore(str(tmp_path / "kv.db")))
+    cart = Cart(user_id=user.id)
+    cart.add_item(items[0].id, 2)
+    cart.add_item(items[3].id, 1)
+    cart_repository.create(cart)
+
+    result = summary(session, user.id, cart_repository)
+
+    assert (result.line_count, result.unit_count) == (2, 3)
+    assert result.subtotal == pytest.approx(2 * 0.5 + 3.5)
+    empty = summary(session, items[0].id)
+    assert (empty.line_count, empty.unit_count, empty.subtotal) == (0, 0, 0.0)
@@ -0,0 +1,71 @@
+from uuid import uuid4
+
+import pytest
+
+from be_task_ca.user.domain.cart import Cart
+from be_task_ca.user.infrastructure.kv_cart_repository import (
+    SqliteCartRepository,
+    SqliteCartStore,
+    encode_cart,
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SqliteCartStore(str(tmp_path / "carts.db"))
+
+
+@pytest.fixture
+def cart_repository(store):
+    return SqliteCartRepository(store)
+
+
+def test_cart_round_trip(cart_repository):
+    cart = Cart(user_id=uuid4())
+    cart.add_item(uuid4(), 2)
+    cart.add_item(uuid4(), 1)
+    cart_repository.create(cart)
+
+    assert cart_repository.get_by_user_id(cart.user_id) == cart
+    assert cart_repository.get_by_user_id(uuid4()) is None
+
+
+def test_update_replaces_the_cart(cart_repository):
+    cart = cart_repository.create(Cart(user_id=uuid4()))
+    cart.add_item(uuid4(), 3)
+
+    cart_repository.update(cart)
+
+    assert cart_repository.get_by_user_id(cart.user_id).items == cart.items
+
+
+def test_update_of_missing_cart_fails(cart_repository):
+    with pytest.raises(ValueError, match="not found"):
+        cart_repository.update(Cart(user_id=uuid4()))
+
+
+def test_delete_by_cart_id(cart_repository):
+    cart = cart_repository.create(Cart(user_id=uuid4()))
+
+    cart_repository.delete(cart.id)
+
+    assert cart_repository.get_by_user_id(cart.user_id) is None
+
+
+def test_store_is_persistent_and_in_wal_mode(store, tmp_path):
+    cart = Cart(user_id=uuid4())
+    SqliteCartRepository(store).create(cart)
+
+    reopened = SqliteCartStore(str(tmp_path / "carts.db"))
+
+    assert SqliteCartRepository(reopened).get_by_user_id(cart.user_id) == cart
+    mode = reopened.connection().execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode == "wal"
+
+
+def test_encoding_is_compact():
+    cart = Cart(user_id=uuid4())
+    for _ in range(10):
+        cart.add_item(uuid4(), 1)
+
+    assert len(encode_cart(cart)) == 20 + 10 * 36
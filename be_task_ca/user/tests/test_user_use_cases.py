@@ -1,6 +1,9 @@
-import pytest
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from uuid import UUID
 
+import pytest
+
 from be_task_ca.user.domain.entity import User
 from be_task_ca.user.usecases import (
     create_user,
@@ -9,7 +12,10 @@ from be_task_ca.user.usecases import (
     update_user,
     delete_user,
     list_users,
+    list_user_rows,
+    user_by_id_flight,
 )
+from be_task_ca.user.domain.repository import USER_ROW_FIELDS
 from be_task_ca.user.schema import CreateUserRequest
 from be_task_ca.user.infrastructure.in_memory_user_repository import InMemoryUserRepository
 
@@ -152,4 +158,66 @@ def test_list_users(user_repository, test_user):
     response = list_users(user_repository)
     assert len(response.users) == 2
     emails = {user.email for user in response.users}
-    assert emails == {"test@example.com", "another@example.com"} 
\ No newline at end of file
+    assert emails == {"test@example.com", "another@example.com"}
+
+
+def test_list_user_rows(user_repository, test_user):
+    """Test listing users as plain rows for the fast path."""
+    rows = list_user_rows(user_repository)
+    assert len(rows) == 1
+    row = dict(zip(USER_ROW_FIELDS, rows[0]))
+    assert row["id"] == test_user.id
+    assert row["email"] == "test@example.com"
+    assert row["shipping_address"] == "123 Test St"
+
+
+def test_concurrent_get_user_by_id_shares_one_lookup(user_repository, test_user):
+    """Test concurrent lookups of the same user run one repository call."""
+    calls, release = [], threading.Event()
+    lookup = user_repository.get_by_id
+
+    def slow_get_by_id(user_id):
+        calls.append(user_id)
+        release.wait(5)
+        return lookup(user_id)
+
+    user_repository.get_by_id = slow_get_by_id
+    with ThreadPoolExecutor(4) as pool:
+        futures = [
+            pool.submit(get_user_by_id, test_user.id, user_repository)
+            for _ in range(4)
+        ]
+        while dict(user_by_id_flight.hottest(100)).get(test_user.id, 0) < 3:
+            threading.Event().wait(0.001)
+        release.set()
+        responses = [future.result() for future in futures]
+
+    assert len(calls) == 1
+    assert {response.email for response in responses} == {"test@example.com"}
+
+
+def test_lookups_after_own_writes_are_not_shared(user_repository, test_user):
+    """Test a caller with uncommitted writes does not join another's lookup."""
+    calls, release = [], threading.Event()
+    # another session, which cannot see the uncommitted user yet
+    other_repository = InMemoryUserRepository()
+
+    def slow_get_by_id(user_id):
+        calls.append(user_id)
+        release.wait(5)
+        return None
+
+    other_repository.get_by_id = slow_get_by_id
+    user_repository.has_uncommitted_writes = lambda: True
+    with ThreadPoolExecutor(1) as pool:
+        other = pool.submit(get_user_by_id, test_user.id, other_repository)
+        while not calls:
+            threading.Event().wait(0.001)
+        try:
+            own = get_user_by_id(test_user.id, user_repository)
+        finally:
+            release.set()
+        with pytest.raises(ValueError):
+            other.result()
+
+    assert own.email == "test@example.com"
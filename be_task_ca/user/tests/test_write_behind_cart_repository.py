@@ -0,0 +1,138 @@
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from be_task_ca.database import Base
+from be_task_ca.database.models import UserModel
+from be_task_ca.user.domain.cart import Cart
+from be_task_ca.user.infrastructure.cart_repository import PostgresCartRepository
+from be_task_ca.user.infrastructure.write_behind_cart_repository import (
+    CartWriteBuffer,
+    WriteBehindCartRepository,
+)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'carts.db'}")
+    event.listen(
+        engine,
+        "connect",
+        lambda connection, record: connection.execute("PRAGMA foreign_keys=ON"),
+    )
+    Base.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def Session(engine):
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def buffer(Session):
+    # a long interval, so only the explicit flushes below write
+    buffer = CartWriteBuffer(Session, flush_interval=60)
+    yield buffer
+    buffer.close()
+
+
+def new_user(Session):
+    user_id = uuid4()
+    with Session() as session:
+        session.add(
+            UserModel(
+                id=user_id,
+                email=f"{user_id}@example.com",
+                first_name="Test",
+                last_name="User",
+                hashed_password="hashed",
+            )
+        )
+        session.commit()
+    return user_id
+
+
+def stored_cart(Session, user_id):
+    with Session() as session:
+        return PostgresCartRepository(session).get_by_user_id(user_id)
+
+
+def count_statements(engine, keyword):
+    statements = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement)
+        if statement.startswith(keyword)
+        else None,
+    )
+    return statements
+
+
+def test_burst_of_changes_is_written_in_one_flush(Session, engine, buffer):
+    user_id, item_id = new_user(Session), uuid4()
+    inserts = count_statements(engine, "INSERT")
+    with Session() as session:
+        repository = WriteBehindCartRepository(buffer, session)
+        cart = repository.create(Cart(user_id=user_id))
+        for _ in range(20):
+            cart = repository.get_by_user_id(user_id)
+            cart.add_item(item_id, 1)
+            repository.update(cart)
+
+        assert inserts == []
+        assert stored_cart(Session, user_id) is None
+        assert repository.get_by_user_id(user_id).items[0].quantity == 20
+
+    assert buffer.flush() == 1
+    assert len(inserts) == 2  # the cart and its line
+    assert stored_cart(Session, user_id).items[0].quantity == 20
+    assert buffer.flush() == 0
+
+
+def test_carts_are_loaded_once_and_changes_flushed_on_close(Session, buffer):
+    user_id, item_id = new_user(Session), uuid4()
+    with Session() as session:
+        database = PostgresCartRepository(session)
+        database.create(Cart(user_id=user_id))
+        repository = WriteBehindCartRepository(buffer, session)
+
+        cart = repository.get_by_user_id(user_id)
+        cart.add_item(item_id, 2)
+        repository.update(cart)
+
+    buffer.close()
+    assert stored_cart(Session, user_id).items[0].quantity == 2
+
+
+def test_failed_flush_keeps_changes_for_the_next_one(Session, buffer):
+    user_id = new_user(Session)
+    repository = WriteBehindCartRepository(buffer, Session())
+    repository.create(Cart(user_id=user_id))
+
+    def unavailable():
+        raise OperationalError("connect", {}, Exception("database is down"))
+
+    buffer._session_factory = unavailable
+    with pytest.raises(OperationalError):
+        buffer.flush()
+    buffer._session_factory = Session
+
+    assert buffer.flush() == 1
+    assert stored_cart(Session, user_id) is not None
+
+
+def test_unsavable_carts_do_not_block_the_others(Session, buffer):
+    user_id = new_user(Session)
+    repository = WriteBehindCartRepository(buffer, Session())
+    repository.create(Cart(user_id=user_id))
+    # e.g. the user was deleted after changing the cart
+    repository.create(Cart(user_id=uuid4()))
+
+    assert buffer.flush() == 1
+    assert stored_cart(Session, user_id) is not None
+    assert buffer.flush() == 0
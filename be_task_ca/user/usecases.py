@@ -1,12 +1,24 @@
+import asyncio
 import hashlib
-from typing import List
+from typing import List, Tuple
 from uuid import UUID
 
+from ..database.blocking import run_blocking, session_turns
+from ..dataloader import DataLoader
+from ..singleflight import SingleFlight
+from .domain.cart import Cart, CartSummary
+from .domain.cart_repository import CartRepository
 from .domain.entity import User
 from .domain.repository import UserRepository
-from .domain.responses import UserResponse, UserListResponse
+from .domain.responses import CartLineResponse, UserResponse, UserListResponse
 from .schema import CreateUserRequest
 
+# concurrent identical lookups share one repository call, unless the caller
+# has uncommitted writes the shared result would not show
+user_by_email_flight = SingleFlight("get_user_by_email")
+user_by_id_flight = SingleFlight("get_user_by_id")
+user_rows_flight = SingleFlight("list_user_rows")
+
 
 def hash_password(password: str) -> str:
     """Hash a password using SHA-512."""
@@ -44,7 +56,11 @@ def create_user(create_user_request: CreateUserRequest, user_repository: UserRep
 
 def get_user_by_email(email: str, user_repository: UserRepository) -> UserResponse:
     """Get user by email."""
-    user = user_repository.get_by_email(email)
+    user = user_by_email_flight.do(
+        email,
+        lambda: user_repository.get_by_email(email),
+        share=not user_repository.has_uncommitted_writes(),
+    )
     if user is None:
         raise ValueError("User not found")
 
@@ -57,9 +73,13 @@ def get_user_by_email(email: str, user_repository: UserRepository) -> UserRespon
     )
 
 
-def get_user_by_id(user_id: str, user_repository: UserRepository) -> UserResponse:
+def get_user_by_id(user_id: UUID, user_repository: UserRepository) -> UserResponse:
     """Get user by ID."""
-    user = user_repository.get_by_id(user_id)
+    user = user_by_id_flight.do(
+        user_id,
+        lambda: user_repository.get_by_id(user_id),
+        share=not user_repository.has_uncommitted_writes(),
+    )
     if user is None:
         raise ValueError("User not found")
 
@@ -72,7 +92,7 @@ def get_user_by_id(user_id: str, user_repository: UserRepository) -> UserRespons
     )
 
 
-def update_user(user_id: str, update_data: CreateUserRequest, user_repository: UserRepository) -> UserResponse:
+def update_user(user_id: UUID, update_data: CreateUserRequest, user_repository: UserRepository) -> UserResponse:
     """Update user information."""
     user = user_repository.get_by_id(user_id)
     if user is None:
@@ -97,7 +117,7 @@ def update_user(user_id: str, update_data: CreateUserRequest, user_repository: U
     )
 
 
-def delete_user(user_id: str, user_repository: UserRepository) -> None:
+def delete_user(user_id: UUID, user_repository: UserRepository) -> None:
     """Delete a user."""
     user = user_repository.get_by_id(user_id)
     if user is None:
@@ -121,3 +141,81 @@ def list_users(user_repository: UserRepository) -> UserListResponse:
             for user in users
         ]
     )
+
+
+def list_user_rows(user_repository: UserRepository) -> List[Tuple]:
+    """List all users as plain rows for the list endpoint fast path."""
+    return user_rows_flight.do(
+        None,
+        user_repository.list_all_rows,
+        share=not user_repository.has_uncommitted_writes(),
+    )
+
+
+async def add_item_to_cart(
+    user_id: UUID,
+    item_id: UUID,
+    quantity: int,
+    cart_repository: CartRepository,
+    user_loader: DataLoader,
+    item_loader: DataLoader,
+) -> Cart:
+    """Add an item to a user's cart, creating the cart on first use."""
+    if quantity < 1:
+        raise ValueError("Quantity must be at least 1")
+    # both loads are dispatched in the same tick
+    with session_turns():
+        user, item = await asyncio.gather(
+            user_loader.load(user_id), item_loader.load(item_id)
+        )
+    if user is None:
+        raise ValueError("User not found")
+    if item is None:
+        raise ValueError("Item not found")
+
+    cart = await run_blocking(cart_repository.get_by_user_id, user_id)
+    if cart is None:
+        cart = await run_blocking(cart_repository.create, Cart(user_id=user_id))
+
+    in_cart = sum(line.quantity for line in cart.items if line.item_id == item_id)
+    if in_cart + quantity > item.quantity:
+        raise ValueError("Not enough items in stock")
+
+    cart.add_item(item_id, quantity)
+    return await run_blocking(cart_repository.update, cart)
+
+
+async def get_cart_lines(
+    user_id: UUID, cart_repository: CartRepository, item_loader: DataLoader
+) -> List[CartLineResponse]:
+    """Get a user's cart lines with item details, in one batched item lookup."""
+    cart = await run_blocking(cart_repository.get_by_user_id, user_id)
+    if cart is None:
+        return []
+
+    items = await item_loader.load_many(line.item_id for line in cart.items)
+    return [
+        CartLineResponse(
+            item_id=line.item_id,
+            quantity=line.quantity,
+            name=item.name,
+            price=item.price,
+        )
+        for line, item in zip(cart.items, items)
+        # lines whose item left the catalog are not shown
+        if item is not None
+    ]
+
+
+async def get_cart_summary(
+    user_id: UUID, cart_repository: CartRepository, item_loader: DataLoader
+) -> CartSummary:
+    """Get the line and unit counts and subtotal of a user's cart."""
+    summary = await run_blocking(cart_repository.get_summary, user_id)
+    if summary is None:
+        return CartSummary(line_count=0, unit_count=0, subtotal=0.0)
+    if summary.subtotal is None:
+        # the store keeps no subtotal, price the lines
+        lines = await get_cart_lines(user_id, cart_repository, item_loader)
+        summary.subtotal = sum(line.price * line.quantity for line in lines)
+    return summary
@@ -0,0 +1,78 @@
+"""What a cold worker pays for its first item list and item lookups, from
+the database versus from a memory-mapped catalog snapshot.
+
+"load" maps the file and checks its header, which every worker does once
+at startup; "list" decodes every item, which a worker does once while the
+snapshot is current; "by id" is one binary search in the mapped file. Runs
+on in-memory SQLite by default, --url runs against another database, whose
+tables are dropped and recreated.
+
+    python -m benchmarks.catalog_snapshot --rows 100000
+"""
+import argparse
+import os
+import random
+import tempfile
+from uuid import uuid4
+
+from sqlalchemy import insert
+
+from be_task_ca.database.models import ItemModel
+from be_task_ca.item.repository import find_item_by_id, get_all_item_rows
+from be_task_ca.item.snapshot import SnapshotFile, write_snapshot
+
+from .harness import measure, session_factory
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--lookups", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--url", help="database URL, default in-memory SQLite")
+    args = parser.parse_args()
+
+    session = session_factory(args.url)()
+    items = [
+        {
+            "id": uuid4(),
+            "name": f"item-{i}",
+            "description": "a fairly ordinary catalog description",
+            "price": 9.99,
+            "quantity": 10,
+        }
+        for i in range(args.rows)
+    ]
+    session.execute(insert(ItemModel), items)
+    session.commit()
+    ids = [item["id"] for item in random.Random(0).sample(items, args.lookups)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "catalog.snap")
+        write_snapshot(session, path)
+        snapshot = SnapshotFile(path)
+        print(f"{args.rows} items, snapshot of {os.path.getsize(path)} bytes")
+
+        def by_id_database():
+            for item_id in ids:
+                find_item_by_id(item_id, session)
+            session.expunge_all()
+
+        def by_id_snapshot():
+            for item_id in ids:
+                snapshot.get(item_id)
+
+        cases = [
+            ("list: database", lambda: get_all_item_rows(session), 1),
+            ("list: snapshot", snapshot.rows, 1),
+            ("load: snapshot", lambda: SnapshotFile(path).close(), 1),
+            ("by id: database", by_id_database, len(ids)),
+            ("by id: snapshot", by_id_snapshot, len(ids)),
+        ]
+        for name, fn, operations in cases:
+            print(measure(name, fn, repeat=args.repeat, operations=operations))
+        snapshot.close()
+
+
+if __name__ == "__main__":
+    main()
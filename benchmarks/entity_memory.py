@@ -0,0 +1,81 @@
+"""Memory and throughput of hydrating domain entities from row tuples.
+
+Each entity is compared with a `__dict__`-based clone of itself, which is
+what the entities looked like before they were slotted.
+
+    python -m benchmarks.entity_memory --rows 1000000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from dataclasses import fields, make_dataclass
+from uuid import uuid4
+
+from be_task_ca.item.model import Item
+from be_task_ca.user.domain.cart import CartItem
+from be_task_ca.user.domain.entity import User
+
+
+def unslotted(cls):
+    """Rebuild `cls` as a plain dataclass with a per-instance `__dict__`."""
+    return make_dataclass(
+        f"Dict{cls.__name__}", [(f.name, f.type) for f in fields(cls)]
+    )
+
+
+def item_rows(count):
+    item_id = uuid4()
+    return [(item_id, f"item-{i}", "description", 9.99, i) for i in range(count)]
+
+
+def user_rows(count):
+    user_id = uuid4()
+    return [
+        (user_id, f"user{i}@example.com", "First", "Last", "x" * 128, None)
+        for i in range(count)
+    ]
+
+
+def cart_item_rows(count):
+    # (item_id, quantity, id): the line id comes from storage, never uuid4()
+    line_id = uuid4()
+    return [(line_id, i, line_id) for i in range(count)]
+
+
+def hydrate(cls, rows):
+    """Build one entity per row and report retained bytes and rows/s."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    entities = [cls(*row) for row in rows]
+    elapsed = time.perf_counter() - start
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del entities
+    return retained, len(rows) / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    cases = [
+        (Item, item_rows),
+        (User, user_rows),
+        (CartItem, cart_item_rows),
+    ]
+    print(f"hydrating {args.rows} rows per entity")
+    for cls, make_rows in cases:
+        rows = make_rows(args.rows)
+        for variant in (unslotted(cls), cls):
+            retained, rate = hydrate(variant, rows)
+            print(
+                f"{variant.__name__:<14} {retained / args.rows:8.1f} B/entity"
+                f" {retained / 2**20:10.1f} MiB {rate / 1e3:10.0f}k rows/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Shared helpers for the benchmark scripts in this package."""
+import gc
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from be_task_ca.database import Base
+
+
+@dataclass
+class Measurement:
+    """Best wall time and peak traced allocation of a benchmarked callable."""
+
+    name: str
+    seconds: float
+    peak_bytes: int
+    operations: int = 1
+
+    @property
+    def per_op_us(self) -> float:
+        return self.seconds / self.operations * 1e6
+
+    @property
+    def per_op_bytes(self) -> float:
+        return self.peak_bytes / self.operations
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name:<48} {self.seconds * 1e3:10.2f} ms"
+            f" {self.per_op_us:10.2f} us/op"
+            f" {self.peak_bytes / 1024:12.1f} KiB peak"
+            f" {self.per_op_bytes:10.0f} B/op"
+        )
+
+
+def measure(
+    name: str, fn: Callable[[], object], repeat: int = 5, operations: int = 1
+) -> Measurement:
+    """Run `fn` `repeat` times; keep the best time and the allocation peak.
+
+    Timing runs happen without tracemalloc so it does not skew the numbers,
+    one extra traced run records the peak allocation.
+    """
+    fn()  # warm-up: statement caches, imports, lazy attributes
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return Measurement(name, best, peak, operations)
+
+
+def session_factory(url: Optional[str] = None) -> sessionmaker:
+    """Create a sessionmaker over a fresh schema.
+
+    Without `url` this is in-memory SQLite, set up like `user/tests/conftest.py`.
+    Any other database has its tables DROPPED and recreated.
+    """
+    if url is None:
+        engine = create_engine(
+            "sqlite:///:memory:",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+    else:
+        engine = create_engine(url)
+        Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
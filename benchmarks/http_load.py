@@ -0,0 +1,363 @@
+"""End-to-end HTTP load test of `be_task_ca.app:app`.
+
+Seeds a database, boots the app with uvicorn in a subprocess and drives
+request mixes against it with keep-alive connections from worker threads:
+
+* browse - item search, autocomplete and cart views
+* signup - user creation
+* cart   - adding items to carts and reading them back
+* list   - the full `GET /users/` and `GET /items/` lists
+
+Every mix runs for each catalog size in --sizes. Throughput and latency
+percentiles are printed, written to --output as JSON and, when a baseline
+exists, compared against it; the script exits with status 1 on regression.
+
+    python -m benchmarks.http_load --sizes 10000 100000 --duration 20
+    python -m benchmarks.http_load --update-baseline
+
+By default the database is a fresh SQLite file. --url points it at another
+database instead; ITS TABLES ARE DROPPED AND RE-SEEDED.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+from uuid import uuid4
+
+from sqlalchemy import create_engine, insert
+
+from be_task_ca.database import Base
+from be_task_ca.database.models import ItemModel, UserModel
+from be_task_ca.user.usecases import hash_password
+
+BASELINE = Path(__file__).with_name("http_load_baseline.json")
+SEED_CHUNK = 10_000
+# ids kept in memory to build requests, a sample is enough at any size
+ID_SAMPLE = 5_000
+WORDS = ["red", "lamp", "desk", "chair", "oak", "steel", "lava", "shirt", "mug"]
+
+
+def seed(url: str, rows: int) -> Tuple[List[str], List[str]]:
+    """Recreate the schema with `rows` users and items; return sampled ids."""
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    password = hash_password("password")
+    user_ids, item_ids = [], []
+    with engine.begin() as connection:
+        for start in range(0, rows, SEED_CHUNK):
+            users, items = [], []
+            for i in range(start, min(start + SEED_CHUNK, rows)):
+                user_id, item_id = uuid4(), uuid4()
+                users.append(
+                    {
+                        "id": user_id,
+                        "email": f"user{i}@example.com",
+                        "first_name": "Load",
+                        "last_name": f"Test {i}",
+                        "hashed_password": password,
+                        "shipping_address": f"{i} Benchmark Street",
+                    }
+                )
+                items.append(
+                    {
+                        "id": item_id,
+                        "name": f"{WORDS[i % 9]} {WORDS[i // 9 % 9]} {i}",
+                        "description": f"A {WORDS[i // 81 % 9]} thing",
+                        "price": 1 + i % 500,
+                        "quantity": 1_000_000_000,
+                    }
+                )
+                if i < ID_SAMPLE:
+                    user_ids.append(str(user_id))
+                    item_ids.append(str(item_id))
+            connection.execute(insert(UserModel), users)
+            connection.execute(insert(ItemModel), items)
+    engine.dispose()
+    return user_ids, item_ids
+
+
+class Server:
+    """The app running under uvicorn in a subprocess."""
+
+    def __init__(self, url: str, workers: int):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            self.port = probe.getsockname()[1]
+        command = [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "be_task_ca.app:app",
+            "--port",
+            str(self.port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+            "--no-access-log",
+        ]
+        env = dict(os.environ, DATABASE_URL=url)
+        self.process = subprocess.Popen(command, env=env)
+
+    def wait_ready(self, timeout: float = 60.0) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError("server exited during startup")
+            try:
+                connection = http.client.HTTPConnection("127.0.0.1", self.port)
+                connection.request("GET", "/")
+                if connection.getresponse().status == 200:
+                    return
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError("server did not become ready")
+
+    def stop(self) -> None:
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+
+class Client:
+    """One keep-alive connection issuing JSON requests."""
+
+    def __init__(self, port: int):
+        self.connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+
+    def request(self, method: str, path: str, body=None) -> int:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        payload = json.dumps(body) if body is not None else None
+        try:
+            self.connection.request(method, path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            return 599
+
+
+Operation = Callable[[Client, random.Random], Tuple[str, int]]
+
+
+def build_mixes(user_ids: List[str], item_ids: List[str]) -> Dict[str, list]:
+    """Weighted operations of every mix, as (weight, operation) pairs."""
+    signups = iter(range(10**9))
+
+    def search(client, rng):
+        query = f"{rng.choice(WORDS)}+{rng.choice(WORDS)}"
+        return "search", client.request("GET", f"/items/search?q={query}")
+
+    def autocomplete(client, rng):
+        path = f"/items/autocomplete?prefix={rng.choice(WORDS)[:2]}"
+        return "autocomplete", client.request("GET", path)
+
+    def view_cart(client, rng):
+        return "view_cart", client.request("GET", f"/users/{rng.choice(user_ids)}/cart")
+
+    def add_to_cart(client, rng):
+        body = {"item_id": rng.choice(item_ids), "quantity": 1}
+        path = f"/users/{rng.choice(user_ids)}/cart"
+        return "add_to_cart", client.request("POST", path, body)
+
+    def signup(client, rng):
+        body = {
+            "first_name": "New",
+            "last_name": "User",
+            "email": f"signup-{uuid4().hex}-{next(signups)}@example.com",
+            "password": "password",
+            "shipping_address": None,
+        }
+        return "signup", client.request("POST", "/users/", body)
+
+    def list_users(client, rng):
+        return "list_users", client.request("GET", "/users/")
+
+    def list_items(client, rng):
+        return "list_items", client.request("GET", "/items/")
+
+    return {
+        "browse": [(6, search), (3, autocomplete), (1, view_cart)],
+        "signup": [(1, signup)],
+        "cart": [(3, add_to_cart), (1, view_cart)],
+        "list": [(1, list_users), (1, list_items)],
+    }
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_mix(port: int, mix: list, concurrency: int, duration: float) -> dict:
+    """Run one mix for `duration` seconds and summarize its latencies."""
+    weights = [weight for weight, _ in mix]
+    operations = [operation for _, operation in mix]
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(seed: int) -> None:
+        rng = random.Random(seed)
+        client = Client(port)
+        local: List[Tuple[str, float, int]] = []
+        while time.monotonic() < deadline:
+            operation = rng.choices(operations, weights)[0]
+            start = time.perf_counter()
+            name, status = operation(client, rng)
+            local.append((name, time.perf_counter() - start, status))
+        with lock:
+            for name, elapsed, status in local:
+                latencies[name].append(elapsed)
+                if status >= 400:
+                    errors[name] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    def summary(samples: List[float], error_count: int) -> dict:
+        ordered = sorted(samples)
+        return {
+            "requests": len(ordered),
+            "errors": error_count,
+            "rps": round(len(ordered) / elapsed, 1),
+            "p50_ms": round(percentile(ordered, 0.50) * 1e3, 2),
+            "p95_ms": round(percentile(ordered, 0.95) * 1e3, 2),
+            "p99_ms": round(percentile(ordered, 0.99) * 1e3, 2),
+        }
+
+    everything = [sample for samples in latencies.values() for sample in samples]
+    result = summary(everything, sum(errors.values()))
+    result["operations"] = {
+        name: summary(samples, errors[name]) for name, samples in latencies.items()
+    }
+    return result
+
+
+def error_rate(result: dict) -> float:
+    """Share of a mix's requests answered with an error status."""
+    return result["errors"] / result["requests"] if result["requests"] else 0.0
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Compare mix totals with the baseline; RPS may not drop, p95 may not rise.
+
+    The error rate may not rise above the baseline's, nor above zero for a
+    mix the baseline does not have.
+    """
+    regressions = []
+    for key, actual in results["results"].items():
+        expected = baseline.get("results", {}).get(key)
+        allowed = error_rate(expected) if expected else 0.0
+        if error_rate(actual) > allowed:
+            regressions.append(
+                f"{key}: {error_rate(actual):.2%} errors > {allowed:.2%}"
+            )
+        if expected is None:
+            continue
+        if actual["rps"] < expected["rps"] * (1 - tolerance):
+            regressions.append(f"{key}: {actual['rps']} rps < {expected['rps']} rps")
+        if actual["p95_ms"] > expected["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{key}: p95 {actual['p95_ms']} ms > {expected['p95_ms']} ms"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000])
+    parser.add_argument(
+        "--mixes", nargs="+", default=["browse", "signup", "cart", "list"]
+    )
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--url", help="database URL, defaults to a temp SQLite file")
+    parser.add_argument("--output", default="http_load_results.json")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory()
+    url = args.url or f"sqlite:///{workdir.name}/load.db"
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "database": create_engine(url).dialect.name,
+        },
+        "results": {},
+    }
+
+    for size in args.sizes:
+        print(f"seeding {size} users and items")
+        user_ids, item_ids = seed(url, size)
+        mixes = build_mixes(user_ids, item_ids)
+        server = Server(url, args.workers)
+        try:
+            server.wait_ready()
+            for name in args.mixes:
+                result = run_mix(
+                    server.port, mixes[name], args.concurrency, args.duration
+                )
+                results["results"][f"{name}@{size}"] = result
+                print(
+                    f"{name + '@' + str(size):<16} {result['rps']:>9} rps"
+                    f"  p50 {result['p50_ms']:>8} ms  p95 {result['p95_ms']:>8} ms"
+                    f"  p99 {result['p99_ms']:>8} ms  errors {result['errors']}"
+                )
+        finally:
+            server.stop()
+
+    Path(args.output).write_text(json.dumps(results, indent=2))
+    print(f"results written to {args.output}")
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2))
+        print(f"baseline updated: {args.baseline}")
+        return 0
+    baseline = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+    else:
+        print(
+            f"WARNING no baseline at {args.baseline}, only failing on errors;"
+            " store one with --update-baseline",
+            file=sys.stderr,
+        )
+    regressions = find_regressions(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""Item search and autocomplete latency against downloading the catalog.
+
+SQLite has no trigram or full-text index, so substring and full-text numbers
+here are table scans; on PostgreSQL they use the indexes from
+`database/models.py`. Pass --url to run against a PostgreSQL database, its
+tables are dropped and recreated.
+
+    python -m benchmarks.item_search --rows 100000
+"""
+import argparse
+from uuid import uuid4
+
+from sqlalchemy import insert
+
+from be_task_ca.database.models import ItemModel
+from be_task_ca.item.model import SearchMode
+from be_task_ca.item.search_index import item_name_index
+from be_task_ca.item.usecases import (
+    ITEM_ROW_FIELDS,
+    autocomplete_items,
+    get_all_rows,
+    search_items,
+)
+from be_task_ca.serialization import encode_rows
+
+from .harness import measure, session_factory
+
+WORDS = ["red", "lamp", "desk", "chair", "oak", "steel", "lava", "shirt", "mug"]
+
+
+def seed(session, rows: int) -> None:
+    session.execute(
+        insert(ItemModel),
+        [
+            {
+                "id": uuid4(),
+                "name": f"{WORDS[i % 9]} {WORDS[i // 9 % 9]} {i}",
+                "description": f"A {WORDS[i // 81 % 9]} item for your {WORDS[i % 7]}",
+                "price": 9.99,
+                "quantity": 1,
+            }
+            for i in range(rows)
+        ],
+    )
+    session.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--url", help="database URL (tables are recreated), default in-memory SQLite"
+    )
+    args = parser.parse_args()
+
+    session = session_factory(args.url)()
+    seed(session, args.rows)
+    item_name_index.invalidate()
+
+    cases = [
+        (
+            "download whole catalog",
+            lambda: encode_rows(ITEM_ROW_FIELDS, get_all_rows(session), "items"),
+        ),
+        (
+            "autocomplete (in-process index)",
+            lambda: autocomplete_items("lava s", 10, session),
+        ),
+    ]
+    for mode, query in [
+        (SearchMode.PREFIX, "lava steel 1"),
+        (SearchMode.SUBSTRING, "steel 12"),
+        (SearchMode.FULLTEXT, "oak lamp"),
+    ]:
+        cases.append(
+            (
+                f"search mode={mode.value}",
+                lambda mode=mode, query=query: encode_rows(
+                    ITEM_ROW_FIELDS, search_items(query, mode, 20, session), "items"
+                ),
+            )
+        )
+
+    print(f"{args.rows} items, best of {args.repeat}")
+    for name, fn in cases:
+        print(measure(name, fn, repeat=args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Compare the pydantic list path with the raw-row JSON, MessagePack and
+Arrow paths, with the size of each encoding.
+
+    python -m benchmarks.list_serialization --rows 100000
+"""
+import argparse
+from uuid import uuid4
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import insert
+
+from be_task_ca.database.models import ItemModel, UserModel
+from be_task_ca import serialization
+from be_task_ca.item.usecases import (
+    ITEM_ROW_FIELDS,
+    ITEM_ROW_TYPES,
+    get_all,
+    get_all_rows,
+)
+from be_task_ca.serialization import encode_rows
+from be_task_ca.user.domain.repository import USER_ROW_FIELDS, USER_ROW_TYPES
+from be_task_ca.user.infrastructure.postgres_user_repository import (
+    PostgresUserRepository,
+)
+from be_task_ca.user.schema import CreateUserResponse
+from be_task_ca.user.usecases import list_user_rows, list_users
+
+from .harness import measure, session_factory
+
+
+def seed(session, rows: int) -> None:
+    session.execute(
+        insert(UserModel),
+        [
+            {
+                "id": uuid4(),
+                "email": f"user{i}@example.com",
+                "first_name": "First",
+                "last_name": f"Last{i}",
+                "hashed_password": "x" * 128,
+                "shipping_address": f"{i} Example Street",
+            }
+            for i in range(rows)
+        ],
+    )
+    session.execute(
+        insert(ItemModel),
+        [
+            {
+                "id": uuid4(),
+                "name": f"item-{i}",
+                "description": "A perfectly ordinary item",
+                "price": i + 0.99,
+                "quantity": i % 100,
+            }
+            for i in range(rows)
+        ],
+    )
+    session.commit()
+
+
+def users_pydantic_path(repository) -> bytes:
+    """ORM -> User -> UserResponse -> CreateUserResponse -> JSON, as before."""
+    users = [
+        CreateUserResponse(
+            id=user.id,
+            email=user.email,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            shipping_address=user.shipping_address,
+        )
+        for user in list_users(repository).users
+    ]
+    return JSONResponse(jsonable_encoder(users)).body
+
+
+def items_pydantic_path(session) -> bytes:
+    """ORM -> Item -> CreateItemResponse -> JSON, as before."""
+    return JSONResponse(jsonable_encoder(get_all(session))).body
+
+
+def binary_path(media_type, columns, types, rows, envelope=None):
+    """Rows -> negotiated binary format, as served for that Accept header."""
+    return lambda: serialization.rows_response(
+        media_type, columns, types, rows(), envelope
+    ).body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    session = session_factory()()
+    seed(session, args.rows)
+    repository = PostgresUserRepository(session)
+
+    cases = [
+        ("users: pydantic path", lambda: users_pydantic_path(repository)),
+        (
+            "users: row fast path",
+            lambda: encode_rows(USER_ROW_FIELDS, list_user_rows(repository)),
+        ),
+        ("items: pydantic path", lambda: items_pydantic_path(session)),
+        (
+            "items: row fast path",
+            lambda: encode_rows(ITEM_ROW_FIELDS, get_all_rows(session), "items"),
+        ),
+    ]
+    for media_type in serialization.available_media_types()[1:]:
+        name = media_type.split("/")[1]
+        cases += [
+            (
+                f"users: {name}",
+                binary_path(
+                    media_type,
+                    USER_ROW_FIELDS,
+                    USER_ROW_TYPES,
+                    lambda: list_user_rows(repository),
+                ),
+            ),
+            (
+                f"items: {name}",
+                binary_path(
+                    media_type,
+                    ITEM_ROW_FIELDS,
+                    ITEM_ROW_TYPES,
+                    lambda: get_all_rows(session),
+                    "items",
+                ),
+            ),
+        ]
+    print(f"{args.rows} rows, best of {args.repeat}")
+    for name, fn in cases:
+        result = measure(name, fn, repeat=args.repeat, operations=args.rows)
+        print(f"{result}, {len(fn()) / args.rows:.0f} B/row")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Per-call Python overhead of the hot point lookups, before and after the
+statements were built once at import time.
+
+"rebuilt" constructs the statement on every call, as the repositories used
+to; "prebuilt" is the current repository method; "construction only" is the
+part of the rebuilt cost spent building the statement and its cache key,
+without touching the database. Runs on in-memory SQLite by default, --url
+runs against another database, whose tables are dropped and recreated.
+
+    python -m benchmarks.point_lookups --lookups 5000
+"""
+import argparse
+import random
+from uuid import uuid4
+
+from sqlalchemy import insert, select
+
+from be_task_ca.database.models import CartModel, ItemModel, UserModel
+from be_task_ca.item.repository import find_item_by_id
+from be_task_ca.user.infrastructure.cart_repository import PostgresCartRepository
+from be_task_ca.user.infrastructure.postgres_user_repository import (
+    PostgresUserRepository,
+)
+
+from .harness import measure, session_factory
+
+
+def seed(session, rows: int):
+    users = [
+        {
+            "id": uuid4(),
+            "email": f"user{i}@example.com",
+            "first_name": "First",
+            "last_name": "Last",
+            "hashed_password": "x" * 128,
+            "shipping_address": None,
+        }
+        for i in range(rows)
+    ]
+    items = [
+        {
+            "id": uuid4(),
+            "name": f"item-{i}",
+            "description": "description",
+            "price": 9.99,
+            "quantity": 10,
+        }
+        for i in range(rows)
+    ]
+    session.execute(insert(UserModel), users)
+    session.execute(insert(ItemModel), items)
+    session.execute(
+        insert(CartModel), [{"id": uuid4(), "user_id": u["id"]} for u in users]
+    )
+    session.commit()
+    return users, items
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--lookups", type=int, default=2_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--url", help="database URL, default in-memory SQLite")
+    args = parser.parse_args()
+
+    session = session_factory(args.url)()
+    users, items = seed(session, args.rows)
+    sample = random.Random(0).sample(range(args.rows), min(args.lookups, args.rows))
+    emails = [users[i]["email"] for i in sample]
+    user_ids = [users[i]["id"] for i in sample]
+    item_ids = [items[i]["id"] for i in sample]
+    user_repository = PostgresUserRepository(session)
+    cart_repository = PostgresCartRepository(session)
+
+    def run(lookup, keys):
+        def lookups():
+            for key in keys:
+                lookup(key)
+            # keep the identity map from growing across runs
+            session.expunge_all()
+
+        return lookups
+
+    def by_email_rebuilt(email):
+        stmt = select(UserModel).where(UserModel.email == email)
+        return session.execute(stmt).scalar_one_or_none()
+
+    def by_id_rebuilt(user_id):
+        stmt = select(UserModel).where(UserModel.id == user_id)
+        return session.execute(stmt).scalar_one_or_none()
+
+    def cart_rebuilt(user_id):
+        stmt = select(CartModel).where(CartModel.user_id == user_id)
+        cart_model = session.execute(stmt).scalar_one_or_none()
+        return cart_repository._to_domain(cart_model) if cart_model else None
+
+    def item_rebuilt(item_id):
+        return session.query(ItemModel).filter(ItemModel.id == item_id).first()
+
+    def construction_only(user_id):
+        select(UserModel).where(UserModel.id == user_id)._generate_cache_key()
+
+    cases = [
+        ("user by email: rebuilt", run(by_email_rebuilt, emails)),
+        ("user by email: prebuilt", run(user_repository.get_by_email, emails)),
+        ("user by id: rebuilt", run(by_id_rebuilt, user_ids)),
+        ("user by id: prebuilt", run(user_repository.get_by_id, user_ids)),
+        ("user by id: construction only", run(construction_only, user_ids)),
+        ("cart by user id: rebuilt", run(cart_rebuilt, user_ids)),
+        ("cart by user id: prebuilt", run(cart_repository.get_by_user_id, user_ids)),
+        ("item by id: rebuilt (query API)", run(item_rebuilt, item_ids)),
+        (
+            "item by id: prebuilt",
+            run(lambda item_id: find_item_by_id(item_id, session), item_ids),
+        ),
+    ]
+    print(f"{len(sample)} lookups in {args.rows} rows, best of {args.repeat}")
+    for name, fn in cases:
+        print(measure(name, fn, repeat=args.repeat, operations=len(sample)))
+
+
+if __name__ == "__main__":
+    main()
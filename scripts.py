@@ -1,11 +1,79 @@
+import importlib.util
+import os
 import subprocess
+import sys
 import uvicorn
 
+from be_task_ca.settings import settings
+
+BENCHMARKS = [
+    "benchmarks.list_serialization",
+    "benchmarks.entity_memory",
+    "benchmarks.item_search",
+    "benchmarks.repository",
+    "benchmarks.cart_store",
+    "benchmarks.point_lookups",
+    "benchmarks.catalog_snapshot",
+]
+
 
 def start():
     uvicorn.run("be_task_ca.app:app", host="0.0.0.0", port=8000, reload=True)
 
 
+def usable_cores() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def serve():
+    """Production server: a worker per core sharing the database connection cap."""
+    workers = settings.web_workers or usable_cores()
+    if settings.cart_write_behind and settings.cart_store == "postgres":
+        # each worker's buffer is the authoritative copy of its carts, so two
+        # workers would overwrite each other's flushes
+        if (settings.web_workers or 1) > 1:
+            sys.exit(
+                f"CART_WRITE_BEHIND needs a single worker, not WEB_WORKERS={workers}"
+            )
+        workers = 1
+    pool_size = settings.database_max_connections // workers
+    if pool_size < 1:
+        sys.exit(
+            f"DATABASE_MAX_CONNECTIONS={settings.database_max_connections}"
+            f" is less than one connection for each of the {workers} workers"
+        )
+    # read by the workers' engines, no overflow so the cap holds under load
+    os.environ["DATABASE_POOL_SIZE"] = str(pool_size)
+    os.environ["DATABASE_MAX_OVERFLOW"] = "0"
+
+    # Spawned workers cannot share an imported app, so import it once here to
+    # fail before starting them on broken code or configuration.
+    from be_task_ca.database import engine
+    import be_task_ca.app  # noqa: F401
+
+    engine.dispose()
+
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    print(
+        f"serving on {settings.web_host}:{settings.web_port} with {workers}"
+        f" workers ({loop}, {http}), {pool_size} connections each"
+    )
+    uvicorn.run(
+        "be_task_ca.app:app",
+        host=settings.web_host,
+        port=settings.web_port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        backlog=settings.web_backlog,
+        timeout_keep_alive=settings.web_keepalive_seconds,
+        timeout_graceful_shutdown=settings.web_graceful_shutdown_seconds,
+    )
+
+
 def auto_format():
     subprocess.call(["black", "be_task_ca"])
 
@@ -18,6 +86,15 @@ def run_tests():
     subprocess.call(["pytest"])
 
 
+def run_benchmarks():
+    for module in BENCHMARKS:
+        subprocess.call(["python", "-m", module])
+
+
+def run_load_test():
+    sys.exit(subprocess.call(["python", "-m", "benchmarks.http_load", *sys.argv[1:]]))
+
+
 def create_dependency_graph():
     subprocess.call(["pydeps", "be_task_ca", "--cluster"])
 
@@ -0,0 +1,170 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from sqlalchemy import create_engine
+
+from be_task_ca import admission
+from be_task_ca.admission import ConcurrencyLimit, install_admission_control
+from be_task_ca.database.pool import TimedQueuePool, timed_pool_class
+from be_task_ca.database.sharding import ShardSet
+from be_task_ca.metrics import Registry
+
+
+def test_limit_hands_released_slots_to_waiters_in_order():
+    async def scenario():
+        limit = ConcurrencyLimit(1)
+        assert await limit.acquire(timeout=0)
+        order = []
+
+        async def waiter(name):
+            assert await limit.acquire(timeout=1)
+            order.append(name)
+            limit.release()
+
+        tasks = [asyncio.create_task(waiter(name)) for name in "ab"]
+        await asyncio.sleep(0)
+        limit.release()
+        await asyncio.gather(*tasks)
+        return order, limit.active
+
+    assert asyncio.run(scenario()) == (["a", "b"], 0)
+
+
+def test_limit_gives_up_after_timeout():
+    async def scenario():
+        limit = ConcurrencyLimit(1)
+        await limit.acquire(timeout=0)
+        acquired = await limit.acquire(timeout=0.01)
+        return acquired, limit.queued, limit.active
+
+    assert asyncio.run(scenario()) == (False, 0, 1)
+
+
+@pytest.fixture
+def overloaded_app(monkeypatch):
+    """One read at a time, a slow read endpoint and a short queue."""
+    monkeypatch.setattr(admission.settings, "admission_limits", {"read": 1})
+    monkeypatch.setattr(admission.settings, "admission_queue_seconds", 0.05)
+    app = FastAPI()
+
+    @app.get("/slow")
+    async def slow():
+        await asyncio.sleep(0.2)
+        return {"ok": True}
+
+    install_admission_control(app)
+    return app
+
+
+def concurrent_gets(app, count):
+    async def run():
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            return await asyncio.gather(*(client.get("/slow") for _ in range(count)))
+
+    return asyncio.run(run())
+
+
+def shed_count(reason):
+    return admission.shed.value(route_class="read", reason=reason)
+
+
+def test_requests_over_the_limit_are_shed_after_the_queue_deadline(overloaded_app):
+    before = shed_count("queue_timeout")
+
+    responses = concurrent_gets(overloaded_app, 2)
+
+    assert sorted(r.status_code for r in responses) == [200, 503]
+    rejected = next(r for r in responses if r.status_code == 503)
+    assert rejected.headers["Retry-After"] == "1"
+    assert shed_count("queue_timeout") == before + 1
+
+
+def test_requests_are_not_queued_while_the_pool_is_congested(
+    overloaded_app, monkeypatch
+):
+    monkeypatch.setattr(admission.settings, "admission_queue_seconds", 10)
+    monkeypatch.setattr(admission, "database_wait", lambda: 1.0)
+    before = shed_count("pool_wait")
+
+    started = time.monotonic()
+    responses = concurrent_gets(overloaded_app, 3)
+
+    assert sorted(r.status_code for r in responses) == [200, 503, 503]
+    assert time.monotonic() - started < 5
+    assert shed_count("pool_wait") == before + 2
+
+
+def test_timed_pool_records_checkout_waits(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'pool.db'}"
+    engine = create_engine(
+        url, poolclass=timed_pool_class(url), pool_size=1, max_overflow=0
+    )
+    assert isinstance(engine.pool, TimedQueuePool)
+
+    held = engine.connect()
+    threading.Timer(0.1, held.close).start()
+    with engine.connect():
+        pass
+
+    # one checkout waited ~0.1s, moving the average by `smoothing` of that
+    assert engine.pool.recent_wait() > 0.01
+    assert engine.pool.recent_wait(max_age=0) == 0.0
+    assert timed_pool_class("sqlite://") is not TimedQueuePool
+
+    # a congested shard counts like a congested primary
+    shards = ShardSet([create_engine("sqlite://"), engine])
+    monkeypatch.setattr(admission, "shards", shards)
+    assert admission.database_wait() > 0.01
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests.")
+    requests.inc(route_class="read")
+    requests.inc(2, route_class="read")
+    registry.gauge("temperature", "Degrees.").set(21.5)
+
+    assert registry.render() == (
+        "# HELP requests_total Requests.\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{route_class="read"} 3\n'
+        "# HELP temperature Degrees.\n"
+        "# TYPE temperature gauge\n"
+        "temperature 21.5\n"
+    )
+
+
+def test_streamed_exports_hold_their_slot_until_the_body_ends(monkeypatch):
+    monkeypatch.setattr(admission.settings, "admission_limits", {"bulk": 1})
+    monkeypatch.setattr(admission.settings, "admission_queue_seconds", 0.05)
+    app = FastAPI()
+
+    @app.get("/items/export")
+    async def export():
+        async def rows():
+            for _ in range(4):
+                await asyncio.sleep(0.05)
+                yield b"row\n"
+
+        return StreamingResponse(rows())
+
+    install_admission_control(app)
+
+    async def run():
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            first = asyncio.create_task(client.get("/items/export"))
+            await asyncio.sleep(0.02)
+            return await asyncio.gather(first, client.get("/items/export"))
+
+    first, second = asyncio.run(run())
+    assert (first.status_code, second.status_code) == (200, 503)
+    assert first.content == b"row\n" * 4
@@ -0,0 +1,67 @@
+import asyncio
+import threading
+
+import httpx
+from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+
+from be_task_ca.admission import install_admission_control
+from be_task_ca.app import DatabaseSessionMiddleware, app
+from be_task_ca.item import api as item_api
+
+
+def get(app, path):
+    async def run():
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            return await client.get(path, headers={"Accept-Encoding": "gzip"})
+
+    return asyncio.run(run())
+
+
+def test_small_responses_are_not_compressed():
+    """Test a response under GZIP_MINIMUM_SIZE is sent as is, with its length."""
+    response = get(app, "/")
+
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Content-Length"] == str(len(response.content))
+
+
+def test_middlewares_keep_the_body_size_visible_to_gzip():
+    """Test GZip sees whole bodies through the session and admission layers."""
+    test_app = FastAPI()
+
+    @test_app.get("/small")
+    def small():
+        return {"size": "small"}
+
+    @test_app.get("/large")
+    def large():
+        return {"size": "large" * 1000}
+
+    test_app.add_middleware(DatabaseSessionMiddleware)
+    install_admission_control(test_app)
+    test_app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+    assert "Content-Encoding" not in get(test_app, "/small").headers
+    large = get(test_app, "/large")
+    assert large.headers["Content-Encoding"] == "gzip"
+    assert large.json() == {"size": "large" * 1000}
+
+
+def test_catalog_queries_run_off_the_event_loop(monkeypatch):
+    """Test search and autocomplete query the database from the threadpool."""
+    threads = []
+
+    def query(*args):
+        threads.append(threading.get_ident())
+        return []
+
+    monkeypatch.setattr(item_api, "search_items", query)
+    monkeypatch.setattr(item_api, "autocomplete_items", query)
+
+    assert get(app, "/items/search?q=chair").json() == {"items": []}
+    assert get(app, "/items/autocomplete?prefix=ch").json() == {"suggestions": []}
+    assert len(threads) == 2 and threading.get_ident() not in threads
@@ -0,0 +1,206 @@
+import asyncio
+import threading
+from uuid import uuid4
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import sessionmaker
+
+from be_task_ca import database
+from be_task_ca.batch.api import batch_router
+from be_task_ca.common import get_db
+from be_task_ca.database import Base
+from be_task_ca.database.models import UserModel
+from be_task_ca.database.unit_of_work import UnitOfWork
+from be_task_ca.item.model import Item
+from be_task_ca.item.repository import save_item
+from be_task_ca.user.domain.entity import User
+from be_task_ca.user.infrastructure.postgres_user_repository import (
+    PostgresUserRepository,
+)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'batch.db'}", connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def session_factory(engine, monkeypatch):
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(database, "Session", factory)
+    return factory
+
+
+@pytest.fixture
+def user(session_factory):
+    with session_factory() as session, UnitOfWork(session):
+        return PostgresUserRepository(session).create(
+            User.create_new("batch@example.com", "Batch", "User", "hashed")
+        )
+
+
+@pytest.fixture
+def items(session_factory):
+    with session_factory() as session, UnitOfWork(session):
+        return [
+            save_item(Item.create_new(f"item {n}", "description", n + 0.5, 3), session)
+            for n in range(3)
+        ]
+
+
+def post_batch(session_factory, operations):
+    app = FastAPI()
+    app.include_router(batch_router)
+
+    def request_session():
+        with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = request_session
+
+    async def post():
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            return await client.post("/batch", json={"operations": operations})
+
+    response = asyncio.run(post())
+    assert response.status_code == 200
+    return response.json()["results"]
+
+
+def test_page_is_assembled_in_one_request(engine, session_factory, user, items):
+    """Test writes apply before the reads, and item lookups share one query."""
+    item_lookups = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SELECT items.id, items.name"):
+            item_lookups.append(parameters)
+
+    results = post_batch(
+        session_factory,
+        [
+            {"id": "me", "op": "get_user", "args": {"user_id": str(user.id)}},
+            {"op": "get_item", "args": {"item_id": str(items[1].id)}},
+            {"op": "get_item", "args": {"item_id": str(items[2].id)}},
+            {"op": "get_cart", "args": {"user_id": str(user.id)}},
+            {
+                "op": "add_to_cart",
+                "args": {
+                    "user_id": str(user.id),
+                    "item_id": str(items[0].id),
+                    "quantity": 2,
+                },
+            },
+            {"op": "get_cart_summary", "args": {"user_id": str(user.id)}},
+        ],
+    )
+
+    assert [result["status"] for result in results] == [200] * 6
+    me, first, second, cart, added, summary = results
+    assert me["id"] == "me" and me["body"]["email"] == user.email
+    assert first["body"]["name"] == "item 1" and second["body"]["name"] == "item 2"
+    assert cart["body"]["items"][0]["name"] == "item 0"
+    assert added["body"]["items"][0]["quantity"] == 2
+    assert summary["body"]["unit_count"] == 2
+    # one lookup for the write, then one for the items the reads ask for and
+    # one for the lines of the cart, read from the threadpool meanwhile
+    assert item_lookups[0] and len(item_lookups[0]) == 1
+    assert sorted(len(ids) for ids in item_lookups[1:]) == [1, 2]
+
+
+def test_a_failed_write_rolls_back_the_others(session_factory, items):
+    """Test a write that fails undoes the writes before it and skips the rest."""
+    user_id = str(uuid4())
+    results = post_batch(
+        session_factory,
+        [
+            {
+                "op": "create_user",
+                "args": {
+                    "first_name": "New",
+                    "last_name": "User",
+                    "email": "new@example.com",
+                    "password": "secret",
+                    "shipping_address": None,
+                },
+            },
+            {"op": "get_item", "args": {"item_id": str(items[0].id)}},
+            {
+                "op": "add_to_cart",
+                "args": {
+                    "user_id": user_id,
+                    "item_id": str(items[0].id),
+                    "quantity": 1,
+                },
+            },
+            {"op": "create_item", "args": {"name": "new", "price": 1, "quantity": 1}},
+        ],
+    )
+
+    assert [result["status"] for result in results] == [424, 200, 404, 424]
+    assert results[2]["body"] == {"detail": "User not found"}
+    with session_factory() as session:
+        assert session.scalar(select(func.count()).select_from(UserModel)) == 0
+
+
+def test_invalid_arguments_fail_only_their_operation(session_factory, items):
+    """Test an operation with bad arguments gets 422 and the others still run."""
+    results = post_batch(
+        session_factory,
+        [
+            {"op": "get_item", "args": {"item_id": "not a uuid"}},
+            {"op": "search_items", "args": {"q": "item", "limit": 2}},
+        ],
+    )
+
+    assert results[0]["status"] == 422
+    assert results[1]["status"] == 200
+    assert len(results[1]["body"]["items"]) == 2
+
+
+def test_writes_run_off_the_event_loop_in_order(engine, session_factory):
+    """Test the writes run in the threadpool, one after the other as given."""
+    inserts = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO"):
+            inserts.append((statement.split()[2], threading.get_ident()))
+
+    results = post_batch(
+        session_factory,
+        [
+            {
+                "op": "create_item",
+                "args": {
+                    "name": "lamp",
+                    "description": "bright",
+                    "price": 1,
+                    "quantity": 1,
+                },
+            },
+            {
+                "op": "create_user",
+                "args": {
+                    "first_name": "New",
+                    "last_name": "User",
+                    "email": "new@example.com",
+                    "password": "secret",
+                    "shipping_address": None,
+                },
+            },
+        ],
+    )
+
+    assert [result["status"] for result in results] == [200, 200]
+    assert [table for table, _ in inserts] == ["items", "users"]
+    assert threading.get_ident() not in {thread for _, thread in inserts}
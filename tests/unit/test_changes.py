@@ -0,0 +1,154 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from be_task_ca import changes
+from be_task_ca.changes import HEARTBEAT, RESET_EVENT, Change, ChangeHub, event_stream
+from be_task_ca.database import Base
+from be_task_ca.item.model import Item
+from be_task_ca.item.repository import save_item
+
+
+def change(seq):
+    return Change(seq, "item", {"seq": seq})
+
+
+async def read(stream, count):
+    return [await stream.__anext__() for _ in range(count)]
+
+
+def test_resume_replays_the_missed_changes():
+    """Test a client resuming after a change gets the later ones, then live."""
+
+    async def run():
+        hub = ChangeHub(history=10)
+        hub.start(0)
+        for seq in (1, 2, 3):
+            hub.publish(change(seq))
+        stream = event_stream(hub, since=1, heartbeat=1)
+        missed = await read(stream, 2)
+        hub.publish(change(4))
+        live = await read(stream, 1)
+        await stream.aclose()
+        return missed + live
+
+    events = asyncio.run(run())
+
+    assert [event.split(b"\n")[0] for event in events] == [b"id: 2", b"id: 3", b"id: 4"]
+    assert json.loads(events[0].split(b"data: ")[1]) == {"seq": 2}
+
+
+def test_resume_from_before_the_history_resets():
+    """Test a client that missed changes the hub no longer keeps is reset."""
+
+    async def run():
+        hub = ChangeHub(history=2)
+        hub.start(0)
+        for seq in (1, 2, 3):
+            hub.publish(change(seq))
+        return [
+            await read(event_stream(hub, since=since, heartbeat=1), 1)
+            for since in (1, 0)
+        ]
+
+    resumed, too_old = asyncio.run(run())
+
+    assert resumed[0].startswith(b"id: 2")
+    assert too_old == [RESET_EVENT]
+
+
+def test_resume_missing_more_than_the_queue_resets():
+    """Test a client missing more changes than its queue holds is reset."""
+
+    async def run():
+        hub = ChangeHub(history=20, queue_size=4)
+        hub.start(0)
+        for seq in range(1, 11):
+            hub.publish(change(seq))
+        stream = event_stream(hub, since=0, heartbeat=1)
+        first = await stream.__anext__()
+        hub.publish(change(11))
+        return first, [event async for event in stream]
+
+    first, rest = asyncio.run(run())
+
+    assert first == RESET_EVENT
+    assert rest == []
+
+
+def test_slow_clients_are_reset():
+    """Test a client whose queue overflows gets a reset and its stream ends."""
+
+    async def run():
+        hub = ChangeHub(queue_size=2)
+        stream = event_stream(hub, since=None, heartbeat=0.05)
+        assert await stream.__anext__() == HEARTBEAT
+        for seq in (1, 2, 3):
+            hub.publish(change(seq))
+        await asyncio.sleep(0)
+        events = [event async for event in stream]
+        return events, hub
+
+    events, hub = asyncio.run(run())
+
+    assert events == [RESET_EVENT]
+    assert hub._subscribers == set()
+
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr(changes, "hub", ChangeHub())
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def test_saved_items_are_published_on_commit(session):
+    """Test save_item publishes the change numbered by the catalog version."""
+
+    async def run():
+        stream = event_stream(changes.hub, since=None, heartbeat=1)
+        first = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)  # subscribed
+        save_item(Item.create_new("lamp", "description", 9.5, 3), session)
+        session.commit()
+        return await first
+
+    event = asyncio.run(run())
+
+    assert event.startswith(b"id: 1\nevent: item\n")
+    data = json.loads(event.split(b"data: ")[1])
+    assert (data["name"], data["price"], data["quantity"]) == ("lamp", 9.5, 3)
+
+
+def test_rolled_back_changes_are_not_published(session):
+    """Test a change recorded by a rolled back transaction is dropped."""
+    save_item(Item.create_new("lamp", "description", 9.5, 3), session)
+    session.rollback()
+    session.commit()
+
+    assert list(changes.hub._history) == []
+
+
+def test_changes_published_out_of_order_reset():
+    """Test a change older than one already sent resets instead of leaving a gap."""
+
+    async def run():
+        hub = ChangeHub()
+        hub.start(4)
+        stream = event_stream(hub, since=None, heartbeat=1)
+        assert await stream.__anext__() == HEARTBEAT
+        hub.publish(change(6))
+        hub.publish(change(5))
+        live = [event async for event in stream]
+        return live, await read(event_stream(hub, since=4, heartbeat=1), 1)
+
+    live, resumed = asyncio.run(run())
+
+    assert live == [RESET_EVENT]
+    assert resumed == [RESET_EVENT]
@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from be_task_ca.database.blocking import run_blocking, session_turns
+from be_task_ca.dataloader import DataLoader
+
+
+class RecordingBatch:
+    """Batch function that records every call it receives."""
+
+    def __init__(self, data):
+        self.data = data
+        self.calls = []
+
+    def __call__(self, keys):
+        self.calls.append(list(keys))
+        return {key: self.data[key] for key in keys if key in self.data}
+
+
+def test_loads_in_same_tick_are_batched():
+    """Test concurrent loads are resolved with a single batch call."""
+    batch = RecordingBatch({1: "a", 2: "b", 3: "c"})
+
+    async def scenario():
+        loader = DataLoader(batch)
+        return await asyncio.gather(loader.load(1), loader.load(2), loader.load(3))
+
+    assert asyncio.run(scenario()) == ["a", "b", "c"]
+    assert batch.calls == [[1, 2, 3]]
+
+
+def test_results_are_memoized():
+    """Test repeated keys, including misses, do not hit the batch function again."""
+    batch = RecordingBatch({1: "a"})
+
+    async def scenario():
+        loader = DataLoader(batch)
+        first = await loader.load_many([1, 1, 2])
+        second = await loader.load_many([2, 1])
+        return first, second
+
+    assert asyncio.run(scenario()) == (["a", "a", None], [None, "a"])
+    assert batch.calls == [[1, 2]]
+
+
+def test_prime_and_clear():
+    """Test primed values skip the batch and cleared values are fetched again."""
+    batch = RecordingBatch({1: "stored"})
+
+    async def scenario():
+        loader = DataLoader(batch)
+        loader.prime(1, "primed")
+        primed = await loader.load(1)
+        loader.clear(1)
+        return primed, await loader.load(1)
+
+    assert asyncio.run(scenario()) == ("primed", "stored")
+    assert batch.calls == [[1]]
+
+
+def test_batch_errors_are_not_memoized():
+    """Test a failing batch propagates to every waiter and can be retried."""
+    calls = []
+
+    def flaky(keys):
+        calls.append(keys)
+        if len(calls) == 1:
+            raise RuntimeError("database unavailable")
+        return {key: key * 10 for key in keys}
+
+    async def scenario():
+        loader = DataLoader(flaky)
+        with pytest.raises(RuntimeError):
+            await loader.load_many([1, 2])
+        return await loader.load(1)
+
+    assert asyncio.run(scenario()) == 10
+
+
+def test_batches_can_run_off_the_event_loop():
+    """Test a loader given `run_blocking` calls its batch from the threadpool."""
+    threads = []
+
+    def batch(keys):
+        threads.append(threading.get_ident())
+        return {key: key * 10 for key in keys}
+
+    async def scenario():
+        loader = DataLoader(batch, run=run_blocking)
+        with session_turns():
+            return await asyncio.gather(loader.load(1), loader.load(2))
+
+    assert asyncio.run(scenario()) == [10, 20]
+    assert len(threads) == 1 and threads[0] != threading.get_ident()
+
+
+def test_blocking_calls_of_a_request_take_turns():
+    """Test calls handed to `run_blocking` never overlap inside `session_turns`."""
+    running, overlaps = [], []
+
+    def query():
+        overlaps.append(bool(running))
+        running.append(1)
+        time.sleep(0.01)
+        running.pop()
+
+    async def scenario():
+        with session_turns():
+            await asyncio.gather(*(run_blocking(query) for _ in range(5)))
+
+    asyncio.run(scenario())
+    assert overlaps == [False] * 5
+
+
+def test_nested_session_turns_keep_taking_turns():
+    """Test a block inside `session_turns` shares the enclosing block's turns."""
+    running, overlaps = [], []
+
+    def query():
+        overlaps.append(bool(running))
+        running.append(1)
+        time.sleep(0.01)
+        running.pop()
+
+    async def nested():
+        with session_turns():
+            await asyncio.gather(run_blocking(query), run_blocking(query))
+
+    async def scenario():
+        with session_turns():
+            await asyncio.gather(nested(), run_blocking(query), nested())
+
+    asyncio.run(scenario())
+    assert overlaps == [False] * 5
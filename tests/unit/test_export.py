@@ -0,0 +1,118 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from be_task_ca import database
+from be_task_ca.database import Base
+from be_task_ca.database.models import ItemModel
+from be_task_ca.export import ExportFormat, export_table, stream_rows
+from be_task_ca.item.api import item_router
+
+START = datetime(2024, 5, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'export.db'}")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as session:
+        session.add_all(
+            ItemModel(
+                id=uuid4(),
+                name=f"Item {n}",
+                description='with "quotes", commas\nand lines',
+                price=n + 0.5,
+                quantity=n,
+                updated_at=START + timedelta(minutes=n),
+            )
+            for n in range(5)
+        )
+        session.commit()
+    return factory
+
+
+def export(session_factory, **options):
+    return b"".join(export_table(session_factory, "items", chunk_size=2, **options))
+
+
+def test_rows_are_read_in_chunks(session_factory):
+    """Test rows arrive in chunks of at most chunk_size, oldest change first."""
+    with session_factory() as session:
+        chunks = list(stream_rows(session, "items", chunk_size=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert [row[1] for chunk in chunks for row in chunk] == [
+        f"Item {n}" for n in range(5)
+    ]
+
+
+def test_ndjson_export(session_factory):
+    """Test every row is one JSON object per line, without extra columns."""
+    lines = export(session_factory).splitlines()
+
+    records = [json.loads(line) for line in lines]
+    assert [record["quantity"] for record in records] == [0, 1, 2, 3, 4]
+    assert set(records[0]) == {
+        "id", "name", "description", "price", "quantity", "updated_at"
+    }
+    assert records[0]["description"] == 'with "quotes", commas\nand lines'
+
+
+def test_csv_export_is_gzipped_and_incremental(session_factory):
+    """Test a compressed CSV export of the rows changed after updated_since."""
+    body = export(
+        session_factory,
+        export_format=ExportFormat.CSV,
+        updated_since=START + timedelta(minutes=2),
+        gzip=True,
+    )
+
+    reader = csv.DictReader(io.StringIO(gzip.decompress(body).decode()))
+    rows = list(reader)
+    assert reader.fieldnames[:2] == ["id", "name"]
+    assert [row["name"] for row in rows] == ["Item 3", "Item 4"]
+    assert rows[0]["description"] == 'with "quotes", commas\nand lines'
+
+
+def test_csv_export_of_no_rows_has_a_header(session_factory):
+    """Test an export with nothing new still names its columns."""
+    later = START + timedelta(days=1)
+    body = export(session_factory, export_format=ExportFormat.CSV, updated_since=later)
+    assert body.decode().splitlines() == [
+        "id,name,description,price,quantity,updated_at"
+    ]
+
+
+def test_export_endpoint_streams_with_its_own_session(session_factory, monkeypatch):
+    """Test GET /items/export compresses for clients that accept gzip."""
+    monkeypatch.setattr(database, "Session", session_factory)
+    app = FastAPI()
+    app.include_router(item_router)
+
+    async def get():
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            return await client.get(
+                "/items/export",
+                params={"format": "csv"},
+                headers={"Accept-Encoding": "gzip"},
+            )
+
+    response = asyncio.run(get())
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(list(csv.DictReader(io.StringIO(response.text)))) == 5
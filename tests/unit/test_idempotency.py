@@ -0,0 +1,177 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from pydantic import BaseModel
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from be_task_ca.database import Base
+from be_task_ca.idempotency import PENDING, IdempotencyMiddleware, IdempotencyStore
+
+
+class NewUser(BaseModel):
+    email: str
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'idempotency.db'}")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+def make_app(session_factory, ttl=60.0, headers=None, lease=60.0):
+    """App whose POST /users/ counts its calls and fails on emails with 'boom'."""
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.post("/users/")
+    async def create(user: NewUser, response: Response):
+        app.state.calls += 1
+        response.headers.update(headers or {})
+        await asyncio.sleep(0.05)
+        if "boom" in user.email:
+            raise HTTPException(status_code=503, detail="try again")
+        return {"email": user.email, "call": app.state.calls}
+
+    store = IdempotencyStore(session_factory, ttl=ttl, max_entries=100, lease=lease)
+    app.add_middleware(IdempotencyMiddleware, store=store)
+    return app
+
+
+def post_all(app, *requests):
+    """Send (key, email) requests concurrently and return the responses."""
+
+    async def run():
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            return await asyncio.gather(
+                *(
+                    client.post(
+                        "/users/",
+                        json={"email": email},
+                        headers={"Idempotency-Key": key} if key else {},
+                    )
+                    for key, email in requests
+                )
+            )
+
+    return asyncio.run(run())
+
+
+def test_retry_replays_the_stored_response(session_factory):
+    app = make_app(session_factory)
+
+    first, = post_all(app, ("key-1", "a@example.com"))
+    retry, = post_all(app, ("key-1", "a@example.com"))
+
+    assert app.state.calls == 1
+    assert retry.status_code == first.status_code == 200
+    assert retry.json() == first.json() == {"email": "a@example.com", "call": 1}
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+
+
+def test_replays_to_gzip_clients_are_compressed_once(session_factory):
+    """Test a replay is not sent with the first response's Content-Encoding."""
+    app = make_app(session_factory)
+    app.add_middleware(GZipMiddleware, minimum_size=0)
+
+    # httpx accepts gzip by default and decodes the body
+    first, = post_all(app, ("key-1", "a@example.com"))
+    retry, = post_all(app, ("key-1", "a@example.com"))
+
+    assert first.headers["Content-Encoding"] == "gzip"
+    assert retry.headers["Content-Encoding"] == "gzip"
+    assert retry.json() == first.json() == {"email": "a@example.com", "call": 1}
+
+
+def test_only_the_response_headers_are_replayed(session_factory):
+    """Test per-delivery headers of the first response are not stored."""
+    app = make_app(
+        session_factory,
+        headers={"X-Shop": "nile", "X-Profile-Id": "first", "Connection": "close"},
+    )
+
+    post_all(app, ("key-1", "a@example.com"))
+    retry, = post_all(app, ("key-1", "a@example.com"))
+
+    assert retry.headers["X-Shop"] == "nile"
+    assert "X-Profile-Id" not in retry.headers
+    assert "Connection" not in retry.headers
+    assert retry.headers["Content-Length"] == str(len(retry.content))
+
+
+def test_concurrent_duplicates_run_once(session_factory):
+    app = make_app(session_factory)
+
+    responses = post_all(app, *[("key-1", "a@example.com")] * 3)
+
+    assert app.state.calls == 1
+    assert {response.json()["call"] for response in responses} == {1}
+
+
+def test_other_workers_replay_from_the_database(session_factory):
+    post_all(make_app(session_factory), ("key-1", "a@example.com"))
+    other_worker = make_app(session_factory)
+
+    retry, = post_all(other_worker, ("key-1", "a@example.com"))
+
+    assert other_worker.state.calls == 0
+    assert retry.json() == {"email": "a@example.com", "call": 1}
+
+
+def test_reusing_a_key_with_another_body_is_rejected(session_factory):
+    app = make_app(session_factory)
+    post_all(app, ("key-1", "a@example.com"))
+
+    reused, = post_all(app, ("key-1", "b@example.com"))
+
+    assert reused.status_code == 422
+    assert app.state.calls == 1
+
+
+def test_server_errors_and_keyless_requests_are_not_stored(session_factory):
+    app = make_app(session_factory)
+
+    post_all(app, ("key-1", "boom@example.com"), (None, "a@example.com"))
+    post_all(app, ("key-1", "boom@example.com"), (None, "a@example.com"))
+
+    assert app.state.calls == 4
+
+
+def test_expired_keys_run_again(session_factory):
+    app = make_app(session_factory, ttl=0.01)
+    post_all(app, ("key-1", "a@example.com"))
+    time.sleep(0.02)
+
+    again, = post_all(app, ("key-1", "a@example.com"))
+
+    assert app.state.calls == 2
+    assert "Idempotent-Replayed" not in again.headers
+
+
+def test_abandoned_claims_are_taken_over_after_their_lease(session_factory):
+    store = IdempotencyStore(session_factory, ttl=60.0, max_entries=100, lease=0.05)
+    # the first request claimed the key, then its worker died before saving
+    assert store.claim("key-1", "fingerprint") is None
+
+    assert store.claim("key-1", "fingerprint") is PENDING
+    time.sleep(0.06)
+    assert store.claim("key-1", "fingerprint") is None
+
+
+def test_saved_responses_outlive_the_lease(session_factory):
+    post_all(make_app(session_factory, lease=0.01), ("key-1", "a@example.com"))
+    time.sleep(0.02)
+    other_worker = make_app(session_factory, lease=0.01)
+
+    retry, = post_all(other_worker, ("key-1", "a@example.com"))
+
+    assert other_worker.state.calls == 0
+    assert retry.headers["Idempotent-Replayed"] == "true"
@@ -0,0 +1,87 @@
+import json
+import time
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from be_task_ca import profiling
+from be_task_ca.profiling import (
+    PROFILE_HEADER,
+    PROFILE_ID_HEADER,
+    install_profiling,
+    profile_signature,
+)
+
+SECRET = "s3cret"
+
+
+@pytest.fixture
+def profiled_client(tmp_path, monkeypatch):
+    """App with one sync endpoint running SQL, profiling on signed requests."""
+    monkeypatch.setattr(profiling.settings, "profile_secret", SECRET)
+    monkeypatch.setattr(profiling.settings, "profile_dir", str(tmp_path))
+    # sample the stacks running this test module's endpoint
+    monkeypatch.setattr(profiling, "_PACKAGE_DIR", str(Path(__file__).parent))
+    engine = create_engine("sqlite://")
+    app = FastAPI()
+
+    @app.get("/slow")
+    def slow():
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1")).scalar_one()
+        time.sleep(0.05)
+        return {"ok": True}
+
+    install_profiling(app)
+    return TestClient(app)
+
+
+def signed(path, expires=None, secret=SECRET):
+    expires = expires or int(time.time()) + 60
+    signature = profile_signature(secret, "GET", path, expires)
+    return {PROFILE_HEADER: f"{expires}:{signature}"}
+
+
+def test_signed_request_writes_stacks_and_sql(profiled_client, tmp_path):
+    response = profiled_client.get("/slow", headers=signed("/slow"))
+
+    profile_id = response.headers[PROFILE_ID_HEADER]
+    folded = (tmp_path / f"{profile_id}.folded").read_text()
+    assert "slow (tests/unit/test_profiling.py" in folded
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in folded.splitlines())
+    report = json.loads((tmp_path / f"{profile_id}.sql.json").read_text())
+    assert report["status"] == 200
+    assert [query["statement"] for query in report["queries"]] == ["SELECT 1"]
+
+
+@pytest.mark.parametrize(
+    "headers",
+    [
+        {},
+        signed("/other"),
+        signed("/slow", secret="wrong"),
+        signed("/slow", expires=int(time.time()) - 1),
+    ],
+)
+def test_unsigned_requests_are_not_profiled(profiled_client, tmp_path, headers):
+    response = profiled_client.get("/slow", headers=headers)
+
+    assert response.status_code == 200
+    assert PROFILE_ID_HEADER not in response.headers
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_sampled_requests_are_profiled(profiled_client, monkeypatch):
+    monkeypatch.setattr(profiling.settings, "profile_sample_rate", 1.0)
+
+    assert PROFILE_ID_HEADER in profiled_client.get("/slow").headers
+
+
+def test_no_middleware_when_not_configured():
+    app = FastAPI()
+    install_profiling(app)
+
+    assert app.user_middleware == []
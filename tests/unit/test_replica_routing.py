@@ -0,0 +1,82 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from be_task_ca.database import Base
+from be_task_ca.database.routing import ReplicaSet, RoutingSession
+from be_task_ca.database.unit_of_work import UnitOfWork
+from be_task_ca.user.domain.entity import User
+from be_task_ca.user.infrastructure.postgres_user_repository import (
+    PostgresUserRepository,
+)
+
+
+def new_user(email):
+    return User.create_new(email, "Test", "User", "hashed")
+
+
+@pytest.fixture
+def primary(tmp_path):
+    """Primary database in its own file."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    Base.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def replica(tmp_path):
+    """Replica database in a second file, seeded with a replica-only user."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session, UnitOfWork(session):
+        PostgresUserRepository(session).create(new_user("replica@example.com"))
+    return engine
+
+
+def session_factory(primary, replica, lag=0.0):
+    def probe(engine):
+        if isinstance(lag, Exception):
+            raise lag
+        return lag
+
+    replicas = ReplicaSet([replica], max_lag=1.0, lag_probe=probe)
+    return sessionmaker(class_=RoutingSession, primary=primary, replicas=replicas)
+
+
+def test_reads_go_to_replica(primary, replica):
+    """Test read-only repository calls are served by the replica."""
+    repository = PostgresUserRepository(session_factory(primary, replica)())
+    assert repository.get_by_email("replica@example.com") is not None
+    assert [user.email for user in repository.list_all()] == ["replica@example.com"]
+
+
+def test_writes_go_to_primary_and_stick(primary, replica):
+    """Test writes hit the primary and later reads in the session follow them."""
+    repository = PostgresUserRepository(session_factory(primary, replica)())
+    assert not repository.has_uncommitted_writes()
+    created = repository.create(new_user("primary@example.com"))
+    assert repository.has_uncommitted_writes()
+
+    assert repository.get_by_email("replica@example.com") is None
+    assert repository.get_by_id(created.id) is not None
+
+    fresh = PostgresUserRepository(session_factory(primary, replica)())
+    assert fresh.get_by_email("primary@example.com") is None
+
+
+@pytest.mark.parametrize("lag", [30.0, ConnectionError("replica down")])
+def test_lagging_or_broken_replica_falls_back_to_primary(primary, replica, lag):
+    """Test reads use the primary when no replica is healthy."""
+    with sessionmaker(bind=primary)() as session, UnitOfWork(session):
+        PostgresUserRepository(session).create(new_user("primary@example.com"))
+    repository = PostgresUserRepository(session_factory(primary, replica, lag)())
+    assert repository.get_by_email("primary@example.com") is not None
+    assert repository.get_by_email("replica@example.com") is None
+
+
+def test_without_replicas_everything_uses_primary(primary):
+    """Test a routing session without replicas behaves like a plain session."""
+    session = sessionmaker(class_=RoutingSession, primary=primary)()
+    repository = PostgresUserRepository(session)
+    created = repository.create(new_user("primary@example.com"))
+    assert repository.get_by_id(created.id) is not None
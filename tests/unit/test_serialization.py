@@ -0,0 +1,116 @@
+import json
+from uuid import UUID, uuid4
+
+import pytest
+
+from be_task_ca import serialization
+from be_task_ca.item.schema import AllItemsRepsonse, CreateItemResponse
+
+
+def test_encode_rows_matches_pydantic_output():
+    """Test the fast path produces the same document as the schema models."""
+    item_id = uuid4()
+    row = ("Lamp", "A desk lamp", 19.99, 3, item_id)
+    columns = ("name", "description", "price", "quantity", "id")
+
+    fast = json.loads(serialization.encode_rows(columns, [row], envelope="items"))
+    slow = json.loads(
+        AllItemsRepsonse(items=[CreateItemResponse(**dict(zip(columns, row)))]).json()
+    )
+    assert fast == slow
+
+
+def test_encode_rows_without_envelope():
+    """Test rows are encoded as a bare array when no envelope is given."""
+    body = serialization.encode_rows(("id", "email"), [("1", "a@b.c"), ("2", "d@e.f")])
+    assert json.loads(body) == [
+        {"id": "1", "email": "a@b.c"},
+        {"id": "2", "email": "d@e.f"},
+    ]
+
+
+def test_dumps_stdlib_fallback(monkeypatch):
+    """Test UUIDs are still encoded when orjson is not installed."""
+    monkeypatch.setattr(serialization, "orjson", None)
+    user_id = uuid4()
+    assert json.loads(serialization.dumps({"id": user_id})) == {"id": str(user_id)}
+
+
+def test_json_rows_response():
+    """Test the response carries the encoded body and JSON media type."""
+    response = serialization.json_rows_response(("id",), [("1",)])
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == [{"id": "1"}]
+
+
+def test_negotiate_prefers_highest_quality():
+    """Test the Accept header picks the format, JSON for anything unknown."""
+    assert serialization.negotiate("") == serialization.JSON
+    assert serialization.negotiate("*/*") == serialization.JSON
+    assert serialization.negotiate("text/html") == serialization.JSON
+    assert serialization.negotiate("application/x-msgpack") == serialization.MSGPACK
+    accept = "application/json;q=0.5, application/vnd.apache.arrow.stream"
+    assert serialization.negotiate(accept) == serialization.ARROW
+    accept = "application/msgpack;q=0.2, application/json;q=0.9"
+    assert serialization.negotiate(accept) == serialization.JSON
+
+
+def test_negotiate_ignores_missing_libraries(monkeypatch):
+    """Test a format whose library is not installed is never picked."""
+    monkeypatch.setattr(serialization, "msgpack", None)
+    assert serialization.negotiate("application/msgpack") == serialization.JSON
+
+
+ITEM_COLUMNS = ("name", "description", "price", "quantity", "id")
+ITEM_TYPES = (str, str, float, int, UUID)
+
+
+def test_msgpack_rows_response():
+    """Test MessagePack has the JSON document shape with UUIDs as raw bytes."""
+    msgpack = pytest.importorskip("msgpack")
+    item_id = uuid4()
+    response = serialization.rows_response(
+        "application/msgpack",
+        ITEM_COLUMNS,
+        ITEM_TYPES,
+        [("Lamp", "A desk lamp", 19.99, 3, item_id)],
+        envelope="items",
+    )
+
+    assert response.media_type == serialization.MSGPACK
+    assert response.headers["vary"] == "Accept"
+    document = msgpack.unpackb(response.body)
+    assert document == {
+        "items": [
+            {
+                "name": "Lamp",
+                "description": "A desk lamp",
+                "price": 19.99,
+                "quantity": 3,
+                "id": item_id.bytes,
+            }
+        ]
+    }
+
+
+def test_arrow_rows_response():
+    """Test Arrow columns keep their types, also for an empty result."""
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+
+    item_id = uuid4()
+    rows = [("Lamp", "A desk lamp", 19.99, 3, item_id), ("Mug", "", 4.5, 0, uuid4())]
+    response = serialization.rows_response(
+        serialization.ARROW, ITEM_COLUMNS, ITEM_TYPES, rows, envelope="items"
+    )
+
+    table = pyarrow.ipc.open_stream(response.body).read_all()
+    assert table.column_names == list(ITEM_COLUMNS)
+    assert table.column("price").to_pylist() == [19.99, 4.5]
+    assert table.column("id")[0].as_py() == item_id.bytes
+    assert table.schema.field("quantity").type == pyarrow.int64()
+
+    empty = serialization.encode_arrow_rows(ITEM_COLUMNS, ITEM_TYPES, [])
+    table = pyarrow.ipc.open_stream(empty).read_all()
+    assert table.num_rows == 0
+    assert table.schema.field("id").type == pyarrow.binary(16)
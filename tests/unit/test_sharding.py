@@ -0,0 +1,210 @@
+import pytest
+from sqlalchemy import create_engine, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from be_task_ca.database import Base
+from be_task_ca.database.models import (
+    CartModel,
+    ShardSlotModel,
+    UserDirectoryModel,
+    UserModel,
+)
+from be_task_ca.database.rebalance import (
+    _copy_users,
+    backfill_directory,
+    group_moves,
+    move_slots,
+    plan_even,
+)
+from be_task_ca.database.routing import RoutingSession
+from be_task_ca.database.unit_of_work import UnitOfWork
+from be_task_ca.export import stream_rows
+from be_task_ca.database.sharding import (
+    SLOT_COUNT,
+    ShardMovingError,
+    ShardSet,
+    slot_of,
+)
+from be_task_ca.user.domain.cart import Cart
+from be_task_ca.user.domain.entity import User
+from be_task_ca.user.infrastructure.cart_repository import PostgresCartRepository
+from be_task_ca.user.infrastructure.postgres_user_repository import (
+    PostgresUserRepository,
+)
+
+
+@pytest.fixture
+def shards(tmp_path):
+    """A primary and two more shards, each in its own database file."""
+    engines = [
+        create_engine(f"sqlite:///{tmp_path / f'shard{n}.db'}") for n in range(3)
+    ]
+    for engine in engines:
+        Base.metadata.create_all(engine)
+    # refresh_interval=0 re-reads the slot map on every lookup
+    return ShardSet(engines, refresh_interval=0)
+
+
+@pytest.fixture
+def session_factory(shards):
+    return sessionmaker(
+        class_=RoutingSession, primary=shards.engines[0], shards=shards
+    )
+
+
+def count_users(engine):
+    with engine.connect() as connection:
+        return connection.scalar(select(func.count()).select_from(UserModel))
+
+
+def create_users(session_factory, count):
+    with session_factory() as session, UnitOfWork(session):
+        repository = PostgresUserRepository(session)
+        return [
+            repository.create(
+                User.create_new(f"user{n}@example.com", "A", "B", "hashed")
+            )
+            for n in range(count)
+        ]
+
+
+def rebalance(shards):
+    slot_shards = shards.slot_shards()
+    moves = plan_even(slot_shards, len(shards.engines))
+    for source, target, slots in group_moves(moves, slot_shards):
+        move_slots(shards, slots, source, target, wait=0)
+
+
+def test_plan_even_moves_only_surplus_slots():
+    """Test slots are spread evenly and slots already in place stay."""
+    moves = plan_even([0] * SLOT_COUNT, 3)
+    after = [moves.get(slot, 0) for slot in range(SLOT_COUNT)]
+    assert sorted(after.count(shard) for shard in range(3)) == [341, 341, 342]
+
+    assert plan_even(after, 3) == {}
+    # dropping a shard moves just its slots
+    moves = plan_even(after, 2)
+    assert {after[slot] for slot in moves} == {2}
+
+
+def test_new_users_start_on_the_primary_until_rebalanced(shards, session_factory):
+    """Test users spread over all shards and stay readable after a rebalance."""
+    users = create_users(session_factory, 30)
+    assert count_users(shards.engines[0]) == 30
+
+    rebalance(shards)
+
+    counts = [count_users(engine) for engine in shards.engines]
+    assert sum(counts) == 30 and all(counts)
+    repository = PostgresUserRepository(session_factory())
+    for user in users:
+        assert repository.get_by_id(user.id).email == user.email
+        assert repository.get_by_email(user.email).id == user.id
+    assert len(repository.get_by_ids([user.id for user in users])) == 30
+    assert len(repository.list_all()) == 30
+    assert len(repository.list_all_rows()) == 30
+
+
+def test_carts_move_with_their_user(shards, session_factory):
+    """Test a cart lives on its user's shard and follows the user on a move."""
+    (user,) = create_users(session_factory, 1)
+    with session_factory() as session, UnitOfWork(session):
+        cart = Cart(user_id=user.id)
+        cart.add_item(user.id, 2)  # any id will do, the item is not in the catalog
+        PostgresCartRepository(session).create(cart)
+
+    target = 2
+    move_slots(shards, {slot_of(user.id)}, 0, target, wait=0)
+
+    with shards.engines[target].connect() as connection:
+        assert connection.scalar(select(CartModel.user_id)) == user.id
+    assert count_users(shards.engines[0]) == 0
+    carts = PostgresCartRepository(session_factory())
+    moved = carts.get_by_user_id(user.id)
+    assert [line.quantity for line in moved.items] == [2]
+    moved.add_item(user.id, 1)
+    carts.update(moved)
+    assert carts.get_summary(user.id).unit_count == 3
+
+
+def place(shards, user, shard, moving):
+    with shards.engines[0].begin() as connection:
+        connection.execute(
+            update(ShardSlotModel)
+            .where(ShardSlotModel.slot == slot_of(user.id))
+            .values(shard=shard, moving=moving)
+        )
+
+
+def test_writes_to_a_moving_slot_are_refused(shards, session_factory):
+    """Test a user cannot be changed while their slot is copied."""
+    (user,) = create_users(session_factory, 1)
+    place(shards, user, 0, moving=True)
+
+    repository = PostgresUserRepository(session_factory())
+    assert repository.get_by_id(user.id) is not None
+    with pytest.raises(ShardMovingError):
+        repository.update(user)
+
+
+def test_emails_stay_unique_across_shards(shards, session_factory):
+    """Test the directory rejects an email already used on another shard."""
+    (user,) = create_users(session_factory, 1)
+    move_slots(shards, {slot_of(user.id)}, 0, 1, wait=0)
+
+    repository = PostgresUserRepository(session_factory())
+    with pytest.raises(IntegrityError):
+        repository.create(User.create_new(user.email, "Other", "User", "hashed"))
+
+
+def test_users_missing_from_the_directory_are_found(shards, session_factory):
+    """Test users created before sharding are found by email and backfilled."""
+    with sessionmaker(bind=shards.engines[1])() as plain, UnitOfWork(plain):
+        old = PostgresUserRepository(plain).create(
+            User.create_new("old@example.com", "Old", "User", "hashed")
+        )
+    place(shards, old, 1, moving=False)
+
+    with session_factory() as session, UnitOfWork(session):
+        repository = PostgresUserRepository(session)
+        assert repository.get_by_email("old@example.com").id == old.id
+    with shards.engines[0].connect() as connection:
+        assert connection.scalar(select(UserDirectoryModel.user_id)) == old.id
+    assert backfill_directory(shards) == 0
+
+
+def test_writes_check_the_slot_on_the_primary(shards, session_factory):
+    """Test writes see a slot marked moving before the cached map does."""
+    (user,) = create_users(session_factory, 1)
+    shards.refresh_interval = 3600
+    shards.refresh()
+    place(shards, user, 0, moving=True)
+
+    repository = PostgresUserRepository(session_factory())
+    assert not shards.is_moving(user.id)
+    with pytest.raises(ShardMovingError):
+        repository.update(user)
+
+
+def test_every_slot_has_a_row_to_lock(shards):
+    """Test a new slot map lists every slot, so any write can lock its row."""
+    with shards.engines[0].connect() as connection:
+        rows = connection.execute(select(ShardSlotModel.shard)).scalars().all()
+    assert len(rows) == SLOT_COUNT and set(rows) == {0}
+
+
+def test_users_copied_by_a_move_are_listed_once(shards, session_factory):
+    """Test the copies on the target between a move's copy and delete are skipped."""
+    users = create_users(session_factory, 3)
+    with shards.engines[0].connect() as src, shards.engines[1].begin() as dst:
+        _copy_users(src, dst, [user.id for user in users])
+
+    repository = PostgresUserRepository(session_factory())
+    assert len(repository.list_all()) == 3
+    assert len(repository.list_all_rows()) == 3
+    assert repository.get_by_email(users[0].email).id == users[0].id
+    exported = [
+        row for chunk in stream_rows(session_factory(), "users") for row in chunk
+    ]
+    assert sorted(row.id for row in exported) == sorted(user.id for user in users)
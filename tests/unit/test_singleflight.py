@@ -0,0 +1,92 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from be_task_ca.singleflight import SingleFlight, executed, shared
+
+
+def blocking(result, release, calls, error=None):
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        if error:
+            raise error
+        return result
+
+    return fn
+
+
+def wait_until(condition):
+    for _ in range(5000):
+        if condition():
+            return
+        threading.Event().wait(0.001)
+    raise AssertionError("timed out")
+
+
+def shared_calls(flight):
+    return sum(count for _, count in flight.hottest())
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test-share")
+    release, calls = threading.Event(), []
+    result = object()
+
+    with ThreadPoolExecutor(5) as pool:
+        futures = [pool.submit(flight.do, "k", blocking(result, release, calls))]
+        wait_until(lambda: calls)
+        futures += [
+            pool.submit(flight.do, "k", lambda: pytest.fail("not shared"))
+            for _ in range(4)
+        ]
+        wait_until(lambda: shared_calls(flight) == 4)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert calls == [1]
+    assert all(value is result for value in results)
+    assert executed.value(group="test-share") == 1
+    assert shared.value(group="test-share") == 4
+    assert flight.hottest() == [("k", 4)]
+
+
+def test_followers_get_the_leaders_exception():
+    flight = SingleFlight("test-error")
+    release, calls = threading.Event(), []
+    fn = blocking(None, release, calls, error=ValueError("User not found"))
+
+    with ThreadPoolExecutor(3) as pool:
+        futures = [pool.submit(flight.do, "k", fn) for _ in range(3)]
+        wait_until(lambda: shared_calls(flight) == 2)
+        release.set()
+        for future in futures:
+            with pytest.raises(ValueError, match="User not found"):
+                future.result()
+
+    assert calls == [1]
+
+
+def test_results_are_not_cached_and_keys_are_independent():
+    flight = SingleFlight("test-sequential")
+    values = iter(range(10))
+
+    assert flight.do("a", lambda: next(values)) == 0
+    assert flight.do("a", lambda: next(values)) == 1
+    assert flight.do("b", lambda: next(values)) == 2
+    assert flight.hottest() == []
+
+
+def test_unshared_calls_run_on_their_own():
+    flight = SingleFlight("test-unshared")
+    release, calls = threading.Event(), []
+
+    with ThreadPoolExecutor(1) as pool:
+        leader = pool.submit(flight.do, "k", blocking("shared", release, calls))
+        wait_until(lambda: calls)
+        assert flight.do("k", lambda: "own", share=False) == "own"
+        release.set()
+        assert leader.result() == "shared"
+
+    assert shared_calls(flight) == 0
@@ -0,0 +1,104 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from be_task_ca.database import Base
+from be_task_ca.database.models import CatalogVersionModel
+from be_task_ca.database.unit_of_work import UnitOfWork, after_commit, savepoint
+from be_task_ca.item.model import Item
+from be_task_ca.item.repository import save_item
+from be_task_ca.user.domain.cart import Cart
+from be_task_ca.user.domain.entity import User
+from be_task_ca.user.infrastructure.cart_repository import PostgresCartRepository
+from be_task_ca.user.infrastructure.postgres_user_repository import (
+    PostgresUserRepository,
+)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'uow.db'}")
+    Base.metadata.create_all(engine)
+    return engine
+
+
+def new_user(email):
+    return User.create_new(email, "Test", "User", "hashed")
+
+
+def count_commits(engine):
+    commits = []
+    event.listen(engine, "commit", lambda connection: commits.append(connection))
+    return commits
+
+
+def test_repositories_commit_once_per_unit_of_work(engine):
+    """Test writes through several repositories are committed together, once."""
+    commits = count_commits(engine)
+    with sessionmaker(bind=engine)() as session, UnitOfWork(session):
+        user = PostgresUserRepository(session).create(new_user("a@example.com"))
+        cart = Cart(user_id=user.id)
+        cart.add_item(user.id, 1)
+        PostgresCartRepository(session).create(cart)
+        assert commits == []
+
+    assert len(commits) == 1
+    with sessionmaker(bind=engine)() as session:
+        assert PostgresCartRepository(session).get_by_user_id(user.id) is not None
+
+
+def test_failed_unit_of_work_keeps_nothing(engine):
+    """Test an exception rolls back every write and skips the commit callbacks."""
+    called = []
+    with pytest.raises(IntegrityError):
+        with sessionmaker(bind=engine)() as session, UnitOfWork(session):
+            repository = PostgresUserRepository(session)
+            repository.create(new_user("a@example.com"))
+            after_commit(session, lambda: called.append(True))
+            repository.create(new_user("a@example.com"))
+
+    with sessionmaker(bind=engine)() as session:
+        assert PostgresUserRepository(session).list_all() == []
+    assert called == []
+
+
+def test_savepoint_undoes_only_its_block(engine):
+    """Test a failed savepoint keeps the earlier writes and defers callbacks."""
+    called = []
+    with sessionmaker(bind=engine)() as session, UnitOfWork(session):
+        repository = PostgresUserRepository(session)
+        repository.create(new_user("a@example.com"))
+        after_commit(session, lambda: called.append(True))
+        with pytest.raises(IntegrityError):
+            with savepoint(session):
+                repository.create(new_user("a@example.com"))
+        assert called == []
+
+    assert called == [True]
+    with sessionmaker(bind=engine)() as session:
+        assert len(PostgresUserRepository(session).list_all()) == 1
+
+
+def test_catalog_version_is_bumped_last_and_only_for_kept_items(engine):
+    """Test the contended version row is written as the commit starts."""
+    statements = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+    with sessionmaker(bind=engine)() as session, UnitOfWork(session):
+        save_item(Item.create_new("lamp", "description", 9.5, 3), session)
+        with pytest.raises(IntegrityError):
+            with savepoint(session):
+                save_item(Item.create_new("lamp", "description", 9.5, 3), session)
+        save_item(Item.create_new("desk", "description", 5.0, 1), session)
+        assert not any("catalog_version" in statement for statement in statements)
+
+    assert ["catalog_version" in statement for statement in statements[-2:]] == [
+        True,
+        True,
+    ]
+    with sessionmaker(bind=engine)() as session:
+        assert session.query(CatalogVersionModel.version).scalar() == 2